@@ -1,9 +1,11 @@
-from auctions.models import AuctionListing, Bidding, Category, Comments, Watchlist
+from auctions.models import ApiToken, AuctionListing, Bidding, Category, Comments, ProxyBid, Watchlist
 from django.contrib import admin
 
 # Register your models here.
 admin.site.register(AuctionListing)
 admin.site.register(Bidding)
+admin.site.register(ProxyBid)
 admin.site.register(Comments)
 admin.site.register(Watchlist)
-admin.site.register(Category)
\ No newline at end of file
+admin.site.register(Category)
+admin.site.register(ApiToken)
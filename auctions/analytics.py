@@ -0,0 +1,186 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AuctionEvent, AuctionListing, CategoryDayStats, ListingMinuteStats, SellerStats
+
+# Log events folded into the rollups per aggregator pass
+BATCH_SIZE = 5000
+# Rows written per bulk statement
+WRITE_SIZE = 1000
+# Longest windows the chart endpoints serve, which bounds the rows they read
+MAX_HOURS = 7 * 24
+MAX_DAYS = 90
+
+COUNTERS = ['listed', 'bids', 'closed', 'sold', 'revenue']
+
+
+# Log the opening of new listings
+def recordListed(listings):
+    AuctionEvent.objects.bulk_create([AuctionEvent(listing_id=listing.id, kind=AuctionEvent.LISTED,
+        at=listing.listingDate) for listing in listings], batch_size=WRITE_SIZE)
+
+
+# Log an accepted bid, called inside the bid transaction
+def recordBid(bid):
+    AuctionEvent.objects.create(listing_id=bid.auction_id, kind=AuctionEvent.BID, amount=bid.bidAmount, at=bid.bidDate)
+
+
+# Log a comment or a new watcher of a listing, which move it up the trending feed
+def recordActivity(listingIds, kind):
+    AuctionEvent.objects.bulk_create([AuctionEvent(listing_id=id, kind=kind) for id in listingIds])
+
+
+# Log the given listings as closed, with their final price when they sold.
+# Called in the closing transaction, so it sees the price the listing closed at.
+def recordSales(listingIds, at=None):
+    at = at or timezone.now()
+    closed = AuctionListing.objects.filter(id__in=listingIds).values_list('id', 'currentBid', 'highestBid_id')
+    AuctionEvent.objects.bulk_create([AuctionEvent(listing_id=id, kind=AuctionEvent.CLOSED, at=at,
+        amount=price if highestBid else None) for id, price, highestBid in closed])
+
+
+# Deltas of a batch of events against the three rollups
+class Rollup:
+    def __init__(self):
+        self.minutes = defaultdict(lambda: [0, 0])
+        self.days = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self.sellers = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    def fold(self, event, categoryId, sellerId):
+        if event.kind in (AuctionEvent.COMMENTED, AuctionEvent.WATCHED):
+            return
+        counters = [self.days[(categoryId, event.at.date())], self.sellers[sellerId]]
+        if event.kind == AuctionEvent.BID:
+            minute = self.minutes[(event.listing_id, event.at.replace(second=0, microsecond=0))]
+            minute[0] += 1
+            minute[1] = max(minute[1], event.amount)
+            counters[0]["bids"] += 1
+            return
+        for counter in counters:
+            if event.kind == AuctionEvent.LISTED:
+                counter["listed"] += 1
+            else:
+                counter["closed"] += 1
+                if event.amount is not None:
+                    counter["sold"] += 1
+                    counter["revenue"] += event.amount
+
+
+# Fold events into a Rollup, looking up the category and seller of their listings in one query
+def foldEvents(events, rollup=None):
+    rollup = rollup or Rollup()
+    owners = dict((id, (category, seller)) for id, category, seller in AuctionListing.objects
+        .filter(id__in={event.listing_id for event in events}).values_list('id', 'category_id', 'user_id'))
+    for event in events:
+        if event.listing_id in owners:
+            rollup.fold(event, *owners[event.listing_id])
+    return rollup
+
+
+# Add the deltas to the rollup rows: existing rows are read once and written back in bulk,
+# missing ones are created in bulk
+def applyRollup(rollup):
+    minutes = {(row.listing_id, row.minute): row for row in ListingMinuteStats.objects
+        .filter(listing_id__in={key[0] for key in rollup.minutes}, minute__in={key[1] for key in rollup.minutes})}
+    for (listingId, minute), (bids, highest) in rollup.minutes.items():
+        row = minutes.get((listingId, minute))
+        if row is None:
+            minutes[(listingId, minute)] = ListingMinuteStats(listing_id=listingId, minute=minute, bids=bids, highest=highest)
+        else:
+            row.bids += bids
+            row.highest = max(row.highest, highest)
+    save(ListingMinuteStats, minutes.values(), ['bids', 'highest'])
+
+    days = {(row.category_id, row.day): row for row in CategoryDayStats.objects
+        .filter(category_id__in={key[0] for key in rollup.days}, day__in={key[1] for key in rollup.days})}
+    for (categoryId, day), deltas in rollup.days.items():
+        row = days.setdefault((categoryId, day), CategoryDayStats(category_id=categoryId, day=day))
+        add(row, deltas)
+    save(CategoryDayStats, days.values(), COUNTERS)
+
+    sellers = {row.seller_id: row for row in SellerStats.objects.filter(seller_id__in=rollup.sellers)}
+    for sellerId, deltas in rollup.sellers.items():
+        row = sellers.setdefault(sellerId, SellerStats(seller_id=sellerId))
+        add(row, deltas)
+    save(SellerStats, sellers.values(), ['listed', 'closed', 'sold', 'revenue'])
+
+
+def add(row, deltas):
+    for field, delta in deltas.items():
+        if hasattr(row, field):
+            setattr(row, field, getattr(row, field) + delta)
+
+
+def save(model, rows, fields):
+    rows = list(rows)
+    model.objects.bulk_update([row for row in rows if row.pk], fields, batch_size=WRITE_SIZE)
+    model.objects.bulk_create([row for row in rows if not row.pk], batch_size=WRITE_SIZE)
+
+
+# Fold the oldest pending events into the rollups. Claiming, folding and marking happen in one
+# transaction, so a crash folds nothing twice. The row locks make a second aggregator wait
+# rather than race on the same rollup rows.
+def aggregateBatch(batchSize=BATCH_SIZE):
+    with transaction.atomic():
+        events = list(AuctionEvent.objects.select_for_update().filter(aggregated=False).order_by('id')[:batchSize])
+        if not events:
+            return 0
+        applyRollup(foldEvents(events))
+        AuctionEvent.objects.filter(id__in=[event.id for event in events]).update(aggregated=True)
+    return len(events)
+
+
+# Recompute every rollup from the whole log, e.g. after changing what they count.
+# The aggregator should be stopped while this runs.
+def rebuildRollups(batchSize=BATCH_SIZE):
+    with transaction.atomic():
+        for model in [ListingMinuteStats, CategoryDayStats, SellerStats]:
+            model.objects.all().delete()
+        rollup = Rollup()
+        events = AuctionEvent.objects.order_by('id')
+        last = 0
+        while True:
+            batch = list(events.filter(id__gt=last)[:batchSize])
+            if not batch:
+                break
+            foldEvents(batch, rollup)
+            last = batch[-1].id
+        applyRollup(rollup)
+        AuctionEvent.objects.filter(id__lte=last, aggregated=False).update(aggregated=True)
+    return last
+
+
+# Price history and bid velocity of a listing over the last hours, one row per active minute
+def listingSeries(listingId, hours=24):
+    since = timezone.now() - timedelta(hours=min(hours, MAX_HOURS))
+    return list(ListingMinuteStats.objects.filter(listing_id=listingId, minute__gte=since).order_by('minute')
+        .values('minute', 'bids', 'highest'))
+
+
+# Daily rows of every category over the last days, with the totals of the window
+def categorySeries(days=30):
+    since = timezone.now().date() - timedelta(days=min(days, MAX_DAYS) - 1)
+    categories = {}
+    for row in CategoryDayStats.objects.filter(day__gte=since).select_related('category').order_by('day'):
+        entry = categories.setdefault(row.category.categoryName, {"days": [], **dict.fromkeys(COUNTERS, 0)})
+        entry["days"].append({"day": row.day, **{field: getattr(row, field) for field in COUNTERS}})
+        for field in COUNTERS:
+            entry[field] += getattr(row, field)
+    for entry in categories.values():
+        entry["averageFinalPrice"] = entry["revenue"] / entry["sold"] if entry["sold"] else None
+    return categories
+
+
+def sellerSummary(seller):
+    stats = SellerStats.objects.filter(seller=seller).first() or SellerStats(seller=seller)
+    return {
+        "seller": seller.username,
+        "listed": stats.listed,
+        "closed": stats.closed,
+        "sold": stats.sold,
+        "revenue": stats.revenue,
+        "sellThrough": stats.sold / stats.closed if stats.closed else None,
+    }
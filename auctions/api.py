@@ -0,0 +1,337 @@
+import hashlib
+import json
+import secrets
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.http import JsonResponse, QueryDict
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+
+from .bidding import BidError, placeBid, placeProxyBid
+from .cache import invalidateListing
+from .categories import registry as categoryRegistry
+from .comments import commentPage, postComment
+from .dashboard import STATUSES, bulkClose, dashboardPage, dashboardRow
+from .events import publish
+from .models import ApiToken, AuctionListing
+from .pagination import decodeCursor, keysetPage
+from .search import searchListings
+from .sqlite import submitWrite
+from .watchlist import addToWatchlist, removeFromWatchlist
+
+# Columns serialized for a listing, in lists and on its own
+LISTING_FIELDS = ['id', 'auctionTitle', 'image', 'imageKey', 'auctionDetails', 'currentBid', 'bidCount', 'listingDate',
+    'endsAt', 'isClosed', 'lastActivity', 'user__username', 'category__categoryName']
+DETAIL_FIELDS = LISTING_FIELDS + ['version', 'highestBid__bidAmount', 'highestBid__user__username']
+
+
+def jsonResponse(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={"separators": (",", ":")})
+
+
+def jsonError(message, status):
+    return jsonResponse({"error": message}, status)
+
+
+# Request body of a write, JSON or form encoded
+def requestData(request):
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+# Listing ids sent under name, a JSON list or the form field repeated. None when they are not all numbers
+def requestIds(data, name):
+    ids = data.getlist(name) if isinstance(data, QueryDict) else data.get(name, [])
+    if not isinstance(ids, list):
+        return None
+    try:
+        return [int(id) for id in ids]
+    except (TypeError, ValueError):
+        return None
+
+
+def tokenDigest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+# Create a token for user and return it, only its digest is stored
+def issueToken(user, name=""):
+    key = secrets.token_urlsafe(32)
+    ApiToken.objects.create(user=user, digest=tokenDigest(key), name=name)
+    return key
+
+
+# Count a request against the fixed window of identity. Returns the requests left in the
+# window, negative once the limit is exceeded, and the seconds until the window resets.
+def rateLimit(identity, limit):
+    window = settings.API_RATE_WINDOW
+    now = int(time.time())
+    key = f"api-rate:{identity}:{now // window}"
+    cache.add(key, 0, window)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, window)
+        count = 1
+    return limit - count, window - now % window
+
+
+# Wrap an API view: authenticate the bearer token, apply the rate limit of the token (or of
+# the client address for anonymous reads) and answer errors in JSON instead of HTML pages
+def apiView(methods, authenticated=False):
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.apiUser = None
+            header = request.headers.get("Authorization", "")
+            if header:
+                scheme, _, key = header.partition(" ")
+                token = ApiToken.objects.select_related('user').filter(digest=tokenDigest(key.strip())).first() \
+                    if scheme.lower() == "bearer" else None
+                if token is None or not token.user.is_active:
+                    return jsonError("Invalid token", 401)
+                request.apiUser = token.user
+                remaining, reset = rateLimit(f"token:{token.id}", settings.API_RATE_LIMIT)
+                limit = settings.API_RATE_LIMIT
+            else:
+                remaining, reset = rateLimit(f"address:{request.META.get('REMOTE_ADDR')}", settings.API_ANONYMOUS_RATE_LIMIT)
+                limit = settings.API_ANONYMOUS_RATE_LIMIT
+            if remaining < 0:
+                response = jsonError("Rate limit exceeded", 429)
+                response["Retry-After"] = str(reset)
+            elif request.method not in methods and not (request.method == "HEAD" and "GET" in methods):
+                response = jsonError(f"Method {request.method} not allowed", 405)
+                response["Allow"] = ", ".join(methods)
+            elif authenticated and request.method != "GET" and request.apiUser is None:
+                response = jsonError("Authentication required", 401)
+                response["WWW-Authenticate"] = "Bearer"
+            else:
+                response = view(request, *args, **kwargs)
+            response["X-RateLimit-Limit"] = str(limit)
+            response["X-RateLimit-Remaining"] = str(max(remaining, 0))
+            response["X-RateLimit-Reset"] = str(reset)
+            return response
+        return wrapper
+    return decorator
+
+
+def listingJson(listing):
+    return {
+        "id": listing.id,
+        "title": listing.auctionTitle,
+        "details": listing.auctionDetails,
+        "image": listing.image,
+        "thumbnail": listing.cardImage,
+        "currentBid": listing.currentBid,
+        "bidCount": listing.bidCount,
+        "seller": listing.user.username,
+        "category": listing.category.categoryName,
+        "listingDate": listing.listingDate,
+        "endsAt": listing.endsAt,
+        "isClosed": listing.isClosed,
+        "lastActivity": listing.lastActivity,
+    }
+
+
+def listingPageJson(listings, nextCursor):
+    return jsonResponse({"listings": [listingJson(listing) for listing in listings], "next": nextCursor})
+
+
+# ETag and Last-Modified of a listing and everything under it, read from one indexed row.
+# Bids, comments and closing all move lastActivity.
+def listingValidators(id):
+    state = AuctionListing.objects.filter(id=id).values_list('version', 'lastActivity').first()
+    if state is None:
+        return None
+    version, lastActivity = state
+    return f'"{id}.{version}.{lastActivity.timestamp():.6f}"', int(lastActivity.timestamp())
+
+
+# Answer a conditional GET of a listing resource with 304 before anything else is loaded,
+# otherwise build the response with render and stamp it with the validators
+def conditionalListing(request, id, render):
+    validators = listingValidators(id)
+    if validators is None:
+        return jsonError("No such listing", 404)
+    etag, lastModified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=lastModified)
+    if response is None:
+        response = render()
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(lastModified)
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+# Open listings newest first, or with ?q= the search results. Filters: category, closed=1
+@apiView(["GET"])
+def listings(request):
+    closed = request.GET.get("closed") == "1"
+    category = None
+    if request.GET.get("category"):
+        category = categoryRegistry.byName(request.GET["category"])
+        # No listing is in a category that does not exist
+        if category is None:
+            return listingPageJson([], None)
+    query = request.GET.get("q", "").strip()
+    listings = AuctionListing.objects.select_related('user', 'category').only(*LISTING_FIELDS)
+    if query:
+        # Search results are ranked, so their cursor is the next page number
+        page = request.GET.get("cursor", "1")
+        page = int(page) if page.isdigit() and int(page) > 0 else 1
+        ids, hasNext = searchListings(query, category=category.id if category else None, openOnly=not closed, page=page)
+        found = listings.in_bulk(ids)
+        return listingPageJson([found[id] for id in ids if id in found], str(page + 1) if hasNext else None)
+    listings = listings.filter(isClosed=closed)
+    if category:
+        listings = listings.filter(category_id=category.id)
+    return listingPageJson(*keysetPage(listings, request.GET.get("cursor"), 'listingDate'))
+
+
+@apiView(["GET"])
+def listing(request, id):
+    def render():
+        listing = AuctionListing.objects.select_related('user', 'category', 'highestBid__user') \
+            .only(*DETAIL_FIELDS).get(id=id)
+        data = listingJson(listing)
+        data["version"] = listing.version
+        data["highestBidder"] = listing.highestBid.user.username if listing.highestBid else None
+        return jsonResponse(data)
+    return conditionalListing(request, id, render)
+
+
+@apiView(["POST"], authenticated=True)
+def bids(request, id):
+    data = requestData(request)
+    if data is None:
+        return jsonError("Malformed request body", 400)
+    try:
+        bid = submitWrite(placeBid, request.apiUser, id, data.get("amount"))
+    except BidError as error:
+        return jsonError(str(error), 409)
+    invalidateListing(id)
+    publish(id, "bid", amount=bid.bidAmount, bidder=bid.user.username)
+    return jsonResponse(bidJson(id, bid), 201)
+
+
+# Set the maximum the engine bids up to for the token's user: {"maximum": amount}.
+# Answers with the leading bid, which is someone else's when the maximum was not enough.
+@apiView(["POST"], authenticated=True)
+def proxy(request, id):
+    data = requestData(request)
+    if data is None:
+        return jsonError("Malformed request body", 400)
+    try:
+        bid = submitWrite(placeProxyBid, request.apiUser, id, data.get("maximum"))
+    except BidError as error:
+        return jsonError(str(error), 409)
+    invalidateListing(id)
+    if bid is None:
+        return jsonResponse({"listing": id, "maximum": int(data.get("maximum"))}, 201)
+    publish(id, "bid", amount=bid.bidAmount, bidder=bid.user.username)
+    return jsonResponse({**bidJson(id, bid), "maximum": int(data.get("maximum"))}, 201)
+
+
+# The leading bid after a bid was resolved, with the bidder as the proxies may have answered it
+def bidJson(listingId, bid):
+    return {"id": bid.id, "listing": listingId, "amount": bid.bidAmount, "bidder": bid.user.username, "date": bid.bidDate}
+
+
+@apiView(["GET", "POST"], authenticated=True)
+def comments(request, id):
+    if request.method == "POST":
+        data = requestData(request)
+        if data is None or not isinstance(data.get("comment", ""), str):
+            return jsonError("Malformed request body", 400)
+        text = data.get("comment", "").strip()
+        if not text:
+            return jsonError("A comment needs some text", 400)
+        try:
+            comment = submitWrite(postComment, request.apiUser, id, text)
+        except AuctionListing.DoesNotExist:
+            return jsonError("No such listing", 404)
+        invalidateListing(id)
+        publish(id, "comment", user=request.apiUser.username, comment=text, date=comment.commentDate.isoformat())
+        return jsonResponse({"id": comment.id, "user": request.apiUser.username, "comment": text,
+            "date": comment.commentDate}, 201)
+
+    cursor = request.GET.get("cursor")
+    if cursor and decodeCursor(cursor) is None:
+        return jsonError("Malformed cursor", 400)
+
+    def render():
+        comments, nextCursor = commentPage(id, cursor)
+        return jsonResponse({
+            "comments": [{"id": comment.id, "user": comment.user.username, "comment": comment.comments,
+                "date": comment.commentDate} for comment in comments],
+            "next": nextCursor
+        })
+    return conditionalListing(request, id, render)
+
+
+# Listings watched by the token's user, and batch changes: {"add": [ids], "remove": [ids]}
+@apiView(["GET", "POST"], authenticated=True)
+def watchlist(request):
+    if request.apiUser is None:
+        return jsonError("Authentication required", 401)
+    if request.method == "POST":
+        data = requestData(request)
+        if data is None:
+            return jsonError("Malformed request body", 400)
+        add, remove = requestIds(data, "add"), requestIds(data, "remove")
+        if add is None or remove is None:
+            return jsonError("Malformed request body", 400)
+        if add:
+            addToWatchlist(request.apiUser, add)
+        if remove:
+            removeFromWatchlist(request.apiUser, remove)
+    listings = AuctionListing.objects.filter(watchlist__user=request.apiUser) \
+        .select_related('user', 'category').only(*LISTING_FIELDS)
+    return listingPageJson(*keysetPage(listings, request.GET.get("cursor"), 'listingDate'))
+
+
+# Listings of the token's user with their stats, ?status=open/closed/all, and bulk close:
+# {"close": [ids]} closes those that are the user's and still open
+@apiView(["GET", "POST"], authenticated=True)
+def dashboard(request):
+    if request.apiUser is None:
+        return jsonError("Authentication required", 401)
+    closed = []
+    if request.method == "POST":
+        data = requestData(request)
+        if data is None:
+            return jsonError("Malformed request body", 400)
+        ids = requestIds(data, "close")
+        if ids is None:
+            return jsonError("Malformed request body", 400)
+        closed = bulkClose(request.apiUser, ids)
+    status = request.GET.get("status")
+    if status not in STATUSES:
+        status = "all"
+    listings, nextCursor = dashboardPage(request.apiUser, status, request.GET.get("cursor"))
+    return jsonResponse({"listings": [dashboardRow(listing) for listing in listings], "next": nextCursor,
+        "closed": closed})
+
+
+# Exchange a username and password for a new token
+@apiView(["POST"])
+def tokens(request):
+    data = requestData(request)
+    if data is None or not all(isinstance(data.get(field, ""), str) for field in ("username", "password", "name")):
+        return jsonError("Malformed request body", 400)
+    user = authenticate(request, username=data.get("username"), password=data.get("password"))
+    if user is None:
+        return jsonError("Invalid username and/or password", 401)
+    return jsonResponse({"token": issueToken(user, data.get("name", "")[:50])}, 201)
@@ -1,5 +1,25 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        from .auth import userChanged
+        from .categories import categorySaved
+        from .models import Category, User
+        post_save.connect(categorySaved, sender=Category, dispatch_uid='categories-saved')
+        post_delete.connect(categorySaved, sender=Category, dispatch_uid='categories-deleted')
+        post_save.connect(userChanged, sender=User, dispatch_uid='auth-user-saved')
+        post_delete.connect(userChanged, sender=User, dispatch_uid='auth-user-deleted')
+        if settings.CONN_HEALTH_CHECKS:
+            from .routers import checkConnections, connectionsUsed
+            request_started.connect(checkConnections, dispatch_uid='check-connections')
+            request_finished.connect(connectionsUsed, dispatch_uid='connections-used')
+        if settings.SQLITE_CONCURRENT:
+            from .sqlite import tuneConnection
+            connection_created.connect(tuneConnection, dispatch_uid='tune-sqlite')
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+
+
+def userKey(userId):
+    return f"auth-user:{userId}"
+
+
+# Load the user of a session from the cache, so that with cached or cookie sessions an
+# authenticated request costs no query at all. The session auth hash is still checked
+# against the cached password, and saving or deleting a user evicts it (see userChanged).
+# QuerySet.update() on users bypasses the signals and must call userChanged itself.
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = userKey(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+def userChanged(sender, instance, **kwargs):
+    cache.delete(userKey(instance.pk))
+
+
+# PBKDF2 with the iteration count of settings.PASSWORD_ITERATIONS. Django's check_password
+# asks the preferred hasher whether a stored hash must be updated, which compares the
+# iteration counts, so hashes made under another profile are redone on the next login.
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_ITERATIONS
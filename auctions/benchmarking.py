@@ -0,0 +1,63 @@
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+# Run the body against a freshly migrated, throwaway copy of the configured database.
+# Benchmarks seed large synthetic datasets, which must never land in the real one.
+@contextmanager
+def throwawayDatabase():
+    # Threads cannot share an in-memory SQLite database, use a temporary file instead
+    if connection.vendor == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = path
+    oldName = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(oldName, verbosity=0)
+
+
+# Fill the database with a synthetic auction site using bulk inserts.
+# Every listing gets the same number of bids and comments, and every user watches
+# the same number of listings. Returns the created users and listing ids.
+def seedDataset(users=100, listings=1000, bids=5, comments=5, watches=10, categories=10, chunk=2000):
+    from .bidding import rebuildBidSummary
+    from .models import AuctionListing, Bidding, Category, Comments, User, Watchlist
+
+    rng = random.Random(0)
+    User.objects.bulk_create([User(username=f"bench-user-{i}", password="!") for i in range(users)], chunk)
+    people = list(User.objects.filter(username__startswith="bench-user-").values_list('id', flat=True))
+    Category.objects.bulk_create([Category(categoryName=f"Bench category {i}") for i in range(categories)])
+    groups = list(Category.objects.filter(categoryName__startswith="Bench category ").values_list('id', flat=True))
+    for start in range(0, listings, chunk):
+        with transaction.atomic():
+            AuctionListing.objects.bulk_create([AuctionListing(user_id=rng.choice(people),
+                auctionTitle=f"Bench listing {i}", image="http://localhost/image.png",
+                auctionDetails=f"Synthetic listing number {i}", currentBid=bids * 10, category_id=rng.choice(groups),
+                isClosed=rng.random() < 0.2) for i in range(start, min(start + chunk, listings))])
+    listingIds = list(AuctionListing.objects.filter(auctionTitle__startswith="Bench listing ")
+        .values_list('id', flat=True))
+    for start in range(0, len(listingIds), chunk):
+        batch = listingIds[start:start + chunk]
+        with transaction.atomic():
+            Bidding.objects.bulk_create([Bidding(user_id=rng.choice(people), auction_id=id, bidAmount=amount * 10)
+                for id in batch for amount in range(1, bids + 1)], chunk)
+            Comments.objects.bulk_create([Comments(user_id=rng.choice(people), auction_id=id,
+                comments=f"Synthetic comment {number}") for id in batch for number in range(comments)], chunk)
+    Watchlist.objects.bulk_create([Watchlist(user_id=user, listing_id=listing) for user in people
+        for listing in rng.sample(listingIds, min(watches, len(listingIds)))], chunk, ignore_conflicts=True)
+    rebuildBidSummary(AuctionListing.objects.filter(id__in=listingIds))
+    return list(User.objects.filter(id__in=people)), listingIds
+
+
+# Latency percentiles in milliseconds of a list of durations in seconds
+def percentiles(durations):
+    ordered = sorted(duration * 1000 for duration in durations)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
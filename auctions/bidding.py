@@ -0,0 +1,222 @@
+import heapq
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import OperationalError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .analytics import recordBid
+from .models import AuctionListing, Bidding, ProxyBid, User
+from .notifications import recordOutbid
+
+
+# Raised when a bid is rejected, the message is shown to the bidder
+class BidError(Exception):
+    pass
+
+
+# Amount by which a proxy outbids the next highest maximum
+INCREMENT = 1
+# Listings whose proxy book a process keeps in memory
+BOOK_LIMIT = 10000
+# Attempts at a bid that keeps timing out on the listing's lock
+BID_ATTEMPTS = 3
+# Standing bid of the current leader, older than any proxy
+STANDING = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+
+# A bidder competing for a listing: a proxy, the incoming bid or the leader's standing bid
+Contender = namedtuple('Contender', ['amount', 'placedAt', 'userId', 'username', 'kind'])
+PROXY, MANUAL, STANDING_BID = 'proxy', 'manual', 'standing'
+
+
+def rank(contender):
+    return (-contender.amount, contender.placedAt)
+
+
+# Maximums of the proxies on one listing as a heap ordered by maximum, then time.
+# Raising a maximum pushes a new entry; the replaced one is dropped when it surfaces.
+class ProxyBook:
+    def __init__(self, version, contenders):
+        # listing version the book is current for
+        self.version = version
+        self.current = {contender.userId: contender for contender in contenders}
+        self.heap = [(rank(contender), contender) for contender in contenders]
+        heapq.heapify(self.heap)
+
+    @classmethod
+    def load(cls, listingId, version, price):
+        # Maximums at or below the price can never bid again
+        proxies = ProxyBid.objects.filter(listing_id=listingId, maxAmount__gt=price) \
+            .values_list('maxAmount', 'placedAt', 'user_id', 'user__username')
+        return cls(version, [Contender(*proxy, PROXY) for proxy in proxies])
+
+    def set(self, contender):
+        self.current[contender.userId] = contender
+        heapq.heappush(self.heap, (rank(contender), contender))
+
+    # The count best proxies, each of a different user
+    def top(self, count):
+        found = []
+        while self.heap and len(found) < count:
+            entry = heapq.heappop(self.heap)
+            if self.current.get(entry[1].userId) is entry[1]:
+                found.append(entry)
+        for entry in found:
+            heapq.heappush(self.heap, entry)
+        return [contender for _, contender in found]
+
+
+# Proxy books of the most recently bid listings. A book is only valid for the listing
+# version it was built or last updated at, so a bid committed by another process makes
+# the next bid here rebuild it from ProxyBid.
+class ProxyBooks:
+    def __init__(self, limit=BOOK_LIMIT):
+        self.limit = limit
+        self.books = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Best count proxies of the listing at version, rebuilding its book on a miss.
+    # A rebuilt book is kept once the transaction that read it commits.
+    def top(self, listingId, version, price, count):
+        with self.lock:
+            book = self.books.get(listingId)
+            if book is not None and book.version == version:
+                self.books.move_to_end(listingId)
+                return book.top(count)
+        book = ProxyBook.load(listingId, version, price)
+        transaction.on_commit(lambda: self.store(listingId, book))
+        with self.lock:
+            return book.top(count)
+
+    def store(self, listingId, book):
+        with self.lock:
+            current = self.books.get(listingId)
+            if current is None or current.version < book.version:
+                self.books[listingId] = book
+                self.books.move_to_end(listingId)
+                while len(self.books) > self.limit:
+                    self.books.popitem(last=False)
+
+    # Move the book of a listing from version to the next one, adding the proxy set by the bid
+    def applied(self, listingId, version, proxy):
+        with self.lock:
+            book = self.books.get(listingId)
+            if book is not None and book.version == version:
+                if proxy is not None:
+                    book.set(proxy)
+                book.version = version + 1
+
+    def clear(self):
+        with self.lock:
+            self.books.clear()
+
+
+proxyBooks = ProxyBooks()
+
+
+# Place a bid of amount on a listing on behalf of user, and let the proxies of other
+# users answer it. Returns the new leading bid.
+def placeBid(user, listingId, amount):
+    return resolveBid(user, listingId, amount, MANUAL)
+
+
+# Set the maximum user is willing to pay for a listing. The engine bids for them, right
+# away and against every later bid, up to that maximum. Returns the new leading bid, or
+# None when the maximum did not move the price.
+def placeProxyBid(user, listingId, maximum):
+    return resolveBid(user, listingId, maximum, PROXY)
+
+
+def resolveBid(user, listingId, amount, kind):
+    try:
+        listingId = int(listingId)
+        amount = int(amount)
+    except (TypeError, ValueError):
+        raise BidError("Please enter a whole number as your bid")
+    for attempt in range(BID_ATTEMPTS):
+        try:
+            return attemptBid(user, listingId, amount, kind)
+        except OperationalError:
+            # The lock wait timed out, SQLite's busy timeout or a server's lock timeout
+            continue
+    raise BidError("This listing is busy right now, please try again")
+
+
+# Resolve one incoming bid against the leader and the best proxies in a single transaction.
+# The transaction starts by bumping the listing's version, which takes its row lock, or
+# SQLite's write lock, before anything is read: concurrent bids on a listing queue up behind
+# it and each one reads the price the previous one left. Reading first would make SQLite
+# refuse the later write at once instead of waiting. Whatever the number of proxies, this
+# reads the listing row, writes the new bids and moves the price. Rejected bids roll back.
+def attemptBid(user, listingId, amount, kind):
+    now = timezone.now()
+    with transaction.atomic():
+        if not AuctionListing.objects.filter(id=listingId).update(version=F('version') + 1):
+            raise BidError("There is no listing associated")
+        listing = AuctionListing.objects.filter(id=listingId).values('user_id', 'isClosed', 'endsAt', 'currentBid',
+            'version', 'highestBid__user_id', 'highestBid__user__username').get()
+        if listing['isClosed'] or (listing['endsAt'] is not None and listing['endsAt'] <= now):
+            raise BidError("This listing has already been closed")
+        if listing['user_id'] == user.id:
+            raise BidError("You cannot bid on your own listing")
+        # The version the listing had before this bid, which the proxy books are kept for
+        price, version, leaderId = listing['currentBid'], listing['version'] - 1, listing['highestBid__user_id']
+        if amount <= price:
+            noun = "maximum" if kind == PROXY else "bid"
+            raise BidError(f"Your {noun} must be higher than the current bid of {price}$")
+
+        # The user's own proxy is replaced by the incoming bid, so three cover two other users
+        incoming = Contender(amount, now, user.id, user.username, kind)
+        contenders = [incoming] + [proxy for proxy in proxyBooks.top(listingId, version, price, 3)
+            if proxy.userId != user.id]
+        if leaderId is not None and leaderId != user.id:
+            contenders.append(Contender(price, STANDING, leaderId, listing['highestBid__user__username'], STANDING_BID))
+        best = {}
+        for contender in sorted(contenders, key=rank):
+            best.setdefault(contender.userId, contender)
+        ranked = sorted(best.values(), key=rank)
+        winner = ranked[0]
+        # The winner pays just enough to beat the runner-up, and a new leader at least outbids the price
+        beaten = ranked[1].amount + INCREMENT if len(ranked) > 1 else 0
+        if winner is incoming and kind == MANUAL:
+            newPrice = amount
+        elif winner.userId == leaderId:
+            newPrice = max(price, min(winner.amount, beaten))
+        else:
+            newPrice = min(winner.amount, max(beaten, price + INCREMENT))
+
+        bids = []
+        if kind == MANUAL:
+            bids.append(Bidding.objects.create(user=user, auction_id=listingId, bidAmount=amount))
+        if not (winner is incoming and kind == MANUAL) and (winner.userId != leaderId or newPrice != price):
+            bidder = User(id=winner.userId, username=winner.username)
+            bids.append(Bidding.objects.create(user=bidder, auction_id=listingId, bidAmount=newPrice))
+        if kind == PROXY:
+            if not ProxyBid.objects.filter(listing_id=listingId, user=user).update(maxAmount=amount, placedAt=now):
+                ProxyBid.objects.create(listing_id=listingId, user=user, maxAmount=amount, placedAt=now)
+
+        if bids:
+            AuctionListing.objects.filter(id=listingId).update(currentBid=newPrice, highestBid=bids[-1],
+                bidCount=F('bidCount') + len(bids), lastActivity=bids[-1].bidDate)
+        for bid in bids:
+            recordBid(bid)
+        if bids:
+            recordOutbid(bids[-1])
+        transaction.on_commit(lambda: proxyBooks.applied(listingId, version, incoming if kind == PROXY else None))
+        return bids[-1] if bids else None
+
+
+# Recompute highestBid and bidCount of the given listings (all by default) from the bid history.
+# Runs as a single UPDATE with correlated subqueries served by the (auction, -bidAmount) index.
+def rebuildBidSummary(listings=None):
+    if listings is None:
+        listings = AuctionListing.objects.all()
+    bids = Bidding.objects.filter(auction=OuterRef('pk'))
+    return listings.update(
+        highestBid=Subquery(bids.order_by('-bidAmount', '-id').values('id')[:1]),
+        bidCount=Coalesce(Subquery(bids.order_by().values('auction').annotate(total=Count('id')).values('total')), Value(0)),
+    )
@@ -0,0 +1,181 @@
+import codecs
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .analytics import recordListed
+from .categories import registry as categoryRegistry
+from .forms import ImportListingForm
+from .images import queueThumbnails
+from .models import AuctionListing, Bidding
+from .sqlite import submitWrite
+
+FORMATS = ["csv", "jsonl"]
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+# Valid rows inserted per transaction
+BATCH_SIZE = 500
+# Row errors kept for the report, later ones are only counted
+MAX_ERRORS = 1000
+# Rows read per query while exporting
+EXPORT_CHUNK = 1000
+
+# Exported columns, named like the import columns so an export can be imported again
+LISTING_COLUMNS = [('id', 'id'), ('auctionTitle', 'auctionTitle'), ('image', 'image'), ('currentBid', 'currentBid'),
+    ('auctionDetails', 'auctionDetails'), ('category', 'category__categoryName'), ('endsAt', 'endsAt'),
+    ('isClosed', 'isClosed'), ('listingDate', 'listingDate'), ('bidCount', 'bidCount'), ('seller', 'user__username')]
+BID_COLUMNS = [('id', 'id'), ('listing', 'auction_id'), ('bidder', 'user__username'), ('bidAmount', 'bidAmount'),
+    ('bidDate', 'bidDate')]
+
+
+class BulkFormatError(Exception):
+    pass
+
+
+def formatOf(name, format=None):
+    format = (format or name.rsplit(".", 1)[-1]).lower()
+    if format == "ndjson":
+        format = "jsonl"
+    if format not in FORMATS:
+        raise BulkFormatError(f"Unsupported format {format}, use one of {', '.join(FORMATS)}")
+    return format
+
+
+# Parse a binary stream of CSV with a header row, or of one JSON object per line, one row at
+# a time. Yields (line number, row, None) or (line number, None, error message).
+def readRows(stream, format):
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "More values than columns"
+            else:
+                yield reader.line_num, row, None
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, None, f"Invalid JSON: {error}"
+            continue
+        if isinstance(row, dict):
+            yield number, row, None
+        else:
+            yield number, None, "Expected a JSON object"
+
+
+# Check one row against the ListingForm rules and build its unsaved listing
+def validateRow(row, seller):
+    form = ImportListingForm(data={key: value for key, value in row.items() if value is not None})
+    errors = {field: list(messages) for field, messages in form.errors.items()} if not form.is_valid() else {}
+    name = str(row.get('category') or '').strip()
+    category = categoryRegistry.byName(name)
+    if category is None:
+        errors['category'] = [f"Unknown category \"{name}\""]
+    if errors:
+        return None, errors
+    listing = form.instance
+    listing.user = seller
+    listing.category_id = category.id
+    return listing, None
+
+
+# Insert one batch in a single transaction and give the listings their ids
+def insertBatch(listings, thumbnails=True):
+    with transaction.atomic():
+        created = AuctionListing.objects.bulk_create(listings)
+        if created and created[0].id is None:
+            # Only SQLite does not return the ids. The batch holds its write lock from the
+            # insert to the commit, so its rows are the newest ones.
+            ids = AuctionListing.objects.order_by('-id').values_list('id', flat=True)[:len(created)]
+            for listing, id in zip(created, reversed(list(ids))):
+                listing.id = listing.pk = id
+        recordListed(created)
+        if thumbnails:
+            for listing in created:
+                queueThumbnails(listing.id)
+    return created
+
+
+# Import listings for seller from a stream, validating and inserting them in batches.
+# Bad rows are reported with their line number and never stop the rest of the import.
+# Without thumbnails, the images are left to the makethumbnails command.
+def importListings(stream, format, seller, batchSize=BATCH_SIZE, thumbnails=True):
+    report = {"created": 0, "failed": 0, "errors": []}
+
+    def fail(number, errors):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_ERRORS:
+            report["errors"].append({"line": number, "errors": errors})
+
+    def flush(batch):
+        if batch:
+            created = submitWrite(insertBatch, batch, thumbnails)
+            categoryRegistry.listingsOpened([listing.category_id for listing in created])
+            report["created"] += len(created)
+
+    batch = []
+    try:
+        for number, row, error in readRows(stream, format):
+            if error is not None:
+                fail(number, {"row": [error]})
+                continue
+            listing, errors = validateRow(row, seller)
+            if errors:
+                fail(number, errors)
+                continue
+            batch.append(listing)
+            if len(batch) >= batchSize:
+                flush(batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as error:
+        report["aborted"] = f"Cannot read the file: {error}"
+    flush(batch)
+    return report
+
+
+# Stream the rows of a queryset in the given format, reading EXPORT_CHUNK rows per query
+# in id order so that only one chunk is ever held in memory
+def exportRows(queryset, columns, format):
+    names = [name for name, _ in columns]
+    fields = [field for _, field in columns]
+    output = CsvLine()
+    writer = csv.writer(output)
+    if format == "csv":
+        yield writer.writerow(names)
+    last = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last).order_by('id').values_list(*fields)[:EXPORT_CHUNK])
+        if not chunk:
+            return
+        if format == "csv":
+            yield "".join(writer.writerow(row) for row in chunk)
+        else:
+            yield "".join(json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n" for row in chunk)
+        last = chunk[-1][0]
+
+
+# File-like object whose write returns the line, so csv.writer formats without buffering
+class CsvLine:
+    def write(self, value):
+        return value
+
+
+def exportListings(format, seller=None):
+    listings = AuctionListing.objects.all()
+    if seller is not None:
+        listings = listings.filter(user=seller)
+    return exportRows(listings, LISTING_COLUMNS, format)
+
+
+# Bid history of all listings, or of the listings of seller
+def exportBids(format, seller=None):
+    bids = Bidding.objects.all()
+    if seller is not None:
+        bids = bids.filter(auction__user=seller)
+    return exportRows(bids, BID_COLUMNS, format)
+
@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+# Seconds a cached entry lives when no write invalidates it first
+LISTING_TIMEOUT = 300
+# Seconds a recompute lock is held at most, and how long other readers wait for it
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+
+# Hit/miss counters of this process, exposed by views.cacheStats
+stats = {"hits": 0, "misses": 0, "recomputes": 0, "waits": 0}
+statsLock = threading.Lock()
+
+
+def count(name):
+    with statsLock:
+        stats[name] += 1
+
+
+# Snapshot of the counters together with the hit ratio
+def cacheStats():
+    with statsLock:
+        snapshot = dict(stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hitRatio"] = snapshot["hits"] / lookups if lookups else 0.0
+    return snapshot
+
+
+# Every listing has a generation number that is part of all its cache keys.
+# Invalidating bumps the generation, so a reader that was recomputing while a
+# write happened stores its stale value under a key nobody reads any more.
+def generationKey(listingId):
+    return f"listing:{listingId}:generation"
+
+
+def listingKey(listingId, part):
+    generation = cache.get(generationKey(listingId))
+    if generation is None:
+        generation = 0
+        cache.add(generationKey(listingId), generation, None)
+    return f"listing:{listingId}:{generation}:{part}"
+
+
+# Drop every cached entry of a listing, called after each bid, comment and close
+def invalidateListing(listingId):
+    try:
+        cache.incr(generationKey(listingId))
+    except ValueError:
+        cache.set(generationKey(listingId), 1, None)
+
+
+# Return the cached value of key, computing and storing it on a miss.
+# Only the reader that wins the lock recomputes; concurrent readers of the same
+# missing key poll for its result instead of all hitting the database at once.
+# compute may return None for "nothing to cache", which is never stored.
+def readThrough(key, compute, timeout=LISTING_TIMEOUT):
+    value = cache.get(key)
+    if value is not None:
+        count("hits")
+        return value
+    count("misses")
+    lockKey = f"{key}:lock"
+    if not cache.add(lockKey, 1, LOCK_TIMEOUT):
+        count("waits")
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        # The winner is too slow or died, compute without storing
+        return compute()
+    try:
+        count("recomputes")
+        value = compute()
+        if value is not None:
+            cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lockKey)
+
+
+def pageKey(path):
+    return "page:" + hashlib.sha256(path.encode()).hexdigest()
+
+
+# Serve anonymous GETs of a view from a whole-page cache for ANONYMOUS_PAGE_TIMEOUT seconds.
+# Logged in users see their own watch buttons and always get a fresh page. The response
+# varies on Cookie so shared caches never hand an anonymous page to a logged in user.
+def cacheAnonymousPage(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET" or request.user.is_authenticated:
+            response = view(request, *args, **kwargs)
+        else:
+            key = pageKey(request.get_full_path())
+            page = cache.get(key)
+            if page is not None:
+                count("hits")
+                response = HttpResponse(page[0], content_type=page[1])
+            else:
+                count("misses")
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies and not response.streaming:
+                    cache.set(key, (response.content, response["Content-Type"]), settings.ANONYMOUS_PAGE_TIMEOUT)
+        patch_vary_headers(response, ["Cookie"])
+        return response
+    return wrapper
@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+# Seconds a rendered card stays cached. Its key changes whenever the card does, so this
+# only bounds how long cards of listings nobody looks at keep their memory.
+CARD_TIMEOUT = 24 * 3600
+
+
+# Everything of a listing URL but its trailing id, reversed once per process instead of once per card
+@lru_cache(maxsize=None)
+def urlPrefix(name):
+    return reverse(name, args=["0"])[:-1]
+
+
+# A card depends only on the listing's columns, and every change to those bumps version
+def cardKey(listing):
+    return f"card:{listing.id}:{listing.version}"
+
+
+# The listing cards of index.html. The card bodies are the same for every user and every
+# page showing the listing, so they are rendered once per version, fetched with a single
+# get_many and only the watch button is decided per request.
+def listingCards(listings, watched):
+    keys = [cardKey(listing) for listing in listings]
+    cached = cache.get_many(keys)
+    rendered = {}
+    cards = []
+    for key, listing in zip(keys, listings):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string("auctions/listingcard.html", {
+                "listing": listing,
+                "details_url": urlPrefix("auctiondetails") + str(listing.id)
+            })
+        cards.append({
+            "html": mark_safe(html),
+            "watched": listing.id in watched,
+            "add_url": urlPrefix("add_watchlist") + str(listing.id),
+            "remove_url": urlPrefix("remove_watchlist") + str(listing.id)
+        })
+    if rendered:
+        cache.set_many(rendered, CARD_TIMEOUT)
+    return cards
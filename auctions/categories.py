@@ -0,0 +1,102 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Category
+
+# Shared generation number of the category data, bumped by every process that changes it
+GENERATION_KEY = "categories:generation"
+
+
+# One category of the registry with its number of open listings
+class CategoryEntry:
+    def __init__(self, id, categoryName, openCount):
+        self.id = id
+        self.categoryName = categoryName
+        self.openCount = openCount
+
+    def __str__(self):
+        return self.categoryName
+
+
+# In-memory directory of the categories and their open listing counts.
+# Every process keeps its own copy and compares it with a generation number in the
+# shared cache: a read costs one cache lookup, and only a stale copy is reloaded with
+# a single aggregate query. A copy older than CATEGORY_REFRESH seconds is reloaded too,
+# so processes that do not share the cache still converge. Nothing is loaded before the
+# first request needs it.
+class CategoryRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = None
+        self.generation = None
+        self.loadedAt = None
+
+    def load(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, 0, None)
+            generation = cache.get(GENERATION_KEY)
+        with self.lock:
+            if self.entries is not None and generation == self.generation \
+                    and time.monotonic() - self.loadedAt < settings.CATEGORY_REFRESH:
+                return self.entries
+        categories = Category.objects.order_by('categoryName') \
+            .annotate(openCount=Count('auctionlisting', filter=Q(auctionlisting__isClosed=False)))
+        entries = {category.categoryName: CategoryEntry(category.id, category.categoryName, category.openCount)
+            for category in categories}
+        with self.lock:
+            self.entries, self.generation, self.loadedAt = entries, generation, time.monotonic()
+        return entries
+
+    def all(self):
+        return list(self.load().values())
+
+    def byName(self, name):
+        return self.load().get(name)
+
+    def byId(self, id):
+        return next((entry for entry in self.load().values() if entry.id == id), None)
+
+    # Choices of the category select of ListingForm
+    def choices(self):
+        return [("", "---------")] + [(entry.id, entry.categoryName) for entry in self.load().values()]
+
+    # Tell every process the categories changed. When nobody else changed them since this
+    # process loaded its copy, apply adjust to it in place instead of reloading.
+    def changed(self, adjust=None):
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 0, None)
+            generation = cache.incr(GENERATION_KEY)
+        with self.lock:
+            if adjust is not None and self.entries is not None and self.generation == generation - 1:
+                adjust(self.entries)
+                self.generation = generation
+            else:
+                self.entries = None
+
+    # Keep the open counts up to date when listings are created or closed
+    def listingsOpened(self, categoryIds):
+        self.changed(lambda entries: self.adjustCounts(entries, categoryIds, 1))
+
+    def listingsClosed(self, categoryIds):
+        self.changed(lambda entries: self.adjustCounts(entries, categoryIds, -1))
+
+    def adjustCounts(self, entries, categoryIds, delta):
+        byId = {entry.id: entry for entry in entries.values()}
+        for categoryId in categoryIds:
+            if categoryId in byId:
+                byId[categoryId].openCount += delta
+
+
+registry = CategoryRegistry()
+
+
+# Connected in AuctionsConfig.ready, any change to the categories reloads the registry
+def categorySaved(sender, **kwargs):
+    registry.changed()
@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import recordActivity
+from .models import AuctionEvent, AuctionListing, Comments
+from .pagination import decodeCursor, keysetPage
+
+# Comments shown on the details page before the reader asks for older ones
+COMMENT_PAGE_SIZE = 20
+
+
+class CursorError(Exception):
+    pass
+
+
+# One page of a listing's comments, newest first, and the cursor of the older ones.
+# Readers append the page to the ones they have, so a malformed cursor is an error rather
+# than the first page again.
+def commentPage(id, cursor):
+    if cursor and decodeCursor(cursor) is None:
+        raise CursorError("Malformed cursor")
+    comments = Comments.objects.filter(auction_id=id).select_related('user') \
+        .only('id', 'comments', 'commentDate', 'user__username')
+    return keysetPage(comments, cursor, 'commentDate', COMMENT_PAGE_SIZE)
+
+
+# Add a comment to a listing and move its lastActivity, which the API serves as Last-Modified
+def postComment(user, listingId, text):
+    with transaction.atomic():
+        if not AuctionListing.objects.filter(id=listingId).update(lastActivity=timezone.now()):
+            raise AuctionListing.DoesNotExist(f"No listing {listingId}")
+        recordActivity([listingId], AuctionEvent.COMMENTED)
+        return Comments.objects.create(user=user, auction_id=listingId, comments=text)
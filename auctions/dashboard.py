@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .analytics import recordSales
+from .expiry import finalizeClosed
+from .models import AuctionListing, Comments, Watchlist
+from .notifications import recordClosed
+from .pagination import keysetPage
+from .sqlite import submitWrite
+
+# Listings per dashboard page
+PAGE_SIZE = 50
+# Listings closed per transaction by a bulk close
+CLOSE_BATCH = 500
+STATUSES = {"open": False, "closed": True, "all": None}
+DASHBOARD_FIELDS = ['id', 'version', 'auctionTitle', 'image', 'imageKey', 'currentBid', 'bidCount', 'listingDate', 'endsAt',
+    'isClosed', 'lastActivity', 'category__categoryName', 'highestBid__bidAmount', 'highestBid__user__username']
+
+
+# Number of rows of model pointing at each listing, as a correlated subquery on its listing index
+def perListing(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('id'))
+    return Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), Value(0))
+
+
+# One page of a seller's listings, newest first, with their stats in a single query: the bid
+# count is a maintained counter, the top bidder comes from highestBid, and comments and
+# watchers are counted by subqueries that only run for the rows of the page
+def dashboardPage(seller, status="all", cursor=None, pageSize=PAGE_SIZE):
+    listings = AuctionListing.objects.filter(user=seller)
+    if STATUSES.get(status) is not None:
+        listings = listings.filter(isClosed=STATUSES[status])
+    listings = listings.select_related('category', 'highestBid__user').only(*DASHBOARD_FIELDS) \
+        .annotate(commentCount=perListing(Comments, 'auction'), watcherCount=perListing(Watchlist, 'listing'))
+    return keysetPage(listings, cursor, 'listingDate', pageSize)
+
+
+def dashboardRow(listing):
+    return {
+        "id": listing.id,
+        "title": listing.auctionTitle,
+        "thumbnail": listing.cardImage,
+        "category": listing.category.categoryName,
+        "currentBid": listing.currentBid,
+        "bidCount": listing.bidCount,
+        "topBidder": listing.highestBid.user.username if listing.highestBid else None,
+        "comments": listing.commentCount,
+        "watchers": listing.watcherCount,
+        "listingDate": listing.listingDate,
+        "endsAt": listing.endsAt,
+        "isClosed": listing.isClosed,
+        "lastActivity": listing.lastActivity,
+    }
+
+
+# Close the open listings of seller among listingIds in one transaction, returns their ids
+def closeListings(seller, listingIds):
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(AuctionListing.objects.select_for_update()
+            .filter(id__in=listingIds, user=seller, isClosed=False).values_list('id', flat=True))
+        AuctionListing.objects.filter(id__in=ids).update(isClosed=True, lastActivity=now, version=F('version') + 1)
+        recordClosed(ids)
+        recordSales(ids, now)
+    return ids
+
+
+# Close any number of a seller's listings in batches, then refresh caches and notify viewers.
+# Ids of other sellers' or already closed listings are skipped.
+def bulkClose(seller, listingIds):
+    listingIds = list(listingIds)
+    closed = []
+    for start in range(0, len(listingIds), CLOSE_BATCH):
+        closed.extend(submitWrite(closeListings, seller, listingIds[start:start + CLOSE_BATCH]))
+    for start in range(0, len(closed), CLOSE_BATCH):
+        finalizeClosed(AuctionListing.objects.select_related('highestBid__user')
+            .filter(id__in=closed[start:start + CLOSE_BATCH]))
+    return closed
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+# Events buffered per connection before the slowest readers start losing them
+QUEUE_SIZE = 100
+
+
+# In-process publish/subscribe of listing events.
+# Streaming connections live on the ASGI event loop while views run in worker
+# threads, so publishing hands every event over to the subscriber's loop.
+class Broker:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    # Register the calling coroutine for events of a listing, returns its queue
+    def subscribe(self, listingId):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self.lock:
+            self.subscribers[str(listingId)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, listingId, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(str(listingId))
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[str(listingId)]
+
+    def connections(self, listingId=None):
+        with self.lock:
+            if listingId is not None:
+                return len(self.subscribers.get(str(listingId), ()))
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    # Fan an event out to every connection streaming the listing, safe to call from any thread
+    def publish(self, listingId, kind, data):
+        message = f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode()
+        with self.lock:
+            subscribers = list(self.subscribers.get(str(listingId), ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(deliver, queue, message)
+
+
+# Queue a message for one connection, dropping it when the reader is too far behind
+def deliver(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+broker = Broker()
+
+
+# Publish a bid, comment or close event of a listing to its live viewers
+def publish(listingId, kind, **data):
+    broker.publish(listingId, kind, data)
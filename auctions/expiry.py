@@ -0,0 +1,170 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics import recordSales
+from .cache import invalidateListing
+from .categories import registry
+from .events import publish
+from .models import AuctionEvent, AuctionListing
+from .notifications import recordClosed
+
+# How far ahead the scheduler loads closing times into memory
+HORIZON = timedelta(minutes=10)
+# How often the scheduler looks for listings created since its last load
+REFRESH = timedelta(seconds=30)
+# Listings closed per UPDATE statement
+BATCH_SIZE = 500
+# Closes committed this long after the time they were logged with are still followed
+FOLLOW_MARGIN = timedelta(seconds=30)
+
+logger = logging.getLogger(__name__)
+
+
+# Invalidate caches and notify live viewers of listings that were just closed
+def finalizeClosed(listings):
+    listings = list(listings)
+    if listings:
+        registry.listingsClosed([listing.category_id for listing in listings])
+    notifyClosed(listings)
+
+
+# Caches and event streams belong to one process, this refreshes the calling one's
+def notifyClosed(listings):
+    for listing in listings:
+        invalidateListing(listing.id)
+        publish(listing.id, "close", winner=listing.highestBid.user.username if listing.highestBid else None)
+
+
+# Close timed auctions when their endsAt passes.
+# Only listings ending within HORIZON are held in a heap keyed by endsAt; they are
+# read with a range scan of the (isClosed, endsAt) index, so neither a restart nor
+# a refresh ever reads the whole table, however many auctions are open.
+# clock is injectable so the engine can be driven by a simulated time source.
+class ExpiryScheduler:
+    def __init__(self, clock=timezone.now, horizon=HORIZON, refresh=REFRESH, batchSize=BATCH_SIZE):
+        self.clock = clock
+        self.horizon = horizon
+        self.refresh = refresh
+        self.batchSize = batchSize
+        self.heap = []
+        self.scheduled = set()
+        self.refreshedAt = None
+
+    # Load every open listing ending within the horizon that is not scheduled yet
+    def load(self, now):
+        upcoming = AuctionListing.objects \
+            .filter(isClosed=False, endsAt__lte=now + self.horizon) \
+            .order_by('endsAt') \
+            .values_list('id', 'endsAt')
+        for listingId, endsAt in upcoming.iterator():
+            self.schedule(listingId, endsAt)
+        self.refreshedAt = now
+
+    # Add one listing to the schedule, also used when a listing is created in this process
+    def schedule(self, listingId, endsAt):
+        if listingId not in self.scheduled:
+            self.scheduled.add(listingId)
+            heapq.heappush(self.heap, (endsAt, listingId))
+
+    # Close every listing due at the current time, returns the closed listings
+    def tick(self):
+        now = self.clock()
+        if self.refreshedAt is None or now - self.refreshedAt >= self.refresh:
+            self.load(now)
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, listingId = heapq.heappop(self.heap)
+            self.scheduled.discard(listingId)
+            due.append(listingId)
+        closed = []
+        for start in range(0, len(due), self.batchSize):
+            closed.extend(self.close(due[start:start + self.batchSize], now))
+        return closed
+
+    # Close one batch in a single UPDATE. Listings closed by their poster or given a
+    # later endsAt since they were scheduled no longer match and are skipped.
+    def close(self, listingIds, now):
+        with transaction.atomic():
+            expired = AuctionListing.objects.select_for_update() \
+                .filter(id__in=listingIds, isClosed=False, endsAt__lte=now)
+            listings = list(expired.select_related('highestBid__user'))
+            AuctionListing.objects.filter(id__in=[listing.id for listing in listings]) \
+                .update(isClosed=True, lastActivity=now, version=F('version') + 1)
+            recordClosed([listing.id for listing in listings])
+            recordSales([listing.id for listing in listings], now)
+        for listing in listings:
+            listing.isClosed = True
+        finalizeClosed(listings)
+        return listings
+
+    # Time of the next scheduled close or refresh, whichever comes first
+    def nextWakeup(self):
+        wakeup = (self.refreshedAt or self.clock()) + self.refresh
+        if self.heap:
+            wakeup = min(wakeup, self.heap[0][0])
+        return wakeup
+
+
+# Listings closed by other processes, runexpiry or another web worker, reach this one
+# through the closed events of the AuctionEvent log. Every web process follows the log
+# and drops its cached copies of those listings and tells its live viewers they closed.
+# Events are read by time with a margin, so one whose transaction committed late is
+# still seen, and the ids already handled are skipped.
+class ClosedFollower:
+    def __init__(self, clock=timezone.now):
+        self.clock = clock
+        self.since = clock()
+        # event id -> time of the closed events already handled
+        self.seen = {}
+
+    # Notify the listings closed since the last poll, returns them
+    def poll(self):
+        now = self.clock()
+        events = AuctionEvent.objects.filter(kind=AuctionEvent.CLOSED, at__gte=self.since - FOLLOW_MARGIN) \
+            .values_list('id', 'listing_id', 'at')
+        new = [(id, listingId, at) for id, listingId, at in events if id not in self.seen]
+        self.seen.update((id, at) for id, _, at in new)
+        self.seen = {id: at for id, at in self.seen.items() if at >= now - 2 * FOLLOW_MARGIN}
+        self.since = now
+        if not new:
+            return []
+        listings = list(AuctionListing.objects.select_related('highestBid__user')
+            .filter(id__in={listingId for _, listingId, _ in new}))
+        notifyClosed(listings)
+        return listings
+
+
+follower = None
+followerLock = threading.Lock()
+
+
+def followLoop():
+    closedFollower = ClosedFollower()
+    while True:
+        time.sleep(settings.CLOSED_FOLLOW_INTERVAL)
+        try:
+            closedFollower.poll()
+        except Exception:
+            logger.exception("Following closed listings failed")
+        finally:
+            connection.close()
+
+
+# Connected to request_started by the WSGI and ASGI entry points, so every serving process
+# follows the closes from its first request on. Started lazily, as a thread started in a
+# preloading master would not survive the fork of the workers.
+def startFollower(**kwargs):
+    global follower
+    if follower is None and settings.CLOSED_FOLLOW_INTERVAL:
+        with followerLock:
+            if follower is None:
+                follower = threading.Thread(target=followLoop, name="closed-follower", daemon=True)
+                follower.start()
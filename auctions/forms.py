@@ -0,0 +1,47 @@
+from django import forms
+from django.utils import timezone
+
+from .categories import registry as categoryRegistry
+from .models import AuctionListing
+
+
+# Model form class for an Auction Listing
+class ListingForm(forms.ModelForm):
+    class Meta:
+        model = AuctionListing
+        fields = ['auctionTitle', 'image', 'currentBid', 'auctionDetails', 'category', 'endsAt']
+        widgets = {
+            'auctionTitle': forms.TextInput(attrs={'class': 'form-control', 'aria-label': 'Title'}),
+            'image': forms.TextInput(attrs={'class': 'form-control'}),
+            'currentBid': forms.NumberInput(attrs={'class': 'form-control'}),
+            'auctionDetails': forms.Textarea(attrs={'class': 'form-control'}),
+            'category': forms.Select(attrs={'class' : 'form-control'}),
+            'endsAt': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'})
+        }
+        labels = {
+            'auctionTitle': 'Title of the new Auction',
+            'image': 'Image URL',
+            'currentBid': "Starting bid",
+            'auctionDetails': 'Details about the Auction',
+            'category': 'Select a Category',
+            'endsAt': 'Auction ends at (optional)'
+        }
+
+    # Choices come from the category registry when a form is built, never at import time
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'category' in self.fields:
+            self.fields['category'].choices = categoryRegistry.choices()
+
+    def clean_endsAt(self):
+        endsAt = self.cleaned_data['endsAt']
+        if endsAt is not None and endsAt <= timezone.now():
+            raise forms.ValidationError("The auction must end in the future")
+        return endsAt
+
+
+# The ListingForm rules for one row of a bulk import. The category is resolved by name
+# through the category registry instead of a query per row.
+class ImportListingForm(ListingForm):
+    class Meta(ListingForm.Meta):
+        fields = ['auctionTitle', 'image', 'currentBid', 'auctionDetails', 'endsAt']
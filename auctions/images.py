@@ -0,0 +1,185 @@
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import os
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .cache import invalidateListing
+from .models import AuctionListing
+from .sqlite import submitWrite
+
+logger = logging.getLogger(__name__)
+
+# Bounding box of every thumbnail kept per listing image
+THUMBNAIL_SIZES = {"card": (400, 250), "detail": (800, 600)}
+# Remote images larger than this are refused rather than buffered
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 10
+# File signatures used to name images when Pillow is not installed
+SIGNATURES = [(b"\x89PNG\r\n\x1a\n", "png"), (b"\xff\xd8\xff", "jpg"), (b"GIF8", "gif"), (b"RIFF", "webp")]
+
+
+class ImageError(Exception):
+    pass
+
+
+# Pillow is slow to import and most processes never render a thumbnail, so it is loaded
+# by the first one that does. None when it is not installed.
+def pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+# Listing images are user supplied URLs, so the fetcher must not become a way to reach
+# hosts on the server's own network
+def checkHost(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageError(f"Unsupported image URL {url}")
+    if settings.IMAGE_ALLOW_PRIVATE:
+        return
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as error:
+        raise ImageError(f"Cannot resolve {parts.hostname}: {error}")
+    for address in addresses:
+        if not ipaddress.ip_address(address[4][0]).is_global:
+            raise ImageError(f"Refusing to fetch from {parts.hostname}")
+
+
+class CheckedRedirects(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        checkHost(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+opener = build_opener(CheckedRedirects)
+
+
+def fetchImage(url):
+    checkHost(url)
+    try:
+        with opener.open(Request(url, headers={"User-Agent": "commerce-thumbnailer"}), timeout=FETCH_TIMEOUT) as response:
+            if not response.headers.get_content_type().startswith("image/"):
+                raise ImageError(f"{url} is not an image")
+            data = response.read(MAX_IMAGE_BYTES + 1)
+    except (URLError, OSError) as error:
+        raise ImageError(f"Cannot fetch {url}: {error}")
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageError(f"{url} is larger than {MAX_IMAGE_BYTES} bytes")
+    return data
+
+
+# Resize the image to every thumbnail size as progressive JPEG. Without Pillow the
+# original bytes are kept for each size, still served locally with long cache headers.
+def renderThumbnails(data):
+    Image = pillow()
+    if Image is None:
+        for signature, extension in SIGNATURES:
+            if data.startswith(signature):
+                return extension, {size: data for size in THUMBNAIL_SIZES}
+        raise ImageError("Unrecognised image format")
+    try:
+        original = Image.open(BytesIO(data))
+        original.load()
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ImageError(f"Cannot decode image: {error}")
+    original = original.convert("RGB")
+    thumbnails = {}
+    for size, box in THUMBNAIL_SIZES.items():
+        image = original.copy()
+        image.thumbnail(box, Image.LANCZOS)
+        output = BytesIO()
+        image.save(output, "JPEG", quality=85, optimize=True, progressive=True)
+        thumbnails[size] = output.getvalue()
+    return "jpg", thumbnails
+
+
+def thumbnailPath(size, key):
+    return os.path.join(settings.IMAGE_ROOT, size, key)
+
+
+# Write through a temporary file so a reader never sees half an image
+def writeFile(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(handle, "wb") as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+
+# Fetch an image and store its thumbnails under the hash of the original bytes, so
+# listings sharing an image share the files and a stored file never changes
+def storeImage(url):
+    data = fetchImage(url)
+    digest = hashlib.sha256(data).hexdigest()
+    extension, thumbnails = renderThumbnails(data)
+    key = f"{digest}.{extension}"
+    for size, thumbnail in thumbnails.items():
+        path = thumbnailPath(size, key)
+        if not os.path.exists(path):
+            writeFile(path, thumbnail)
+    return key
+
+
+def updateImageKey(listingId, url, key):
+    # Only if the listing still points at the image that was fetched
+    return AuctionListing.objects.filter(id=listingId, image=url).update(imageKey=key, version=F('version') + 1)
+
+
+def processListing(listingId):
+    url = AuctionListing.objects.values_list('image', flat=True).get(id=listingId)
+    try:
+        key = storeImage(url)
+    except ImageError as error:
+        logger.warning("No thumbnails for listing %s: %s", listingId, error)
+        return None
+    if submitWrite(updateImageKey, listingId, url, key):
+        invalidateListing(listingId)
+    return key
+
+
+def processInThread(listingId):
+    try:
+        return processListing(listingId)
+    except Exception:
+        logger.exception("Thumbnail generation failed for listing %s", listingId)
+    finally:
+        connection.close()
+
+
+pool = None
+poolLock = threading.Lock()
+
+
+def workerPool():
+    global pool
+    with poolLock:
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="thumbnails")
+        return pool
+
+
+# Generate thumbnails in the background once the new listing is committed; until they
+# exist the pages keep embedding the remote URL
+def queueThumbnails(listingId):
+    transaction.on_commit(lambda: workerPool().submit(processInThread, listingId))
+
+
+def contentType(key):
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import URLPattern, reverse
+
+from auctions import urls
+from auctions.benchmarking import percentiles, seedDataset, throwawayDatabase
+from auctions.models import Category
+
+# Session and user loading setups compared on every route
+TIERS = [
+    ("db sessions, database user", "django.contrib.sessions.backends.db", "django.contrib.auth.backends.ModelBackend"),
+    ("cached_db sessions, cached user", "django.contrib.sessions.backends.cached_db", "auctions.auth.CachedModelBackend"),
+    ("signed cookies, cached user", "django.contrib.sessions.backends.signed_cookies", "auctions.auth.CachedModelBackend"),
+]
+# Routes that change state on GET
+SKIP = {"logout", "close", "add_watchlist", "remove_watchlist"}
+# Queries that load the session or its user, rather than join users into page data
+AUTH_QUERIES = ('FROM "django_session"', 'FROM "auctions_user"')
+
+
+class Command(BaseCommand):
+    help = "Measure the authentication cost of every GET route of auctions.urls for each session tier"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Requests timed per route and tier")
+        parser.add_argument("--password", default="bench-password", help="Password of the logged in user")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with throwawayDatabase():
+            people, listingIds = seedDataset(users=20, listings=200, bids=3, comments=3, watches=5)
+            user = people[0]
+            user.set_password(options["password"])
+            user.save()
+            arguments = {"id": listingIds[0], "name": Category.objects.values_list('categoryName', flat=True)[0],
+                "size": "card", "key": "missing.jpg"}
+            routes = [(pattern.name, reverse(pattern.name, kwargs={name: arguments[name]
+                for name in pattern.pattern.converters})) for pattern in urls.urlpatterns
+                if isinstance(pattern, URLPattern) and pattern.name not in SKIP]
+            # The seller page is named after a user rather than a category
+            routes = [(name, reverse(name, args=[user.username]) if name == "seller_analytics" else path)
+                for name, path in routes]
+
+            start = time.perf_counter()
+            authenticate(username=user.username, password=options["password"])
+            self.stdout.write(f"login password check: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+            for label, engine, backend in TIERS:
+                with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend]):
+                    cache.clear()
+                    client = Client()
+                    client.force_login(user, backend)
+                    self.stdout.write(f"\n{label}")
+                    self.stdout.write(f"{'route':28} {'status':>6} {'p50 ms':>8} {'queries':>8} {'auth':>5}")
+                    totals = [0, 0]
+                    for name, path in routes:
+                        status, durations, queries, auth = self.measure(client, path, options["repeat"])
+                        if status == 405:
+                            continue
+                        totals[0] += 1
+                        totals[1] += auth
+                        self.stdout.write(f"{name:28} {status:>6} {percentiles(durations)['p50']:8.2f} "
+                            f"{queries:8} {auth:5}")
+                    self.stdout.write(f"auth queries per request: {totals[1] / max(totals[0], 1):.2f}")
+
+    # Time repeat GETs of path after a warm-up and count the queries of the last one
+    def measure(self, client, path, repeat):
+        client.get(path)
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get(path)
+            durations.append(time.perf_counter() - start)
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(path)
+        auth = sum(1 for query in captured if any(table in query["sql"] for table in AUTH_QUERIES))
+        return response.status_code, durations, len(captured), auth
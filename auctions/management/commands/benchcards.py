@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from auctions.benchmarking import seedDataset, throwawayDatabase
+from auctions.cache import pageKey
+from auctions.cards import cardKey, listingCards
+from auctions.models import AuctionListing
+from auctions.views import CARD_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Time rendering a page of listing cards with and without the card fragment cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=1000, help="Cards on the rendered page")
+        parser.add_argument("--repeat", type=int, default=20, help="Renders timed per variant")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with throwawayDatabase():
+            seedDataset(users=50, listings=int(options["cards"] * 1.3), bids=1, comments=0, watches=0)
+            listings = list(AuctionListing.objects.filter(isClosed=False).select_related('user', 'category')
+                .only(*CARD_FIELDS)[:options["cards"]])
+            request = RequestFactory().get("/")
+            request.user = AnonymousUser()
+            keys = [cardKey(listing) for listing in listings]
+
+            def render(cold):
+                if cold:
+                    cache.delete_many(keys)
+                return render_to_string("auctions/index.html", {"cards": listingCards(listings, frozenset())}, request)
+
+            self.report(f"{len(listings)} cards, every card rendered", lambda: render(True), options["repeat"])
+            self.report(f"{len(listings)} cards from the fragment cache", lambda: render(False), options["repeat"])
+
+            client = Client()
+            page = reverse("index")
+
+            def miss():
+                cache.delete(pageKey(page))
+                return client.get(page)
+
+            self.report("anonymous index page, cache miss", miss, options["repeat"])
+            self.report("anonymous index page, cache hit", lambda: client.get(page), options["repeat"])
+
+    def report(self, label, function, repeat):
+        function()
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+        durations.sort()
+        self.stdout.write(f"{label:45} median {durations[len(durations) // 2] * 1000:7.2f}ms, "
+            f"min {durations[0] * 1000:7.2f}ms")
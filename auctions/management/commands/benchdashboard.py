@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from auctions.api import issueToken
+from auctions.benchmarking import percentiles, seedDataset, throwawayDatabase
+from auctions.dashboard import dashboardPage
+from auctions.models import AuctionListing
+
+
+class Command(BaseCommand):
+    help = "Time the seller dashboard for one seller owning many listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=10000, help="Listings owned by the seller")
+        parser.add_argument("--repeat", type=int, default=50, help="Requests timed per variant")
+        parser.add_argument("--budget", type=float, default=50, help="Allowed p95 in milliseconds")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with throwawayDatabase():
+            people, listingIds = seedDataset(users=200, listings=options["listings"], bids=3, comments=3, watches=20)
+            seller = people[0]
+            AuctionListing.objects.update(user=seller)
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {issueToken(seller)}")
+            client.force_login(seller)
+            # A page deep into the history, reached through the cursors
+            _, deep = dashboardPage(seller, "all")
+            for _ in range(20):
+                _, deep = dashboardPage(seller, "all", deep)
+
+            over = []
+            for label, url in [
+                ("dashboard, all listings", reverse("dashboard")),
+                ("dashboard, open listings", reverse("dashboard") + "?status=open"),
+                ("dashboard, closed listings", reverse("dashboard") + "?status=closed"),
+                ("dashboard, page 22", reverse("dashboard") + f"?cursor={deep}"),
+                ("api dashboard, open listings", reverse("api_dashboard") + "?status=open"),
+            ]:
+                if self.report(label, client, url, options["repeat"]) > options["budget"]:
+                    over.append(label)
+
+            ids = list(AuctionListing.objects.filter(isClosed=False).values_list('id', flat=True)[:500])
+            start = time.perf_counter()
+            client.post(reverse("dashboard_close"), {"close": ids})
+            self.stdout.write(f"{'bulk close of ' + str(len(ids)) + ' listings':32} {(time.perf_counter() - start) * 1000:7.2f}ms")
+            if over:
+                raise CommandError(f"Over the {options['budget']}ms budget: {', '.join(over)}")
+
+    # Time repeat GETs and return the p95 in milliseconds
+    def report(self, label, client, url, repeat):
+        client.get(url)
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get(url)
+            durations.append(time.perf_counter() - start)
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        timings = percentiles(durations)
+        self.stdout.write(f"{label:32} p50 {timings['p50']:7.2f}ms  p95 {timings['p95']:7.2f}ms  {len(queries)} queries")
+        return timings["p95"]
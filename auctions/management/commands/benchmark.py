@@ -0,0 +1,123 @@
+import json
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from auctions.benchmarking import percentiles, seedDataset, throwawayDatabase
+from auctions.models import AuctionListing, Category
+
+SCENARIOS = ["index", "auctiondetails", "bidding", "watchlist", "category_name"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the auction hot paths on a synthetic dataset and compare against a stored baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--listings", type=int, default=5000)
+        parser.add_argument("--bids", type=int, default=5, help="Bids per listing")
+        parser.add_argument("--comments", type=int, default=5, help="Comments per listing")
+        parser.add_argument("--watches", type=int, default=20, help="Watched listings per user")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=4, help="Client threads per scenario")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+            help="Scenario to run, may be repeated (default: all)")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="Fail when a scenario regresses against this JSON file")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+            help="Allowed relative p95 slowdown against the baseline")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        dataset = {key: options[key] for key in ["users", "listings", "bids", "comments", "watches"]}
+        with throwawayDatabase():
+            start = time.perf_counter()
+            users, listingIds = seedDataset(**dataset)
+            self.stdout.write(f"Seeded {connection.vendor} database in {time.perf_counter() - start:.1f}s")
+            openIds = list(AuctionListing.objects.filter(id__in=listingIds, isClosed=False)
+                .values_list('id', flat=True))
+            categories = list(Category.objects.values_list('categoryName', flat=True))
+            results = {}
+            for scenario in options["scenario"] or SCENARIOS:
+                request = self.scenario(scenario, openIds, categories)
+                results[scenario] = self.run(request, users, options["requests"], options["concurrency"])
+                self.report(scenario, results[scenario])
+
+        run = {"database": connection.vendor, "dataset": dataset, "concurrency": options["concurrency"],
+            "results": results}
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(run, output, indent=2)
+        if options["baseline"]:
+            self.compare(results, options["baseline"], options["tolerance"])
+
+    # A function issuing one request of the scenario with a logged in client
+    def scenario(self, name, openIds, categories):
+        if name == "index":
+            return lambda client: client.get(reverse("index"))
+        if name == "auctiondetails":
+            return lambda client: client.get(reverse("auctiondetails", args=[random.choice(openIds)]))
+        if name == "bidding":
+            return lambda client: client.post(reverse("bidding", args=[random.choice(openIds)]),
+                {"currentBid": random.randint(1, 10 ** 6)})
+        if name == "watchlist":
+            return lambda client: client.get(reverse("watchlist"))
+        return lambda client: client.get(reverse("category_name", args=[random.choice(categories)]))
+
+    def run(self, request, users, count, concurrency):
+        durations, queries, errors = [], [], [0]
+        lock = threading.Lock()
+
+        def worker(share):
+            client = Client(raise_request_exception=False)
+            client.force_login(random.choice(users))
+            try:
+                for _ in range(share):
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        response = request(client)
+                        elapsed = time.perf_counter() - start
+                    with lock:
+                        durations.append(elapsed)
+                        queries.append(len(captured))
+                        errors[0] += response.status_code >= 500
+            finally:
+                connection.close()
+
+        shares = [count // concurrency + (i < count % concurrency) for i in range(concurrency)]
+        threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return dict(percentiles(durations), throughput=len(durations) / elapsed if elapsed else 0.0,
+            queries=sum(queries) / len(queries) if queries else 0.0, errors=errors[0], requests=len(durations))
+
+    def report(self, scenario, result):
+        self.stdout.write(f"{scenario:15} p50 {result['p50']:7.2f} ms  p95 {result['p95']:7.2f} ms  "
+            f"p99 {result['p99']:7.2f} ms  {result['throughput']:7.1f} req/s  "
+            f"{result['queries']:5.1f} queries/req  {result['errors']} errors")
+
+    def compare(self, results, path, tolerance):
+        with open(path) as baseline:
+            expected = json.load(baseline)["results"]
+        regressions = []
+        for scenario, result in results.items():
+            if scenario not in expected:
+                continue
+            before = expected[scenario]
+            if result["p95"] > before["p95"] * (1 + tolerance):
+                regressions.append(f"{scenario}: p95 {before['p95']:.2f} ms -> {result['p95']:.2f} ms")
+            if result["queries"] > before["queries"] + 0.5:
+                regressions.append(f"{scenario}: {before['queries']:.1f} -> {result['queries']:.1f} queries/req")
+        if regressions:
+            raise CommandError("Performance regression against baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regression against {path}"))
@@ -0,0 +1,59 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from auctions.benchmarking import throwawayDatabase
+from auctions.models import AuctionListing, Category, User
+from auctions.search import scanSearch, searchListings, searchTerms
+
+# Synthetic vocabulary, large enough that a search term matches a realistic fraction of listings
+SYLLABLES = "ka lo mi ne ru sa te vi zo pa".split()
+WORDS = sorted({"".join(random.Random(seed).choices(SYLLABLES, k=4)) for seed in range(20000)})
+
+
+class Command(BaseCommand):
+    help = "Compare indexed full-text search with icontains scans on a synthetic set of listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with throwawayDatabase():
+            self.seed(options["listings"])
+            queries = [" ".join(random.sample(WORDS, random.randint(1, 2))) for _ in range(options["queries"])]
+            indexed = self.measure(lambda query: searchListings(query), queries)
+            scanned = self.measure(lambda query: scanSearch(searchTerms(query), None, True, 25, 0), queries)
+            prefix = self.measure(lambda query: searchListings(query[:-2]), queries)
+
+        self.stdout.write(f"Database: {connection.vendor}, {options['listings']} listings, {len(queries)} queries")
+        for name, timings in [("Full-text index", indexed), ("Full-text prefix", prefix), ("icontains scan", scanned)]:
+            self.stdout.write(f"{name:18} median {statistics.median(timings):8.2f} ms, "
+                f"max {max(timings):8.2f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"Index is {statistics.median(scanned) / statistics.median(indexed):.0f}x faster than scanning"))
+
+    def seed(self, count):
+        seller = User.objects.create_user("search-seller")
+        categories = [Category.objects.create(categoryName=f"Search {i}") for i in range(10)]
+        batch = 5000
+        for start in range(0, count, batch):
+            with transaction.atomic():
+                AuctionListing.objects.bulk_create([
+                    AuctionListing(user=seller, auctionTitle=" ".join(random.sample(WORDS, 4)).title(),
+                        image="http://localhost/", auctionDetails=" ".join(random.choices(WORDS, k=30)),
+                        currentBid=random.randint(1, 1000), category=random.choice(categories),
+                        isClosed=random.random() < 0.3)
+                    for _ in range(start, min(start + batch, count))
+                ])
+
+    def measure(self, search, queries):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
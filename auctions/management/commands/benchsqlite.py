@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+
+from auctions.benchmarking import seedDataset, throwawayDatabase
+from auctions.bidding import BidError, placeBid
+from auctions.models import AuctionListing, Comments
+from auctions.sqlite import WriteQueue, tuneConnection
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite write throughput and lock errors with and without concurrent mode"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=16, help="Threads placing bids and comments")
+        parser.add_argument("--readers", type=int, default=4, help="Threads reading listing pages meanwhile")
+        parser.add_argument("--writes", type=int, default=100, help="Writes per writer thread")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark only applies to SQLite")
+        with throwawayDatabase():
+            users, listingIds = seedDataset(users=options["writers"], listings=200, bids=1, comments=0, watches=0)
+            for mode in ["default", "concurrent"]:
+                result = self.run(mode, users, listingIds, options)
+                self.stdout.write(f"{mode:10} {result['writes']:6d} writes in {result['elapsed']:6.2f}s "
+                    f"({result['writes'] / result['elapsed']:7.1f}/s), {result['errors']} lock errors "
+                    f"({result['errors'] / result['attempts']:.1%}), {result['reads']} page reads")
+
+    def run(self, mode, users, listingIds, options):
+        concurrent = mode == "concurrent"
+        writeQueue = WriteQueue() if concurrent else None
+        if concurrent:
+            connection_created.connect(tuneConnection, dispatch_uid="benchsqlite")
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode = DELETE")
+        counts = {"writes": 0, "errors": 0, "attempts": 0, "reads": 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def write(function, *args, **kwargs):
+            if writeQueue is not None:
+                return writeQueue.submit(function, *args, **kwargs)
+            return function(*args, **kwargs)
+
+        def writer(number, user):
+            done = errors = 0
+            try:
+                for step in range(options["writes"]):
+                    listingId = listingIds[(number + step) % len(listingIds)]
+                    try:
+                        if step % 2:
+                            write(Comments.objects.create, user=user, auction_id=listingId, comments="Benchmark")
+                        else:
+                            price = AuctionListing.objects.values_list('currentBid', flat=True).get(id=listingId)
+                            write(placeBid, user, listingId, price + 1)
+                        done += 1
+                    except BidError:
+                        done += 1
+                    except OperationalError:
+                        errors += 1
+            finally:
+                connection.close()
+                with lock:
+                    counts["writes"] += done
+                    counts["errors"] += errors
+                    counts["attempts"] += options["writes"]
+
+        def reader():
+            reads = 0
+            try:
+                while not stop.is_set():
+                    try:
+                        list(AuctionListing.objects.filter(isClosed=False).order_by('-listingDate')[:24])
+                        reads += 1
+                    except OperationalError:
+                        pass
+            finally:
+                connection.close()
+                with lock:
+                    counts["reads"] += reads
+
+        connection.close()
+        readers = [threading.Thread(target=reader) for _ in range(options["readers"])]
+        writers = [threading.Thread(target=writer, args=(number, user)) for number, user in enumerate(users)]
+        for thread in readers:
+            thread.start()
+        start = time.perf_counter()
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        counts["elapsed"] = time.perf_counter() - start
+        stop.set()
+        for thread in readers:
+            thread.join()
+        if concurrent:
+            connection_created.disconnect(dispatch_uid="benchsqlite")
+        return counts
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from auctions.benchmarking import percentiles, seedDataset, throwawayDatabase
+
+# A worker started on its own: import the app, then serve the first request
+COLD = """
+import json, os, time
+start = time.perf_counter()
+from commerce.wsgi import application
+imported = time.perf_counter() - start
+from auctions.warmup import firstResponse, memoryUsage
+status, served = firstResponse(application, PATH)
+print(json.dumps({"status": status, "imported": imported, "served": served, **memoryUsage()}))
+"""
+
+# Workers forked from a master that imported and warmed the app, as gunicorn does with preload_app
+PREFORKED = """
+import json, os, time
+start = time.perf_counter()
+from commerce.wsgi import application
+from auctions.warmup import firstResponse, memoryUsage, warmUp
+warmUp()
+ready = time.perf_counter() - start
+print(json.dumps({"master": True, "ready": ready, **memoryUsage()}), flush=True)
+pids = []
+for _ in range(WORKERS):
+    pid = os.fork()
+    if pid == 0:
+        from django.db import connections
+        connections.close_all()
+        status, served = firstResponse(application, PATH)
+        os.write(1, (json.dumps({"status": status, "served": served, **memoryUsage()}) + "\\n").encode())
+        os._exit(0)
+    pids.append(pid)
+for pid in pids:
+    os.waitpid(pid, 0)
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure time to first response and memory per worker, cold and forked from a warmed master"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Workers forked from the warmed master")
+        parser.add_argument("--repeat", type=int, default=5, help="Cold starts and masters timed")
+        parser.add_argument("--path", default="/", help="Path of the first request")
+        parser.add_argument("--cold-budget", type=float, default=1000,
+            help="Allowed p50 from process start to first response of a cold worker, in milliseconds")
+        parser.add_argument("--forked-budget", type=float, default=100,
+            help="Allowed p95 of the first response of a forked worker, in milliseconds")
+        parser.add_argument("--memory-budget", type=float, default=20,
+            help="Allowed private memory per forked worker, in megabytes")
+
+    def handle(self, *args, **options):
+        with throwawayDatabase():
+            seedDataset(users=100, listings=2000, bids=3, comments=3, watches=10)
+            environment = {**os.environ, "DJANGO_SETTINGS_MODULE": "commerce.settings",
+                "DATABASE_URL": f"sqlite:///{connection.settings_dict['NAME']}"}
+            connection.close()
+
+            cold, coldTotals = [], []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                cold.extend(self.run(COLD, options, environment))
+                coldTotals.append(time.perf_counter() - start)
+            masters, workers = [], []
+            for _ in range(options["repeat"]):
+                for result in self.run(PREFORKED, options, environment):
+                    (masters if result.get("master") else workers).append(result)
+
+        self.stdout.write(f"{'cold worker':24} start to response p50 {percentiles(coldTotals)['p50']:7.1f}ms  "
+            f"import p50 {percentiles([r['imported'] for r in cold])['p50']:7.1f}ms  "
+            f"first response p50 {percentiles([r['served'] for r in cold])['p50']:7.1f}ms")
+        self.stdout.write(f"{'':24} rss {self.mean(cold, 'rss'):6.1f}MB  private {self.mean(cold, 'private'):6.1f}MB")
+        self.stdout.write(f"{'warmed master':24} import and warm-up p50 {percentiles([r['ready'] for r in masters])['p50']:7.1f}ms  "
+            f"rss {self.mean(masters, 'rss'):6.1f}MB")
+        forked = percentiles([r["served"] for r in workers])
+        self.stdout.write(f"{'forked worker':24} first response p50 {forked['p50']:7.1f}ms  p95 {forked['p95']:7.1f}ms")
+        self.stdout.write(f"{'':24} rss {self.mean(workers, 'rss'):6.1f}MB  private {self.mean(workers, 'private'):6.1f}MB")
+
+        failed = [f"status {r['status']}" for r in cold + workers if r["status"] != 200]
+        if percentiles(coldTotals)["p50"] > options["cold_budget"]:
+            failed.append(f"cold start over {options['cold_budget']}ms")
+        if forked["p95"] > options["forked_budget"]:
+            failed.append(f"forked first response over {options['forked_budget']}ms")
+        if max(r["private"] for r in workers) > options["memory_budget"]:
+            failed.append(f"worker private memory over {options['memory_budget']}MB")
+        if failed:
+            raise CommandError(", ".join(sorted(set(failed))))
+
+    # Run a child script from the project directory, returns the JSON lines it printed
+    def run(self, script, options, environment):
+        script = script.replace("PATH", repr(options["path"])).replace("WORKERS", str(options["workers"]))
+        output = subprocess.run([sys.executable, "-c", script], cwd=settings.BASE_DIR, env=environment,
+            capture_output=True, text=True)
+        if output.returncode:
+            raise CommandError(f"Startup child failed:\n{output.stderr}")
+        return [json.loads(line) for line in output.stdout.splitlines() if line.startswith("{")]
+
+    def mean(self, results, field):
+        return sum(result[field] for result in results) / max(len(results), 1)
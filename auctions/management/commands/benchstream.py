@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarking import seedDataset, throwawayDatabase
+from auctions.events import broker, publish
+from auctions.streaming import streamListing
+
+
+class Command(BaseCommand):
+    help = "Hold many idle event streams in one process and compare their request volume with polling"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=5000, help="Connected viewers of one listing")
+        parser.add_argument("--events", type=int, default=50, help="Bids published during the auction close")
+        parser.add_argument("--duration", type=int, default=600, help="Seconds the viewers stay on the page")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Reload interval of a polling viewer")
+
+    def handle(self, *args, **options):
+        # Streams are only opened for listings that exist
+        with throwawayDatabase():
+            _, listingIds = seedDataset(users=1, listings=1, bids=0, comments=0, watches=0, categories=1)
+            results = asyncio.run(self.run(str(listingIds[0]), options["clients"], options["events"]))
+        clients = options["clients"]
+        polled = int(clients * options["duration"] / options["poll_interval"])
+        self.stdout.write(f"Connections held: {results['connected']} of {clients}")
+        self.stdout.write(f"Memory per idle connection: {results['memory'] / clients / 1024:.1f} KiB")
+        self.stdout.write(f"Events delivered: {results['delivered']} of {clients * options['events']}")
+        self.stdout.write(f"Fan-out latency per event: {results['latency'] * 1000:.1f} ms to {clients} clients")
+        self.stdout.write(f"Requests with streaming: {clients}")
+        self.stdout.write(f"Requests with polling every {options['poll_interval']}s for {options['duration']}s: {polled}")
+        self.stdout.write(self.style.SUCCESS(f"Streaming saves {polled - clients} requests "
+            f"({polled / clients:.0f}x fewer)"))
+
+    async def run(self, listingId, clients, events):
+        delivered = [0]
+        received = asyncio.Event()
+        target = [0]
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body", b"").startswith(b"event:"):
+                delivered[0] += 1
+                if delivered[0] >= target[0]:
+                    received.set()
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        streams = [asyncio.ensure_future(streamListing(listingId, receive, send)) for _ in range(clients)]
+        while broker.connections(listingId) < clients:
+            await asyncio.sleep(0.01)
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        connected = broker.connections(listingId)
+
+        # Publish from another thread, the way views do under ASGI
+        latency = 0.0
+        for number in range(events):
+            received.clear()
+            target[0] = (number + 1) * clients
+            start = time.perf_counter()
+            thread = threading.Thread(target=publish, args=(listingId, "bid"), kwargs={"amount": number})
+            thread.start()
+            await received.wait()
+            latency += time.perf_counter() - start
+            thread.join()
+
+        disconnect.set()
+        await asyncio.gather(*streams)
+        return {"connected": connected, "memory": memory, "delivered": delivered[0],
+            "latency": latency / events if events else 0.0}
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.bulk import FORMATS, exportBids, exportListings
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Write all listings, or their bid history, as CSV or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bids", action="store_true", help="Export the bid history instead of the listings")
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--seller", help="Only the listings of this username")
+        parser.add_argument("--output", help="File to write, standard output by default")
+
+    def handle(self, *args, **options):
+        seller = None
+        if options["seller"]:
+            seller = User.objects.filter(username=options["seller"]).first()
+            if seller is None:
+                raise CommandError(f"No user {options['seller']}")
+        export = exportBids if options["bids"] else exportListings
+        output = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        try:
+            for chunk in export(options["format"], seller):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
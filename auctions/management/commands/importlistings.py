@@ -0,0 +1,35 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.bulk import BATCH_SIZE, BulkFormatError, formatOf, importListings
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Create listings for a seller from a CSV or JSONL file, reporting the rows that failed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--seller", required=True, help="Username of the seller")
+        parser.add_argument("--format", help="csv or jsonl, guessed from the file extension by default")
+        parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Rows inserted per transaction")
+
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.get(username=options["seller"])
+            format = formatOf(options["path"], options["format"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['seller']}")
+        except BulkFormatError as error:
+            raise CommandError(str(error))
+        start = time.perf_counter()
+        with open(options["path"], "rb") as stream:
+            report = importListings(stream, format, seller, options["batch"], thumbnails=False)
+        for error in report["errors"]:
+            self.stderr.write(f"Line {error['line']}: {json.dumps(error['errors'])}")
+        if "aborted" in report:
+            self.stderr.write(report["aborted"])
+        self.stdout.write(f"Created {report['created']} listings, {report['failed']} rows failed "
+            f"in {time.perf_counter() - start:.2f}s, run makethumbnails to fetch their images")
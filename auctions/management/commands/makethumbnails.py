@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from auctions.images import processInThread, workerPool
+from auctions.models import AuctionListing
+
+
+class Command(BaseCommand):
+    help = "Generate local thumbnails for listings whose image has not been fetched yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Fetch every listing image again")
+
+    def handle(self, *args, **options):
+        listings = AuctionListing.objects.all()
+        if not options["all"]:
+            listings = listings.filter(imageKey='')
+        ids = list(listings.values_list('id', flat=True))
+        keys = list(workerPool().map(processInThread, ids))
+        done = sum(1 for key in keys if key)
+        self.stdout.write(f"Generated thumbnails for {done} of {len(ids)} listings")
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.analytics import BATCH_SIZE, rebuildRollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the analytics rollups from the whole event log, stop runanalytics first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Events read per query")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        last = rebuildRollups(options["batch"])
+        self.stdout.write(f"Rebuilt the rollups up to event {last} in {time.perf_counter() - start:.2f}s")
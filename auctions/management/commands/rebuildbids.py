@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from auctions.bidding import rebuildBidSummary
+from auctions.models import AuctionListing
+
+
+class Command(BaseCommand):
+    help = "Recompute the highest bid and bid count of listings from the bid history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="Listings to rebuild, all listings when omitted")
+
+    def handle(self, *args, **options):
+        listings = AuctionListing.objects.all()
+        if options["ids"]:
+            listings = listings.filter(id__in=options["ids"])
+        updated = rebuildBidSummary(listings)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt bid summary of {updated} listings"))
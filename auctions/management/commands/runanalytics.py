@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.analytics import BATCH_SIZE, aggregateBatch
+
+
+class Command(BaseCommand):
+    help = "Fold new auction events into the analytics rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Events folded per pass")
+        parser.add_argument("--idle", type=float, default=5.0, help="Seconds to wait when no events are pending")
+        parser.add_argument("--once", action="store_true", help="Fold the pending events and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            folded = aggregateBatch(options["batch"])
+            if folded:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"Folded {folded} events in {elapsed:.2f}s ({folded / elapsed:.0f} events/s)")
+            elif options["once"]:
+                return
+            else:
+                time.sleep(options["idle"])
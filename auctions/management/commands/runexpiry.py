@@ -0,0 +1,38 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from auctions.expiry import ExpiryScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Close timed auctions as their end time passes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Close the listings that are due now and exit")
+
+    def handle(self, *args, **options):
+        scheduler = ExpiryScheduler()
+        while True:
+            try:
+                closed = scheduler.tick()
+            except Exception:
+                if options["once"]:
+                    raise
+                # Reload the schedule on the next tick, the batch that failed was already taken off it
+                logger.exception("Closing the expired listings failed")
+                scheduler.refreshedAt = None
+                connection.close()
+                time.sleep(scheduler.refresh.total_seconds())
+                continue
+            if closed:
+                self.stdout.write(f"Closed {len(closed)} listings: {', '.join(str(listing.id) for listing in closed)}")
+            if options["once"]:
+                return
+            delay = (scheduler.nextWakeup() - timezone.now()).total_seconds()
+            time.sleep(min(max(delay, 0.1), scheduler.refresh.total_seconds()))
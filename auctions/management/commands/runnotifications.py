@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarking import throwawayDatabase
+from auctions.models import AuctionListing, Category, NotificationEvent, User, Watchlist
+from auctions.notifications import BATCH_SIZE, processBatch, workerPool
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbid and closing notifications to watchers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Events claimed per pass")
+        parser.add_argument("--idle", type=float, default=1.0, help="Seconds to wait when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the outbox and exit")
+        parser.add_argument("--benchmark", type=int, metavar="EVENTS",
+            help="Drain this many synthetic events from a throwaway database and report the throughput")
+
+    def handle(self, *args, **options):
+        if options["benchmark"]:
+            with throwawayDatabase():
+                self.seed(options["benchmark"])
+                self.run(options, once=True)
+            return
+        self.run(options, once=options["once"])
+
+    def run(self, options, once):
+        with workerPool(options["workers"]) as pool:
+            while True:
+                start = time.perf_counter()
+                events, notified = processBatch(pool, options["batch"])
+                if events:
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(f"Delivered {events} events to {notified} users "
+                        f"in {elapsed:.2f}s ({events / elapsed:.0f} events/s)")
+                elif once:
+                    return
+                else:
+                    time.sleep(options["idle"])
+
+    # Bursts of bids on a few hundred watched listings
+    def seed(self, count):
+        users = User.objects.bulk_create([User(username=f"watcher-{i}") for i in range(500)])
+        users = list(User.objects.all())
+        category = Category.objects.create(categoryName="Notifications")
+        listings = AuctionListing.objects.bulk_create([AuctionListing(user=users[0], auctionTitle=f"Listing {i}",
+            image="http://localhost/", auctionDetails="", currentBid=0, category=category) for i in range(200)])
+        listings = list(AuctionListing.objects.all())
+        Watchlist.objects.bulk_create([Watchlist(user=user, listing=listing)
+            for listing in listings for user in random.sample(users, 20)], ignore_conflicts=True)
+        NotificationEvent.objects.bulk_create([NotificationEvent(listing=random.choice(listings),
+            kind=NotificationEvent.OUTBID, actor=random.choice(users), amount=i) for i in range(count)],
+            batch_size=1000)
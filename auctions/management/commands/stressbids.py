@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from auctions.benchmarking import throwawayDatabase
+from auctions.bidding import BidError, placeBid
+from auctions.models import AuctionListing, Bidding, Category, User
+
+
+# Hammer one listing with bids from several threads and check that no update was lost.
+# Every thread reads the current price and bids a little above it, so most bids race
+# against each other. Returns a dict with the counts and the measured throughput.
+def runBidStress(threads=8, bidsPerThread=50):
+    seller = User.objects.create_user("stress-seller")
+    bidders = [User.objects.create_user(f"stress-bidder-{i}") for i in range(threads)]
+    category, _ = Category.objects.get_or_create(categoryName="Stress test")
+    listing = AuctionListing.objects.create(user=seller, auctionTitle="Stress test", image="http://localhost/",
+        auctionDetails="Stress test listing", currentBid=0, category=category)
+    results = {"accepted": 0, "rejected": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def bidder(user):
+        counts = {"accepted": 0, "rejected": 0, "locked": 0}
+        try:
+            for _ in range(bidsPerThread):
+                try:
+                    price = AuctionListing.objects.values_list('currentBid', flat=True).get(id=listing.id)
+                    placeBid(user, listing.id, price + random.randint(1, 3))
+                    counts["accepted"] += 1
+                except BidError:
+                    counts["rejected"] += 1
+                except OperationalError:
+                    # SQLite gave up waiting for the lock, the bid was not placed or rolled back
+                    counts["locked"] += 1
+        finally:
+            connection.close()
+            with lock:
+                for key in counts:
+                    results[key] += counts[key]
+
+    workers = [threading.Thread(target=bidder, args=(user,)) for user in bidders]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    listing.refresh_from_db()
+    amounts = list(Bidding.objects.filter(auction=listing).order_by('id').values_list('bidAmount', flat=True))
+    results.update({
+        "attempted": threads * bidsPerThread,
+        "elapsed": elapsed,
+        "bidsPerSecond": results["accepted"] / elapsed if elapsed else 0.0,
+        "finalBid": listing.currentBid,
+        "version": listing.version,
+        "history": len(amounts),
+        # Accepted bids must be strictly increasing, and the listing must agree with the last one
+        "consistent": amounts == sorted(set(amounts))
+            and listing.version == listing.bidCount == len(amounts) == results["accepted"]
+            and listing.currentBid == (amounts[-1] if amounts else 0)
+            and (listing.highestBid is None or listing.highestBid.bidAmount == listing.currentBid),
+    })
+    return results
+
+
+class Command(BaseCommand):
+    help = "Run a multi-threaded bidding stress test against a throwaway copy of the configured database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--bids", type=int, default=50, help="Bids attempted by each thread")
+
+    def handle(self, *args, **options):
+        with throwawayDatabase():
+            results = runBidStress(options["threads"], options["bids"])
+
+        self.stdout.write(f"Database: {connection.vendor}")
+        self.stdout.write(f"Attempted {results['attempted']} bids with {options['threads']} threads "
+            f"in {results['elapsed']:.2f}s")
+        self.stdout.write(f"Accepted {results['accepted']}, rejected {results['rejected']}, "
+            f"lock timeouts {results['locked']}")
+        self.stdout.write(f"Throughput: {results['bidsPerSecond']:.1f} accepted bids/s")
+        self.stdout.write(f"Final bid {results['finalBid']}, version {results['version']}, "
+            f"history {results['history']} bids")
+        if not results["consistent"]:
+            raise CommandError("Lost update detected: bid history and listing price disagree")
+        self.stdout.write(self.style.SUCCESS("No lost updates"))
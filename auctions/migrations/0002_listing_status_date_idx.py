@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['isClosed', '-listingDate', '-id'], name='listing_status_date_idx'),
+        ),
+    ]
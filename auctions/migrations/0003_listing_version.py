@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0002_listing_status_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
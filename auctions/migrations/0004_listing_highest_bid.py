@@ -0,0 +1,39 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rebuildBidSummary(apps, schema_editor):
+    AuctionListing = apps.get_model('auctions', 'AuctionListing')
+    Bidding = apps.get_model('auctions', 'Bidding')
+    for listing in AuctionListing.objects.all():
+        bids = Bidding.objects.filter(auction=listing)
+        listing.highestBid = bids.order_by('-bidAmount', '-id').first()
+        listing.bidCount = bids.count()
+        listing.save(update_fields=['highestBid', 'bidCount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0003_listing_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='bidCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='highestBid',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bidding'),
+        ),
+        migrations.AddIndex(
+            model_name='bidding',
+            index=models.Index(fields=['auction', '-bidAmount'], name='bidding_auction_amount_idx'),
+        ),
+        migrations.RunPython(rebuildBidSummary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.6 on 2026-10-18 20:05
+
+from django.db import migrations
+
+# External content FTS5 table over the listings, triggers keep it in sync with every write
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE auctions_listing_fts USING fts5("
+    "auctionTitle, auctionDetails, content='auctions_auctionlisting', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER auctions_listing_fts_insert AFTER INSERT ON auctions_auctionlisting BEGIN"
+    " INSERT INTO auctions_listing_fts(rowid, auctionTitle, auctionDetails)"
+    " VALUES (new.id, new.auctionTitle, new.auctionDetails); END",
+    "CREATE TRIGGER auctions_listing_fts_delete AFTER DELETE ON auctions_auctionlisting BEGIN"
+    " INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, auctionTitle, auctionDetails)"
+    " VALUES ('delete', old.id, old.auctionTitle, old.auctionDetails); END",
+    "CREATE TRIGGER auctions_listing_fts_update AFTER UPDATE OF auctionTitle, auctionDetails"
+    " ON auctions_auctionlisting BEGIN"
+    " INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, auctionTitle, auctionDetails)"
+    " VALUES ('delete', old.id, old.auctionTitle, old.auctionDetails);"
+    " INSERT INTO auctions_listing_fts(rowid, auctionTitle, auctionDetails)"
+    " VALUES (new.id, new.auctionTitle, new.auctionDetails); END",
+    "INSERT INTO auctions_listing_fts(auctions_listing_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_insert",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_delete",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_update",
+    "DROP TABLE IF EXISTS auctions_listing_fts",
+]
+
+# Expression index matching auctions.search.POSTGRES_VECTOR, PostgreSQL computes the vectors itself
+POSTGRES_INDEX = [
+    "CREATE INDEX auctions_listing_search_idx ON auctions_auctionlisting USING GIN ("
+    "(setweight(to_tsvector('english', \"auctionTitle\"), 'A')"
+    " || setweight(to_tsvector('english', \"auctionDetails\"), 'D')))",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS auctions_listing_search_idx",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0005_listing_ends_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}),
+            run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}),
+        ),
+    ]
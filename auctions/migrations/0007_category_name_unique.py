@@ -0,0 +1,31 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+def mergeDuplicates(apps, schema_editor):
+    Category = apps.get_model('auctions', 'Category')
+    AuctionListing = apps.get_model('auctions', 'AuctionListing')
+    kept = {}
+    for category in Category.objects.order_by('id'):
+        if category.categoryName in kept:
+            AuctionListing.objects.filter(category_id=category.id).update(category_id=kept[category.categoryName])
+            category.delete()
+        else:
+            kept[category.categoryName] = category.id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_listing_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(mergeDuplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='categoryName',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+def removeDuplicates(apps, schema_editor):
+    Watchlist = apps.get_model('auctions', 'Watchlist')
+    seen = set()
+    for entry in Watchlist.objects.order_by('id'):
+        if (entry.user_id, entry.listing_id) in seen:
+            entry.delete()
+        else:
+            seen.add((entry.user_id, entry.listing_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_category_name_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(removeDuplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user', 'listing'), name='watchlist_user_listing_unique'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_notifications'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(fields=['auction', '-commentDate', '-id'], name='comments_auction_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:48
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search = import_module('auctions.migrations.0006_listing_search')
+
+# Adding a column makes SQLite rebuild the listing table, which drops the full text
+# search triggers, so they are created again afterwards in both directions
+SQLITE_RESTORE = search.SQLITE_DROP + search.SQLITE_INDEX
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_comments_auction_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, search.run({'sqlite': SQLITE_RESTORE})),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='imageKey',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+        migrations.RunPython(search.run({'sqlite': SQLITE_RESTORE}), migrations.RunPython.noop),
+    ]
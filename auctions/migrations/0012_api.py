@@ -0,0 +1,55 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:50
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+import django.db.models.deletion
+import django.utils.timezone
+
+search = import_module('auctions.migrations.0006_listing_search')
+imageKey = import_module('auctions.migrations.0011_listing_image_key')
+
+
+def backfillLastActivity(apps, schema_editor):
+    AuctionListing = apps.get_model('auctions', 'AuctionListing')
+    Bidding = apps.get_model('auctions', 'Bidding')
+    Comments = apps.get_model('auctions', 'Comments')
+    lastBid = Bidding.objects.filter(auction=OuterRef('pk')).order_by().values('auction').annotate(last=Max('bidDate'))
+    lastComment = Comments.objects.filter(auction=OuterRef('pk')).order_by().values('auction') \
+        .annotate(last=Max('commentDate'))
+    AuctionListing.objects.update(lastActivity=Greatest(
+        F('listingDate'),
+        Coalesce(Subquery(lastBid.values('last')), F('listingDate')),
+        Coalesce(Subquery(lastComment.values('last')), F('listingDate')),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_listing_image_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, search.run({'sqlite': imageKey.SQLITE_RESTORE})),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='lastActivity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(search.run({'sqlite': imageKey.SQLITE_RESTORE}), migrations.RunPython.noop),
+        migrations.RunPython(backfillLastActivity, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ApiToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(blank=True, max_length=50)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='apiTokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Start the event log with the history that already exists: the opening of every listing,
+# every bid and the close of the closed listings
+def backfillEvents(apps, schema_editor):
+    AuctionEvent = apps.get_model('auctions', 'AuctionEvent')
+    AuctionListing = apps.get_model('auctions', 'AuctionListing')
+    Bidding = apps.get_model('auctions', 'Bidding')
+    events = []
+    for listing in AuctionListing.objects.order_by('id').iterator():
+        events.append(AuctionEvent(listing_id=listing.id, kind='listed', at=listing.listingDate))
+    for bid in Bidding.objects.order_by('id').iterator():
+        events.append(AuctionEvent(listing_id=bid.auction_id, kind='bid', amount=bid.bidAmount, at=bid.bidDate))
+    for listing in AuctionListing.objects.filter(isClosed=True).order_by('id').iterator():
+        events.append(AuctionEvent(listing_id=listing.id, kind='closed', at=listing.lastActivity,
+            amount=listing.currentBid if listing.highestBid_id else None))
+    events.sort(key=lambda event: event.at)
+    AuctionEvent.objects.bulk_create(events, batch_size=1000)
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_api'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listed', models.IntegerField(default=0)),
+                ('closed', models.IntegerField(default=0)),
+                ('sold', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sellerStats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListingMinuteStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('bids', models.IntegerField(default=0)),
+                ('highest', models.IntegerField(default=0)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.auctionlisting')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategoryDayStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('listed', models.IntegerField(default=0)),
+                ('bids', models.IntegerField(default=0)),
+                ('closed', models.IntegerField(default=0)),
+                ('sold', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AuctionEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('listed', 'Listed'), ('bid', 'Bid'), ('closed', 'Closed')], max_length=10)),
+                ('amount', models.IntegerField(blank=True, null=True)),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('aggregated', models.BooleanField(default=False)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.auctionlisting')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='listingminutestats',
+            constraint=models.UniqueConstraint(fields=('listing', 'minute'), name='listing_minute_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='categorydaystats',
+            index=models.Index(fields=['day'], name='category_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorydaystats',
+            constraint=models.UniqueConstraint(fields=('category', 'day'), name='category_day_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='auctionevent',
+            index=models.Index(fields=['aggregated', 'id'], name='auction_event_pending_idx'),
+        ),
+        migrations.RunPython(backfillEvents, migrations.RunPython.noop),
+    ]
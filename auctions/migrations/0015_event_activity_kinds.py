@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_proxy_bids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auctionevent',
+            name='kind',
+            field=models.CharField(choices=[('listed', 'Listed'), ('bid', 'Bid'), ('closed', 'Closed'), ('comment', 'Commented'), ('watch', 'Watched')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_event_activity_kinds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['user', '-listingDate', '-id'], name='listing_seller_date_idx'),
+        ),
+    ]
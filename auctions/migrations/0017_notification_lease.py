@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_listing_seller_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationevent',
+            name='claimedUntil',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
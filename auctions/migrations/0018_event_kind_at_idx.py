@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_notification_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auctionevent',
+            index=models.Index(fields=['kind', 'at'], name='auction_event_kind_at_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.urls import reverse
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -22,10 +24,46 @@ class AuctionListing(models.Model):
     isClosed = models.BooleanField(default=False)
     # Add category later
     category = models.ForeignKey('Category', on_delete=models.CASCADE, default=None)
-    
+    # Incremented on every accepted bid, on close and when the thumbnails are ready,
+    # lets readers and cached listing cards detect a change
+    version = models.IntegerField(default=0)
+    # Highest bid so far and number of bids, maintained by the bid path
+    highestBid = models.ForeignKey('Bidding', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    bidCount = models.IntegerField(default=0)
+    # Closing time of a timed auction, listings without one stay open until the poster closes them
+    endsAt = models.DateTimeField(null=True, blank=True)
+    # Content-addressed name of the local thumbnails of image, blank until they are generated
+    imageKey = models.CharField(max_length=80, blank=True, default='')
+    # Time of the last bid, comment or close, the Last-Modified of the listing in the API
+    lastActivity = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination of the active/closed listing pages
+            models.Index(fields=['isClosed', '-listingDate', '-id'], name='listing_status_date_idx'),
+            # Lets the expiry engine find the next listings to close without scanning the table
+            models.Index(fields=['isClosed', 'endsAt'], name='listing_status_end_idx'),
+            # Serves the keyset pagination of a seller's dashboard, open, closed or both
+            models.Index(fields=['user', '-listingDate', '-id'], name='listing_seller_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.auctionTitle} (listing date {self.listingDate})"
 
+    # Local thumbnail of the image, or the remote image while none has been generated
+    def thumbnailUrl(self, size):
+        if not self.imageKey:
+            return self.image
+        return reverse("listing_image", args=[size, self.imageKey])
+
+    @property
+    def cardImage(self):
+        return self.thumbnailUrl("card")
+
+    @property
+    def detailImage(self):
+        return self.thumbnailUrl("detail")
+
 class Bidding(models.Model):
     # user who made the bid
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bidder")
@@ -35,9 +73,38 @@ class Bidding(models.Model):
     bidAmount = models.IntegerField()
     # bidding date
     bidDate = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Finds the highest bid of a listing when rebuilding AuctionListing.highestBid
+            models.Index(fields=['auction', '-bidAmount'], name='bidding_auction_amount_idx'),
+        ]
+
     def __str__(self):
         return f"User {self.user} bids {self.bidAmount}"
 
+class ProxyBid(models.Model):
+    # user bidding automatically
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="proxyBids")
+    listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE, related_name="proxyBids")
+    # most the user is willing to pay, the engine bids on their behalf up to it
+    maxAmount = models.IntegerField()
+    # when the maximum was last set, of two equal maximums the earlier one wins
+    placedAt = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # One maximum per user and listing, raising it replaces the old one
+            models.UniqueConstraint(fields=['listing', 'user'], name='proxy_listing_user_unique'),
+        ]
+        indexes = [
+            # Rebuilds the proxy book of a listing from the maximums still above its price
+            models.Index(fields=['listing', '-maxAmount'], name='proxy_listing_max_idx'),
+        ]
+
+    def __str__(self):
+        return f"User {self.user} bids up to {self.maxAmount}"
+
 class Comments(models.Model):
     # user who made the comments
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name="commenter")
@@ -47,15 +114,147 @@ class Comments(models.Model):
     comments = models.TextField()
     # comment date
     commentDate = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination of a listing's comment thread
+            models.Index(fields=['auction', '-commentDate', '-id'], name='comments_auction_date_idx'),
+        ]
+
     def __str__(self):
         return f"Commented by {self.user}"
 
 class Category(models.Model):
     # name of the category
-    categoryName = models.CharField(max_length=50)
+    categoryName = models.CharField(max_length=50, unique=True)
     def __str__(self):
         return f"{self.categoryName}"
 
 class Watchlist(models.Model):
     user = models.ForeignKey(User, on_delete = models.CASCADE, blank = False)
-    listing = models.ForeignKey(AuctionListing, on_delete = models.CASCADE, blank = False)
\ No newline at end of file
+    listing = models.ForeignKey(AuctionListing, on_delete = models.CASCADE, blank = False)
+
+    class Meta:
+        constraints = [
+            # A listing is watched at most once per user, also the index of the watchlist page
+            models.UniqueConstraint(fields=['user', 'listing'], name='watchlist_user_listing_unique'),
+        ]
+
+class NotificationEvent(models.Model):
+    OUTBID = 'outbid'
+    CLOSED = 'closed'
+    KINDS = [(OUTBID, 'Outbid'), (CLOSED, 'Closed')]
+    # listing the event happened on
+    listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # user who placed the new highest bid, if any
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    amount = models.IntegerField(null=True, blank=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+    # set in the same transaction as the notifications the worker fanned the event out to
+    processed = models.BooleanField(default=False)
+    # a worker claimed the event until then, after which another one may take it over
+    claimedUntil = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The notification worker reads the outbox in id order
+            models.Index(fields=['processed', 'id'], name='event_outbox_idx'),
+        ]
+
+
+class Notification(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=NotificationEvent.KINDS)
+    message = models.TextField()
+    # number of events coalesced into this notification since it was last read
+    count = models.IntegerField(default=1)
+    updatedAt = models.DateTimeField(auto_now=True)
+    isRead = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'isRead', '-updatedAt'], name='notification_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.user}: {self.message}"
+
+
+class ApiToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='apiTokens')
+    # SHA-256 of the token, the token itself is only shown once when it is issued
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=50, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"API token {self.name or self.id} of {self.user}"
+
+
+# Append-only log of what happened to listings, folded into the rollups below by the analytics aggregator
+class AuctionEvent(models.Model):
+    LISTED = 'listed'
+    BID = 'bid'
+    CLOSED = 'closed'
+    # activity only the rankings read
+    COMMENTED = 'comment'
+    WATCHED = 'watch'
+    KINDS = [(LISTED, 'Listed'), (BID, 'Bid'), (CLOSED, 'Closed'), (COMMENTED, 'Commented'), (WATCHED, 'Watched')]
+    listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # bid amount, or the final price of a closed listing that sold
+    amount = models.IntegerField(null=True, blank=True)
+    at = models.DateTimeField(default=timezone.now)
+    # set once the aggregator folded the event into the rollups
+    aggregated = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['aggregated', 'id'], name='auction_event_pending_idx'),
+            # Web processes follow the closes logged by the others
+            models.Index(fields=['kind', 'at'], name='auction_event_kind_at_idx'),
+        ]
+
+
+# Bids on a listing per minute, the price history and bid velocity charts
+class ListingMinuteStats(models.Model):
+    listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE, related_name='+')
+    minute = models.DateTimeField()
+    bids = models.IntegerField(default=0)
+    highest = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'minute'], name='listing_minute_unique'),
+        ]
+
+
+# Listings opened, bids, closes and sales of a category per day
+class CategoryDayStats(models.Model):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    listed = models.IntegerField(default=0)
+    bids = models.IntegerField(default=0)
+    closed = models.IntegerField(default=0)
+    sold = models.IntegerField(default=0)
+    # sum of the final prices of the listings sold that day
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'day'], name='category_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='category_day_idx'),
+        ]
+
+
+# Lifetime totals of a seller, sell-through is sold / closed
+class SellerStats(models.Model):
+    seller = models.OneToOneField(User, on_delete=models.CASCADE, related_name='sellerStats')
+    listed = models.IntegerField(default=0)
+    closed = models.IntegerField(default=0)
+    sold = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
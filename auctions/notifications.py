@@ -0,0 +1,145 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import AuctionListing, Bidding, Notification, NotificationEvent, Watchlist
+
+# Outbox events claimed by one worker pass
+BATCH_SIZE = 1000
+# Notifications inserted per bulk_create statement
+INSERT_SIZE = 1000
+# How long a claim lasts. Events of a worker that died before delivering them are taken
+# over by the next pass after it ran out.
+LEASE = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+
+# Queue an outbid event. Called inside the bid transaction, it costs the bid request a
+# single INSERT; finding and notifying the watchers happens later in the worker.
+def recordOutbid(bid):
+    NotificationEvent.objects.create(listing_id=bid.auction_id, kind=NotificationEvent.OUTBID,
+        actor_id=bid.user_id, amount=bid.bidAmount)
+
+
+# Queue closed events for the given listings
+def recordClosed(listingIds):
+    NotificationEvent.objects.bulk_create([NotificationEvent(listing_id=id, kind=NotificationEvent.CLOSED)
+        for id in listingIds])
+
+
+# Claim the oldest unprocessed events that nobody holds a lease on. The claim is
+# committed on its own so that other workers skip the events, but they stay unprocessed
+# until their notifications are written. On databases that support it, SKIP LOCKED lets
+# several workers share the outbox.
+def claimEvents(batchSize=BATCH_SIZE):
+    now = timezone.now()
+    with transaction.atomic():
+        events = NotificationEvent.objects.filter(Q(claimedUntil__isnull=True) | Q(claimedUntil__lt=now),
+            processed=False).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        events = list(events[:batchSize])
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).update(claimedUntil=now + LEASE)
+    return events
+
+
+# Give claimed events back so the next pass retries them
+def releaseEvents(ids):
+    NotificationEvent.objects.filter(id__in=ids, processed=False).update(claimedUntil=None)
+
+
+# Coalesce events per listing and kind: a burst of bids becomes one group whose
+# latest event is the one users are told about, with the ids of all its events
+def coalesce(events):
+    groups = {}
+    for event in events:
+        key = (event.listing_id, event.kind)
+        latest, ids = groups.get(key, (event, []))
+        ids.append(event.id)
+        groups[key] = (event if event.id >= latest.id else latest, ids)
+    return list(groups.values())
+
+
+# Users to notify about an event: watchers and earlier bidders, minus the new top bidder.
+# The poster is also told when their listing closes.
+def recipients(event, listing):
+    users = set(Watchlist.objects.filter(listing_id=event.listing_id).values_list('user_id', flat=True))
+    users.update(Bidding.objects.filter(auction_id=event.listing_id).values_list('user_id', flat=True).distinct())
+    if event.kind == NotificationEvent.CLOSED:
+        users.add(listing.user_id)
+    users.discard(event.actor_id)
+    return users
+
+
+def message(event, listing):
+    if event.kind == NotificationEvent.OUTBID:
+        return f"{listing.auctionTitle} has a new highest bid of {event.amount}$"
+    return f"{listing.auctionTitle} has been closed"
+
+
+# Fan one coalesced event out to its recipients and mark its events processed, in one
+# transaction so they are either all delivered or all left for a retry. Every user keeps
+# at most one unread notification per listing and kind, which is refreshed instead of duplicated.
+def deliver(event, ids):
+    with transaction.atomic():
+        listing = AuctionListing.objects.only('auctionTitle', 'user_id').get(id=event.listing_id)
+        users = recipients(event, listing)
+        text = message(event, listing)
+        unread = Notification.objects.filter(listing_id=event.listing_id, kind=event.kind, isRead=False)
+        existing = set(unread.filter(user_id__in=users).values_list('user_id', flat=True)) if users else set()
+        if existing:
+            unread.filter(user_id__in=existing).update(message=text, count=F('count') + len(ids),
+                updatedAt=timezone.now())
+        Notification.objects.bulk_create([Notification(user_id=user, listing_id=event.listing_id, kind=event.kind,
+            message=text, count=len(ids)) for user in users - existing], batch_size=INSERT_SIZE)
+        NotificationEvent.objects.filter(id__in=ids).update(processed=True)
+    return len(users)
+
+
+# Process one batch of the outbox with a pool of workers, one coalesced group per task.
+# Without a pool the groups are delivered in the calling thread. Groups that fail are
+# released and retried by the next batch.
+# Returns the number of events claimed and of users notified.
+def processBatch(pool, batchSize=BATCH_SIZE):
+    events = claimEvents(batchSize)
+    if not events:
+        return 0, 0
+    groups = coalesce(events)
+    if pool is None:
+        # A single transaction for the whole batch saves one commit per group, each
+        # group gets a savepoint so a failing one does not undo the others
+        with transaction.atomic():
+            notified = sum(deliverGroup(*group) for group in groups)
+    else:
+        notified = sum(pool.map(lambda group: deliverInThread(*group), groups))
+    return len(events), notified
+
+
+# Deliver a group, releasing its events when that fails
+def deliverGroup(event, ids):
+    try:
+        return deliver(event, ids)
+    except Exception:
+        logger.exception("Delivering notifications for listing %s failed", event.listing_id)
+        releaseEvents(ids)
+        return 0
+
+
+def deliverInThread(event, ids):
+    try:
+        return deliverGroup(event, ids)
+    finally:
+        connection.close_if_unusable_or_obsolete()
+
+
+# SQLite allows a single writer at a time, so deliveries run in the calling thread there
+def workerPool(workers):
+    if connection.vendor == "sqlite" or workers <= 1:
+        return nullcontext(None)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notifications")
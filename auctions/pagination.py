@@ -0,0 +1,46 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+# Default number of listing cards shown on one page
+PAGE_SIZE = 24
+
+
+# Encode the (date, id) position of the last row of a page into an opaque cursor
+def encodeCursor(date, id):
+    raw = f"{date.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Decode a cursor back into its (date, id) position, or None when it is malformed
+def decodeCursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# Fetch one page of a queryset ordered newest first on (dateField, id).
+# Instead of an OFFSET, the cursor turns into a range condition on the index,
+# so every page costs the same no matter how deep the reader has scrolled.
+# Returns the rows of the page and the cursor of the next page (or None).
+def keysetPage(queryset, cursor, dateField, pageSize=PAGE_SIZE):
+    queryset = queryset.order_by(f"-{dateField}", "-id")
+    position = decodeCursor(cursor)
+    if position is not None:
+        date, id = position
+        queryset = queryset.filter(
+            Q(**{f"{dateField}__lt": date}) | Q(**{dateField: date, "id__lt": id})
+        )
+    rows = list(queryset[:pageSize + 1])
+    nextCursor = None
+    if len(rows) > pageSize:
+        rows = rows[:pageSize]
+        last = rows[-1]
+        nextCursor = encodeCursor(getattr(last, dateField), last.id)
+    return rows, nextCursor
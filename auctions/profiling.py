@@ -0,0 +1,155 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger("auctions.profiling")
+
+# A query shape repeated this many times within one request is reported as N+1
+NPLUSONE_THRESHOLD = 5
+# Upper bounds in seconds of the request duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Profile of the request being handled, read by the template backend
+currentProfile = ContextVar("currentProfile", default=None)
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+# SQL text with the parameters removed and IN lists collapsed, equal for repeated queries
+def queryShape(sql):
+    return IN_LIST.sub("IN (...)", sql)
+
+
+# Counters collected while one request is handled
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.dbTime = 0.0
+        self.templateTime = 0.0
+        self.shapes = Counter()
+
+    # connection.execute_wrapper hook timing every query
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.dbTime += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[queryShape(sql)] += 1
+
+    def repeatedQueries(self):
+        return {shape: count for shape, count in self.shapes.items() if count >= NPLUSONE_THRESHOLD}
+
+
+# Aggregates per URL name since the process started
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(lambda: {"requests": 0, "seconds": 0.0, "dbSeconds": 0.0, "templateSeconds": 0.0,
+            "queries": 0, "nplusone": 0, "buckets": [0] * len(BUCKETS)})
+
+    def record(self, view, duration, profile):
+        with self.lock:
+            entry = self.views[view]
+            entry["requests"] += 1
+            entry["seconds"] += duration
+            entry["dbSeconds"] += profile.dbTime
+            entry["templateSeconds"] += profile.templateTime
+            entry["queries"] += profile.queries
+            entry["nplusone"] += bool(profile.repeatedQueries())
+            for index, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    entry["buckets"][index] += 1
+
+    # Aggregates in the Prometheus text exposition format
+    def prometheus(self):
+        with self.lock:
+            views = {view: dict(entry, buckets=list(entry["buckets"])) for view, entry in self.views.items()}
+        lines = []
+        for name, key, kind, help in [
+            ("bidit_view_db_seconds_total", "dbSeconds", "counter", "Time spent in SQL queries"),
+            ("bidit_view_template_seconds_total", "templateSeconds", "counter", "Time spent rendering templates"),
+            ("bidit_view_queries_total", "queries", "counter", "SQL queries executed"),
+            ("bidit_view_nplusone_requests_total", "nplusone", "counter", "Requests repeating a query shape"),
+        ]:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{view="{view}"}} {entry[key]}' for view, entry in views.items()]
+        name = "bidit_view_duration_seconds"
+        lines += [f"# HELP {name} Request duration", f"# TYPE {name} histogram"]
+        for view, entry in views.items():
+            for bound, count in zip(BUCKETS, entry["buckets"]):
+                lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {entry["requests"]}')
+            lines.append(f'{name}_sum{{view="{view}"}} {entry["seconds"]}')
+            lines.append(f'{name}_count{{view="{view}"}} {entry["requests"]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Record SQL count and time, template time and N+1 patterns of every request.
+# Only installed when settings.PROFILING is on; otherwise Django drops it at startup
+# and requests pay nothing for it.
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = currentProfile.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            currentProfile.reset(token)
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else "unresolved"
+        metrics.record(view, duration, profile)
+        repeated = profile.repeatedQueries()
+        logger.info(json.dumps({
+            "view": view, "method": request.method, "path": request.path, "status": response.status_code,
+            "seconds": round(duration, 6), "queries": profile.queries, "dbSeconds": round(profile.dbTime, 6),
+            "templateSeconds": round(profile.templateTime, 6), "nplusone": repeated,
+        }))
+        if repeated:
+            logger.warning("N+1 queries in %s: %s", view, repeated)
+        return response
+
+
+# Template backend timing every render into the current request profile
+class ProfiledTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = currentProfile.get()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.templateTime += time.perf_counter() - start
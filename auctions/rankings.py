@@ -0,0 +1,257 @@
+import bisect
+import logging
+import pickle
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .images import writeFile
+from .models import AuctionEvent, AuctionListing
+
+logger = logging.getLogger(__name__)
+
+# Feeds served from the leaderboards, with the title of their page
+FEEDS = {"trending": "Trending listings", "mostbids": "Most bid on listings", "endingsoon": "Ending soon"}
+# Weight of each kind of activity in the trending score, which halves every HALF_LIFE
+WEIGHTS = {AuctionEvent.BID: 3.0, AuctionEvent.COMMENTED: 2.0, AuctionEvent.WATCHED: 1.0}
+HALF_LIFE = timedelta(hours=6)
+# A cold start replays the activity of this window, anything older weighs under 1/256
+REPLAY_WINDOW = HALF_LIFE * 8
+# Scores are stored as weight * 2 ** (half lives since epoch) and rebased before they overflow
+MAX_EXPONENT = 512
+# Log events read per query when catching up
+BATCH_SIZE = 5000
+# Seconds an id skipped by the log tail is looked for again, as its transaction may still commit
+GAP_TIMEOUT = 60
+SNAPSHOT_VERSION = 1
+
+
+# Members ordered by key, then by member. The key of every member is kept in a dict and
+# the (key, member) pairs in a sorted list: a change is a binary search and a list insert,
+# and the first n members are a slice.
+class SortedSet:
+    def __init__(self):
+        self.keys = {}
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def set(self, member, key):
+        self.discard(member)
+        self.keys[member] = key
+        bisect.insort(self.items, (key, member))
+
+    def discard(self, member):
+        if member in self.keys:
+            del self.items[bisect.bisect_left(self.items, (self.keys.pop(member), member))]
+
+    # The n first members from the first key above after, if given
+    def first(self, n, after=None):
+        start = 0 if after is None else bisect.bisect_right(self.items, (after, float("inf")))
+        return [member for _, member in self.items[start:start + n]]
+
+
+# Trending, most bids and ending soon leaderboards of the open listings, overall and per
+# category. Every process keeps its own copy in memory, updated incrementally by tailing
+# the AuctionEvent log, so reading a feed never touches the database. Trending uses forward
+# decay: an event adds weight * 2 ** ((at - epoch) / HALF_LIFE), which ranks listings exactly
+# like their decayed totals without ever rescoring the listings that saw no activity.
+class Leaderboards:
+    def __init__(self, clock=timezone.now):
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.reset(clock())
+        self.loaded = False
+
+    def reset(self, epoch, cursor=0, gaps=None):
+        self.epoch = epoch
+        # last event applied, and the skipped ids below it with when they were first missed
+        self.cursor = cursor
+        self.gaps = gaps or {}
+        # listing id -> [category id, endsAt, bids, score]
+        self.listings = {}
+        self.boards = {feed: {} for feed in FEEDS}
+
+    def board(self, feed, categoryId):
+        return self.boards[feed].setdefault(categoryId, SortedSet())
+
+    # Put a listing in the given boards, overall and under its category
+    def place(self, listingId, feeds=tuple(FEEDS)):
+        categoryId, endsAt, bids, score = self.listings[listingId]
+        for category in (None, categoryId):
+            if "trending" in feeds and score > 0:
+                self.board("trending", category).set(listingId, -score)
+            if "mostbids" in feeds:
+                self.board("mostbids", category).set(listingId, (-bids, -listingId))
+            if "endingsoon" in feeds and endsAt is not None:
+                self.board("endingsoon", category).set(listingId, endsAt)
+
+    def remove(self, listingId):
+        categoryId = self.listings.pop(listingId)[0]
+        for boards in self.boards.values():
+            for category in (None, categoryId):
+                if category in boards:
+                    boards[category].discard(listingId)
+
+    def weight(self, kind, at):
+        if (at - self.epoch) / HALF_LIFE > MAX_EXPONENT:
+            self.rebase(at)
+        return WEIGHTS[kind] * 2 ** ((at - self.epoch) / HALF_LIFE)
+
+    # Move the epoch forward to at, scaling every score down by the same factor
+    def rebase(self, at):
+        shift = (at - self.epoch) // HALF_LIFE
+        self.epoch += HALF_LIFE * shift
+        self.boards["trending"] = {}
+        for listingId, entry in self.listings.items():
+            entry[3] *= 2 ** -shift
+            self.place(listingId, ("trending",))
+
+    # Apply log events, given as (id, listing id, kind, at) in id order. details holds the
+    # category and end time of the listings that were opened.
+    def apply(self, events, details):
+        for id, listingId, kind, at in events:
+            entry = self.listings.get(listingId)
+            if kind == AuctionEvent.LISTED and entry is None and listingId in details:
+                self.listings[listingId] = [*details[listingId], 0, 0.0]
+                self.place(listingId)
+            elif kind == AuctionEvent.CLOSED and entry is not None:
+                self.remove(listingId)
+            elif kind in WEIGHTS and entry is not None:
+                if kind == AuctionEvent.BID:
+                    entry[2] += 1
+                entry[3] += self.weight(kind, at)
+                self.place(listingId, ("trending", "mostbids"))
+
+    # Load the open listings and replay the recent activity, the slow path of a cold start
+    def build(self):
+        now = self.clock()
+        cursor = AuctionEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        with self.lock:
+            self.reset(now, cursor)
+            for listingId, categoryId, endsAt, bids in AuctionListing.objects.filter(isClosed=False) \
+                    .values_list('id', 'category_id', 'endsAt', 'bidCount').iterator():
+                self.listings[listingId] = [categoryId, endsAt, bids, 0.0]
+            for listingId, kind, at in AuctionEvent.objects \
+                    .filter(id__lte=cursor, kind__in=list(WEIGHTS), at__gte=now - REPLAY_WINDOW) \
+                    .values_list('listing_id', 'kind', 'at').iterator():
+                if listingId in self.listings:
+                    self.listings[listingId][3] += self.weight(kind, at)
+            for listingId in self.listings:
+                self.place(listingId)
+            self.loaded = True
+
+    # Apply the events logged since the last refresh, including skipped ids that showed up
+    def refresh(self):
+        with self.lock:
+            cursor, gaps = self.cursor, dict(self.gaps)
+        now = time.monotonic()
+        gaps = {id: since for id, since in gaps.items() if now - since < GAP_TIMEOUT}
+        events = list(AuctionEvent.objects.filter(id__in=list(gaps)).values_list('id', 'listing_id', 'kind', 'at')) \
+            if gaps else []
+        for id, *_ in events:
+            del gaps[id]
+        while True:
+            batch = list(AuctionEvent.objects.filter(id__gt=cursor).order_by('id')
+                .values_list('id', 'listing_id', 'kind', 'at')[:BATCH_SIZE])
+            for id, *_ in batch:
+                gaps.update((missing, now) for missing in range(cursor + 1, id))
+                cursor = id
+            events.extend(batch)
+            if len(batch) < BATCH_SIZE:
+                break
+        opened = {listingId for _, listingId, kind, _ in events if kind == AuctionEvent.LISTED}
+        details = {listingId: (categoryId, endsAt) for listingId, categoryId, endsAt in AuctionListing.objects
+            .filter(id__in=opened, isClosed=False).values_list('id', 'category_id', 'endsAt')} if opened else {}
+        with self.lock:
+            self.apply(events, details)
+            self.cursor, self.gaps = cursor, gaps
+        return len(events)
+
+    # Ids of the first n listings of a feed, overall or in one category. Costs O(n) plus a
+    # binary search, with no database access once loaded.
+    def top(self, feed, categoryId=None, n=20):
+        with self.lock:
+            board = self.boards[feed].get(categoryId)
+            if board is None:
+                return []
+            # Listings past their end time stay until their closed event arrives
+            return board.first(n, self.clock() if feed == "endingsoon" else None)
+
+    def snapshot(self, path):
+        with self.lock:
+            state = pickle.dumps({"version": SNAPSHOT_VERSION, "epoch": self.epoch, "cursor": self.cursor,
+                "gaps": {id: 0 for id in self.gaps}, "listings": self.listings}, pickle.HIGHEST_PROTOCOL)
+        writeFile(path, state)
+
+    # Load a snapshot written by snapshot(), returns False when there is no usable one
+    def restore(self, path):
+        try:
+            with open(path, "rb") as snapshot:
+                state = pickle.load(snapshot)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.reset(state["epoch"], state["cursor"], {id: now for id in state["gaps"]})
+            self.listings = state["listings"]
+            for listingId in self.listings:
+                self.place(listingId)
+            self.loaded = True
+        return True
+
+    # Warm up from the snapshot if there is one, otherwise from the database, then catch up
+    def load(self):
+        if not self.restore(settings.RANKING_SNAPSHOT):
+            self.build()
+        self.refresh()
+
+
+leaderboards = Leaderboards()
+refresher = None
+refresherLock = threading.Lock()
+
+
+# Keep the leaderboards of this process current: tail the log every RANKING_REFRESH
+# seconds and write a snapshot every RANKING_SNAPSHOT_INTERVAL seconds
+def refreshLoop():
+    snapshotAt = time.monotonic()
+    while True:
+        time.sleep(settings.RANKING_REFRESH)
+        try:
+            leaderboards.refresh()
+            if time.monotonic() - snapshotAt >= settings.RANKING_SNAPSHOT_INTERVAL:
+                leaderboards.snapshot(settings.RANKING_SNAPSHOT)
+                snapshotAt = time.monotonic()
+        except Exception:
+            logger.exception("Refreshing the leaderboards failed")
+        finally:
+            connection.close()
+
+
+def startRefresher():
+    global refresher
+    with refresherLock:
+        if refresher is None:
+            refresher = threading.Thread(target=refreshLoop, name="leaderboards", daemon=True)
+            refresher.start()
+
+
+# Ids of the first n listings of a feed. The first call in a process loads the
+# leaderboards and starts the refresher, later ones only read memory.
+def feed(name, categoryId=None, n=20):
+    if not leaderboards.loaded:
+        with refresherLock:
+            if not leaderboards.loaded:
+                leaderboards.load()
+        if settings.RANKING_REFRESH:
+            startRefresher()
+    return leaderboards.top(name, categoryId, n)
@@ -0,0 +1,111 @@
+import hashlib
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Views that only read and may be served from a replica
+READ_ONLY_VIEWS = {"index", "oldlisting", "category", "category_name", "auctiondetails", "api_listings", "api_listing",
+    "export_listings", "export_bids", "feed"}
+# Views that write even when requested with GET
+WRITE_VIEWS = {"close", "add_watchlist", "remove_watchlist"}
+# Cookie that keeps a user on the primary for a while after their own write
+PIN_COOKIE = "pin_primary"
+
+# Whether reads of the current request may go to a replica
+replicaReads = ContextVar("replicaReads", default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != "default"]
+
+
+# Send reads of read-only views to a random replica and everything else to the primary.
+# Without replicas configured every query goes to "default".
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if aliases and replicaReads.get():
+            return random.choice(aliases)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+# Read from the primary inside the block, e.g. to refill a cache right after a write
+@contextmanager
+def readFromPrimary():
+    token = replicaReads.set(False)
+    try:
+        yield
+    finally:
+        replicaReads.reset(token)
+
+
+# Cache key that keeps API clients on the primary after a write with their token. Unlike
+# browsers, they rarely keep cookies. Needs a cache shared by the web processes, as
+# deployments with replicas have, for the pin to reach the process serving the next read.
+def tokenPinKey(request):
+    header = request.headers.get("Authorization")
+    return "pin:" + hashlib.sha256(header.encode()).hexdigest() if header else None
+
+
+# Decide per request whether its reads may use a replica. After a user writes, the pin
+# cookie, or for API clients the pin of their token, keeps them on the primary for
+# REPLICA_PIN_SECONDS so they always see their own bid or comment even while the
+# replicas lag behind.
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = replicaReads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicaReads.reset(token)
+        match = request.resolver_match
+        if request.method not in ("GET", "HEAD", "OPTIONS") or (match is not None and match.url_name in WRITE_VIEWS):
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+            pinKey = tokenPinKey(request)
+            if pinKey is not None:
+                cache.set(pinKey, 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view, args, kwargs):
+        if request.method not in ("GET", "HEAD") or request.resolver_match.url_name not in READ_ONLY_VIEWS \
+                or PIN_COOKIE in request.COOKIES:
+            return
+        pinKey = tokenPinKey(request)
+        replicaReads.set(pinKey is None or cache.get(pinKey) is None)
+
+
+# Connected to request_started when CONN_HEALTH_CHECKS is on: drop persistent connections
+# that died while idle instead of failing the request's first query. A connection used
+# within CONN_HEALTH_CHECK_IDLE seconds is not checked, sparing busy processes the round trip.
+def checkConnections(**kwargs):
+    now = time.monotonic()
+    for alias in connections:
+        connection = connections[alias]
+        if connection.connection is not None and now - getattr(connection, 'lastUsed', 0) >= \
+                settings.CONN_HEALTH_CHECK_IDLE and not connection.is_usable():
+            connection.close()
+
+
+# Connected to request_finished along with checkConnections
+def connectionsUsed(**kwargs):
+    now = time.monotonic()
+    for alias in connections:
+        if connections[alias].connection is not None:
+            connections[alias].lastUsed = now
@@ -0,0 +1,88 @@
+import re
+
+from django.db import connection
+
+from .models import AuctionListing
+
+# Search results shown on one page
+PAGE_SIZE = 24
+
+# Title matches count ten times as much as matches in the details
+TITLE_WEIGHT = 10.0
+DETAILS_WEIGHT = 1.0
+
+
+# Lower-cased words of a search query, anything else is dropped so users cannot inject query syntax
+def searchTerms(query):
+    return re.findall(r"\w+", query.lower())
+
+
+# Ids of the listings matching every term of query (the last letters of each term may be
+# missing), best match first. Served by the FTS5 table on SQLite and the tsvector GIN index
+# on PostgreSQL, which the migrations create and database triggers keep in sync with every
+# insert, edit and delete of a listing.
+# Returns one page of ids and whether another page follows.
+def searchListings(query, category=None, openOnly=True, page=1, pageSize=PAGE_SIZE):
+    terms = searchTerms(query)
+    if not terms:
+        return [], False
+    offset = (page - 1) * pageSize
+    if connection.vendor == "sqlite":
+        ids = sqliteSearch(terms, category, openOnly, pageSize + 1, offset)
+    elif connection.vendor == "postgresql":
+        ids = postgresSearch(terms, category, openOnly, pageSize + 1, offset)
+    else:
+        ids = scanSearch(terms, category, openOnly, pageSize + 1, offset)
+    return ids[:pageSize], len(ids) > pageSize
+
+
+def filters(category, openOnly):
+    conditions, params = [], []
+    if openOnly:
+        conditions.append("l.\"isClosed\" = %s")
+        params.append(False)
+    if category is not None:
+        conditions.append("l.category_id = %s")
+        params.append(category)
+    return "".join(f" AND {condition}" for condition in conditions), params
+
+
+def sqliteSearch(terms, category, openOnly, limit, offset):
+    match = " ".join(f'"{term}"*' for term in terms)
+    where, params = filters(category, openOnly)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT l.id FROM auctions_listing_fts JOIN auctions_auctionlisting l ON l.id = auctions_listing_fts.rowid"
+            f" WHERE auctions_listing_fts MATCH %s{where}"
+            f" ORDER BY bm25(auctions_listing_fts, {TITLE_WEIGHT}, {DETAILS_WEIGHT}) LIMIT %s OFFSET %s",
+            [match, *params, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def postgresSearch(terms, category, openOnly, limit, offset):
+    match = " & ".join(f"{term}:*" for term in terms)
+    where, params = filters(category, openOnly)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT l.id FROM auctions_auctionlisting l, to_tsquery('english', %s) q"
+            f" WHERE {POSTGRES_VECTOR} @@ q{where}"
+            f" ORDER BY ts_rank({POSTGRES_VECTOR}, q) DESC, l.id DESC LIMIT %s OFFSET %s",
+            [match, *params, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+# Fallback for other databases: a sequential scan with icontains
+def scanSearch(terms, category, openOnly, limit, offset):
+    listings = AuctionListing.objects.all()
+    if openOnly:
+        listings = listings.filter(isClosed=False)
+    if category is not None:
+        listings = listings.filter(category_id=category)
+    for term in terms:
+        listings = listings.filter(auctionTitle__icontains=term) | listings.filter(auctionDetails__icontains=term)
+    return list(listings.order_by('-id').values_list('id', flat=True)[offset:offset + limit])
+
+
+# Weighted document of a listing, must stay identical to the expression of the GIN index
+POSTGRES_VECTOR = ("(setweight(to_tsvector('english', l.\"auctionTitle\"), 'A')"
+    " || setweight(to_tsvector('english', l.\"auctionDetails\"), 'D'))")
@@ -0,0 +1,106 @@
+import queue
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+# Pragmas applied to every SQLite connection in concurrent mode. WAL lets readers run
+# while a write commits, NORMAL sync is durable across application crashes in WAL mode,
+# and the memory map and page cache keep hot pages out of read() calls.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def concurrentMode():
+    return settings.SQLITE_CONCURRENT and connections[DEFAULT_DB_ALIAS].vendor == "sqlite"
+
+
+# Connected to connection_created in concurrent mode
+def tuneConnection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT * 1000)}")
+
+
+class Job:
+    def __init__(self, function, args, kwargs):
+        self.function, self.args, self.kwargs = function, args, kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Funnel the writes of this process through one thread holding one connection.
+# Jobs that arrive together are committed as one transaction, each in its own
+# savepoint so a failing job does not take the others down. Writes stay in
+# submission order and never fight each other for SQLite's write lock.
+class WriteQueue:
+    def __init__(self, maxBatch=64, maxWait=0.002):
+        self.maxBatch = maxBatch
+        self.maxWait = maxWait
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # Run function(*args, **kwargs) on the writer thread and return its result or raise its error
+    def submit(self, function, *args, **kwargs):
+        if threading.current_thread() is self.thread:
+            return function(*args, **kwargs)
+        self.start()
+        job = Job(function, args, kwargs)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="sqlite-writer", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.jobs.get()]
+            try:
+                while len(batch) < self.maxBatch:
+                    batch.append(self.jobs.get(timeout=self.maxWait))
+            except queue.Empty:
+                pass
+            self.commit(batch)
+
+    def commit(self, batch):
+        try:
+            with transaction.atomic():
+                for job in batch:
+                    try:
+                        with transaction.atomic():
+                            job.result = job.function(*job.args, **job.kwargs)
+                    except Exception as error:
+                        job.error = error
+        except Exception as error:
+            # The commit itself failed, none of the jobs were written
+            for job in batch:
+                job.error = job.error or error
+            connection.close()
+        for job in batch:
+            job.done.set()
+
+
+writeQueue = WriteQueue()
+
+
+# Run a write through the write queue in concurrent SQLite mode, or directly otherwise
+def submitWrite(function, *args, **kwargs):
+    if concurrentMode():
+        return writeQueue.submit(function, *args, **kwargs)
+    return function(*args, **kwargs)
@@ -0,0 +1,79 @@
+import asyncio
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .events import broker
+from .expiry import startFollower
+from .models import AuctionListing
+
+# Seconds between keep-alive comments, stops proxies from closing idle streams
+KEEPALIVE = 15
+
+STREAM_PATH = re.compile(r"^/stream/(\d+)$")
+
+
+# Wrap the Django ASGI application so /stream/<id> is served as server-sent events.
+# The stream is handled directly on the event loop: an idle connection costs one
+# coroutine and one queue instead of a worker thread.
+def streamRouter(application):
+    async def router(scope, receive, send):
+        match = STREAM_PATH.match(scope.get("path", "")) if scope["type"] == "http" else None
+        if match is None:
+            return await application(scope, receive, send)
+        # Streams skip Django, so they start following the closes of other processes themselves
+        startFollower()
+        return await streamListing(match.group(1), receive, send)
+    return router
+
+
+# Streams skip Django's request handling, so they close their connection themselves
+def listingExists(listingId):
+    try:
+        return AuctionListing.objects.filter(id=listingId).exists()
+    finally:
+        close_old_connections()
+
+
+# Push the bid, comment and close events of one listing until the client goes away.
+# Listings are public like their details page, only missing ones are refused.
+async def streamListing(listingId, receive, send):
+    if not await sync_to_async(listingExists)(listingId):
+        await send({"type": "http.response.start", "status": 404, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"No such listing"})
+        return
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+    subscription = broker.subscribe(listingId)
+    disconnected = asyncio.ensure_future(waitForDisconnect(receive))
+    try:
+        queue = subscription[1]
+        while not disconnected.done():
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({message, disconnected}, timeout=KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED)
+            if message in done:
+                await send({"type": "http.response.body", "body": message.result(), "more_body": True})
+            else:
+                message.cancel()
+                if not disconnected.done():
+                    await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+    finally:
+        broker.unsubscribe(listingId, subscription)
+        disconnected.cancel()
+
+
+async def waitForDisconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
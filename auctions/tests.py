@@ -1,3 +1,1180 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3.base import DatabaseWrapper as SqliteDatabase
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import cache as listingCache
+from .analytics import aggregateBatch, rebuildRollups, recordListed, recordSales
+from .api import issueToken
+from .bulk import exportListings, importListings
+from .bidding import BID_ATTEMPTS, BidError, placeBid, placeProxyBid, proxyBooks, rebuildBidSummary
+from .categories import registry
+from .dashboard import dashboardPage, dashboardRow
+from .comments import postComment
+from .events import broker, publish
+from .expiry import ClosedFollower, ExpiryScheduler
+from .images import ImageError, fetchImage, pillow, processListing
+from .management.commands.stressbids import runBidStress
+from .models import AuctionEvent, AuctionListing, Bidding, Category, CategoryDayStats, Comments, ListingMinuteStats, \
+    Notification, NotificationEvent, ProxyBid, SellerStats, User, Watchlist
+from .notifications import claimEvents, processBatch
+from .pagination import keysetPage
+from .profiling import RequestProfile, metrics
+from .rankings import HALF_LIFE, Leaderboards, leaderboards
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware, checkConnections, connectionsUsed
+from .search import searchListings
+from .sqlite import Job, WriteQueue, submitWrite, tuneConnection, writeQueue
+from .streaming import streamRouter
+from .warmup import warmUp
+from .watchlist import addToWatchlist, removeFromWatchlist, watchedIds
+
+
+class BiddingTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=Category.objects.create(categoryName="Home"))
+
+    def test_accepted_bid_raises_price_and_keeps_history(self):
+        placeBid(self.bidder, self.listing.id, 11)
+        placeBid(self.bidder, self.listing.id, "15")
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.currentBid, 15)
+        self.assertEqual(self.listing.version, 2)
+        self.assertEqual(self.listing.bidCount, 2)
+        self.assertEqual(self.listing.highestBid.bidAmount, 15)
+        self.assertEqual(Bidding.objects.filter(auction=self.listing).count(), 2)
+
+    def test_rebuild_bid_summary_from_history(self):
+        placeBid(self.bidder, self.listing.id, 11)
+        top = placeBid(self.bidder, self.listing.id, 12)
+        AuctionListing.objects.update(highestBid=None, bidCount=0)
+        rebuildBidSummary()
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.highestBid, self.listing.bidCount), (top, 2))
+
+    def test_rejected_bids_leave_listing_untouched(self):
+        for user, amount in [(self.bidder, 10), (self.bidder, "ten"), (self.seller, 20)]:
+            with self.assertRaises(BidError):
+                placeBid(user, self.listing.id, amount)
+        self.listing.isClosed = True
+        self.listing.save()
+        with self.assertRaises(BidError):
+            placeBid(self.bidder, self.listing.id, 20)
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.currentBid, self.listing.version), (10, 0))
+        self.assertFalse(Bidding.objects.exists())
+
+    def test_lock_timeouts_are_retried_then_rejected(self):
+        with mock.patch("auctions.bidding.attemptBid", side_effect=OperationalError("database is locked")) as attempt:
+            with self.assertRaisesMessage(BidError, "This listing is busy right now"):
+                placeBid(self.bidder, self.listing.id, 11)
+        self.assertEqual(attempt.call_count, BID_ATTEMPTS)
+
+
+class BidStressTests(TransactionTestCase):
+    def test_concurrent_bidders_lose_no_updates(self):
+        results = runBidStress(threads=4, bidsPerThread=10)
+        self.assertTrue(results["consistent"])
+        self.assertGreater(results["accepted"], 0)
+
+
+class ProxyBiddingTests(TestCase):
+    def setUp(self):
+        proxyBooks.clear()
+        self.seller = User.objects.create_user("seller")
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.category = Category.objects.create(categoryName="Home")
+        self.listing = self.createListing()
+
+    def tearDown(self):
+        # Listing ids and versions repeat between tests, so must the books
+        proxyBooks.clear()
+
+    def createListing(self):
+        return AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=self.category)
+
+    def state(self, listing):
+        listing.refresh_from_db()
+        return listing.currentBid, listing.highestBid.user.username, listing.bidCount
+
+    def test_maximums_resolve_to_second_highest_plus_increment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            placeProxyBid(self.alice, self.listing.id, 50)
+        self.assertEqual(self.state(self.listing), (11, "alice", 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(placeProxyBid(self.bob, self.listing.id, 30).user.username, "alice")
+        self.assertEqual(self.state(self.listing), (31, "alice", 2))
+        # A manual bid is kept in the history before the proxy answers it
+        with self.captureOnCommitCallbacks(execute=True):
+            placeBid(self.bob, self.listing.id, 40)
+        self.assertEqual(self.state(self.listing), (41, "alice", 4))
+        with self.captureOnCommitCallbacks(execute=True):
+            placeProxyBid(self.bob, self.listing.id, 60)
+        self.assertEqual(self.state(self.listing), (51, "bob", 5))
+        self.assertEqual(list(Bidding.objects.order_by('id').values_list('user__username', 'bidAmount')),
+            [("alice", 11), ("alice", 31), ("bob", 40), ("alice", 41), ("bob", 51)])
+        self.assertEqual(ProxyBid.objects.get(user=self.bob).maxAmount, 60)
+
+    def test_equal_maximums_go_to_the_earlier_one(self):
+        placeProxyBid(self.alice, self.listing.id, 50)
+        placeProxyBid(self.bob, self.listing.id, 50)
+        self.assertEqual(self.state(self.listing), (50, "alice", 2))
+        with self.assertRaises(BidError):
+            placeProxyBid(self.bob, self.listing.id, 50)
+
+    def test_leader_raising_maximum_keeps_price(self):
+        placeProxyBid(self.alice, self.listing.id, 50)
+        self.assertIsNone(placeProxyBid(self.alice, self.listing.id, 80))
+        self.assertEqual(self.state(self.listing), (11, "alice", 1))
+        placeBid(self.bob, self.listing.id, 60)
+        self.assertEqual(self.state(self.listing), (61, "alice", 3))
+
+    def test_thousand_proxies_resolve_in_one_round_trip(self):
+        now = timezone.now()
+        users = User.objects.bulk_create([User(username=f"proxy{i}") for i in range(1000)])
+        users = User.objects.filter(username__startswith="proxy").order_by('id')
+        ProxyBid.objects.bulk_create([ProxyBid(user=user, listing=self.listing, maxAmount=100 + 2 * i, placedAt=now)
+            for i, user in enumerate(users)])
+        small = self.createListing()
+        ProxyBid.objects.create(user=self.alice, listing=small, maxAmount=2098, placedAt=now)
+
+        def bidQueries(listing, amount):
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                placeBid(self.bob, listing.id, amount)
+            return [query["sql"] for query in queries]
+
+        # The first bid builds the book of each listing, later ones are resolved from memory
+        bidQueries(self.listing, 20)
+        bidQueries(small, 20)
+        self.assertEqual(self.state(self.listing), (2097, "proxy999", 2))
+        large = bidQueries(self.listing, 2098)
+        self.assertEqual(self.state(self.listing), (2098, "proxy999", 4))
+        self.assertEqual(len(large), len(bidQueries(small, 2098)))
+        self.assertFalse([sql for sql in large if "auctions_proxybid" in sql])
+        # The version bump that locks the listing, then the new price
+        self.assertEqual(len([sql for sql in large if sql.startswith("UPDATE")]), 2)
+
+
+class ListingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_moves_to_a_new_generation(self):
+        key = listingCache.listingKey(1, "details")
+        self.assertEqual(listingCache.readThrough(key, lambda: "old"), "old")
+        self.assertEqual(listingCache.readThrough(key, lambda: "unused"), "old")
+        listingCache.invalidateListing(1)
+        key = listingCache.listingKey(1, "details")
+        self.assertEqual(listingCache.readThrough(key, lambda: "new"), "new")
+
+    def test_concurrent_misses_recompute_once(self):
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            threading.Event().wait(0.2)
+            return "value"
+
+        key = listingCache.listingKey(2, "details")
+        results = []
+        first = threading.Thread(target=lambda: results.append(listingCache.readThrough(key, compute)))
+        first.start()
+        started.wait()
+        readers = [threading.Thread(target=lambda: results.append(listingCache.readThrough(key, compute)))
+            for _ in range(5)]
+        for reader in readers:
+            reader.start()
+        for thread in [first] + readers:
+            thread.join()
+        self.assertEqual(results, ["value"] * 6)
+        self.assertEqual(len(calls), 1)
+
+
+class ExpirySchedulerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.category = Category.objects.create(categoryName="Home")
+
+    def listing(self, minutes):
+        return AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=self.category,
+            endsAt=self.now + timedelta(minutes=minutes))
+
+    def test_closes_listings_as_the_simulated_clock_passes_their_end(self):
+        soon, later, beyondHorizon = self.listing(1), self.listing(5), self.listing(60)
+        placeBid(self.bidder, soon.id, 20)
+        scheduler = ExpiryScheduler(clock=lambda: self.now)
+        self.assertEqual(scheduler.tick(), [])
+        self.assertEqual(len(scheduler.heap), 2)
+
+        self.now += timedelta(minutes=2)
+        closed = scheduler.tick()
+        self.assertEqual([listing.id for listing in closed], [soon.id])
+        self.assertEqual(closed[0].highestBid.user, self.bidder)
+        with self.assertRaises(BidError):
+            placeBid(self.bidder, soon.id, 30)
+
+        self.now += timedelta(minutes=60)
+        self.assertEqual({listing.id for listing in scheduler.tick()}, {later.id, beyondHorizon.id})
+        self.assertFalse(AuctionListing.objects.filter(isClosed=False).exists())
+
+    def test_skips_listings_closed_by_their_poster(self):
+        listing = self.listing(1)
+        scheduler = ExpiryScheduler(clock=lambda: self.now)
+        scheduler.tick()
+        AuctionListing.objects.filter(id=listing.id).update(isClosed=True)
+        self.now += timedelta(minutes=2)
+        self.assertEqual(scheduler.tick(), [])
+
+    def test_web_processes_follow_the_closes_of_runexpiry(self):
+        listing = self.listing(1)
+        placeBid(self.bidder, listing.id, 20)
+        follower = ClosedFollower(clock=lambda: self.now)
+        self.now += timedelta(minutes=2)
+        ExpiryScheduler(clock=lambda: self.now).tick()
+        generation = cache.get(listingCache.generationKey(listing.id))
+        with mock.patch("auctions.expiry.publish") as publish:
+            self.assertEqual([closed.id for closed in follower.poll()], [listing.id])
+            self.assertEqual(follower.poll(), [])
+        publish.assert_called_once_with(listing.id, "close", winner="bidder")
+        self.assertNotEqual(cache.get(listingCache.generationKey(listing.id)), generation)
+
+    def test_runexpiry_retries_a_batch_that_failed(self):
+        listing = self.listing(-1)
+        close, batches = ExpiryScheduler.close, []
+        def flakyClose(scheduler, listingIds, now):
+            batches.append(listingIds)
+            if len(batches) == 1:
+                raise OperationalError("database is locked")
+            return close(scheduler, listingIds, now)
+        with mock.patch.object(ExpiryScheduler, "close", flakyClose), \
+                mock.patch("auctions.management.commands.runexpiry.time.sleep", side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs("auctions.management.commands.runexpiry", "ERROR"), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command("runexpiry", stdout=StringIO())
+        self.assertEqual(batches, [[listing.id], [listing.id]])
+        self.assertTrue(AuctionListing.objects.get(id=listing.id).isClosed)
+
+    def test_bids_are_rejected_once_the_end_time_passed(self):
+        listing = self.listing(-1)
+        with self.assertRaises(BidError):
+            placeBid(self.bidder, listing.id, 20)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.category = Category.objects.create(categoryName="Home")
+
+    def listing(self, title, details="", **fields):
+        return AuctionListing.objects.create(user=self.seller, auctionTitle=title, image="http://localhost/",
+            auctionDetails=details, currentBid=10, category=self.category, **fields)
+
+    def test_prefix_match_ranks_titles_first(self):
+        inDetails = self.listing("Bicycle", "with a brass lamp")
+        inTitle = self.listing("Brass lamp")
+        self.assertEqual(searchListings("lam"), ([inTitle.id, inDetails.id], False))
+        self.assertEqual(searchListings("brass bicy"), ([inDetails.id], False))
+
+    def test_index_follows_edits_and_filters(self):
+        listing = self.listing("Bicycle")
+        listing.auctionTitle = "Tricycle"
+        listing.save()
+        self.assertEqual(searchListings("bicycle"), ([], False))
+        self.assertEqual(searchListings("tricycle"), ([listing.id], False))
+        AuctionListing.objects.filter(id=listing.id).update(isClosed=True)
+        self.assertEqual(searchListings("tricycle"), ([], False))
+        self.assertEqual(searchListings("tricycle", openOnly=False, category=self.category.id), ([listing.id], False))
+
+
+class CategoryRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.category = Category.objects.create(categoryName="Home")
+
+    def test_reads_come_from_memory_until_categories_change(self):
+        self.assertEqual(registry.byName("Home").openCount, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual([entry.categoryName for entry in registry.all()], ["Home"])
+        Category.objects.create(categoryName="Garden")
+        self.assertEqual([entry.categoryName for entry in registry.all()], ["Garden", "Home"])
+
+    def test_copies_expire_when_another_process_changed_categories(self):
+        registry.load()
+        # A process with its own local memory cache renames the category, this one is not told
+        Category.objects.filter(id=self.category.id).update(categoryName="House")
+        self.assertEqual(registry.byId(self.category.id).categoryName, "Home")
+        registry.loadedAt -= settings.CATEGORY_REFRESH
+        self.assertEqual(registry.byId(self.category.id).categoryName, "House")
+
+    def test_open_counts_follow_created_and_closed_listings(self):
+        registry.load()
+        listing = AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=self.category)
+        registry.listingsOpened([self.category.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.byName("Home").openCount, 1)
+        registry.listingsClosed([listing.category_id])
+        self.assertEqual(registry.byName("Home").openCount, 0)
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("watcher")
+        category = Category.objects.create(categoryName="Home")
+        self.listings = [AuctionListing.objects.create(user=self.user, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=category) for _ in range(3)]
+
+    def test_adding_is_idempotent_and_cached(self):
+        ids = [listing.id for listing in self.listings]
+        addToWatchlist(self.user, ids[:2])
+        addToWatchlist(self.user, ids + [ids[-1] + 100])
+        self.assertEqual(Watchlist.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(watchedIds(self.user), set(ids))
+        with self.assertNumQueries(0):
+            watchedIds(self.user)
+        removeFromWatchlist(self.user, ids[:1])
+        self.assertEqual(watchedIds(self.user), set(ids[1:]))
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.watchers = [User.objects.create_user(f"watcher-{i}") for i in range(3)]
+        self.listing = AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=Category.objects.create(categoryName="Home"))
+        for watcher in self.watchers:
+            Watchlist.objects.create(user=watcher, listing=self.listing)
+
+    def test_burst_of_bids_is_coalesced_per_watcher(self):
+        for amount in range(11, 61):
+            placeBid(self.watchers[amount % 2], self.listing.id, amount)
+        self.assertEqual(processBatch(None), (50, 2))
+        # The top bidder is not told about their own bid
+        notifications = Notification.objects.filter(listing=self.listing)
+        self.assertEqual(sorted(n.user.username for n in notifications), ["watcher-1", "watcher-2"])
+        self.assertEqual({n.count for n in notifications}, {50})
+        self.assertIn("60$", notifications[0].message)
+
+        placeBid(self.watchers[1], self.listing.id, 70)
+        processBatch(None)
+        self.assertEqual(Notification.objects.filter(listing=self.listing, user=self.watchers[2]).get().count, 51)
+        self.assertEqual(processBatch(None), (0, 0))
+
+    def test_failed_delivery_is_retried_by_the_next_batch(self):
+        placeBid(self.watchers[0], self.listing.id, 20)
+        with mock.patch("auctions.notifications.recipients", side_effect=RuntimeError("database went away")), \
+                self.assertLogs("auctions.notifications", "ERROR"):
+            self.assertEqual(processBatch(None), (1, 0))
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(processBatch(None), (1, 2))
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(processBatch(None), (0, 0))
+
+    def test_events_of_a_dead_worker_are_taken_over_after_their_lease(self):
+        placeBid(self.watchers[0], self.listing.id, 20)
+        self.assertEqual(len(claimEvents()), 1)
+        # The worker died without delivering, the claim keeps others away until it runs out
+        self.assertEqual(processBatch(None), (0, 0))
+        NotificationEvent.objects.update(claimedUntil=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(processBatch(None), (1, 2))
+
+
+class AuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="correct horse")
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_authenticated_page_views_cost_no_auth_queries(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("notifications"))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse("notifications")).status_code, 200)
+        self.assertFalse([query for query in queries
+            if 'FROM "django_session"' in query["sql"] or 'FROM "auctions_user"' in query["sql"]])
+
+    def test_saving_user_evicts_cached_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("notifications"))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("notifications")).status_code, 302)
+
+    def test_login_rehashes_to_configured_iterations(self):
+        with override_settings(PASSWORD_ITERATIONS=1000):
+            self.user.set_password("correct horse")
+            self.user.save()
+        with override_settings(PASSWORD_ITERATIONS=2000):
+            response = self.client.post(reverse("login"), {"username": "alice", "password": "correct horse"})
+        self.assertEqual(response.status_code, 302)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split("$")[:2], ["pbkdf2_sha256", "2000"])
+
+
+class ProfilingTests(TestCase):
+    def test_repeated_query_shapes_are_flagged(self):
+        seller = User.objects.create_user("seller")
+        category = Category.objects.create(categoryName="Home")
+        for _ in range(6):
+            AuctionListing.objects.create(user=seller, auctionTitle="Lamp", image="http://localhost/",
+                auctionDetails="A lamp", currentBid=10, category=category)
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for listing in AuctionListing.objects.all():
+                listing.user.username
+        self.assertEqual(profile.queries, 7)
+        self.assertEqual(list(profile.repeatedQueries().values()), [6])
+
+        metrics.record("index", 0.02, profile)
+        exposition = metrics.prometheus()
+        self.assertIn('bidit_view_queries_total{view="index"} 7', exposition)
+        self.assertIn('bidit_view_nplusone_requests_total{view="index"} 1', exposition)
+
+    def test_metrics_need_a_token_outside_debug(self):
+        url = reverse("metrics")
+        with override_settings(PROFILING=True, METRICS_TOKEN="", DEBUG=False):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(PROFILING=True, METRICS_TOKEN="", DEBUG=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(PROFILING=True, METRICS_TOKEN="secret", DEBUG=False):
+            self.assertEqual(self.client.get(url).status_code, 401)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+
+# Smallest valid PNG of the given size, so the image tests need neither Pillow nor the network
+def pngBytes(width, height):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + b"\x80\x40\x20" * width for _ in range(height))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) \
+        + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+# Stands in for the remote image hosts
+class FixtureImages(BaseHTTPRequestHandler):
+    files = {"/lamp.png": ("image/png", pngBytes(1200, 900)), "/page.html": ("text/html", b"<html></html>")}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        kind, body = self.files[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", kind)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureImages)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = override_settings(IMAGE_ROOT=root.name, IMAGE_ALLOW_PRIVATE=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.seller = User.objects.create_user("seller")
+        self.category = Category.objects.create(categoryName="Home")
+
+    def listing(self, path):
+        return AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image=self.host + path,
+            auctionDetails="A lamp", currentBid=10, category=self.category)
+
+    def test_thumbnails_are_content_addressed_and_served_with_long_cache_headers(self):
+        first, second = self.listing("/lamp.png"), self.listing("/lamp.png")
+        key = processListing(first.id)
+        self.assertEqual(processListing(second.id), key)
+        first.refresh_from_db()
+        self.assertEqual(first.imageKey, key)
+        self.assertRegex(key, r"^[0-9a-f]{64}\.(jpg|png)$")
+
+        response = self.client.get(first.cardImage)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertTrue(b"".join(response.streaming_content))
+        self.assertContains(self.client.get(reverse("index")), first.cardImage, count=2)
+        self.assertEqual(self.client.get(reverse("listing_image", args=["huge", key])).status_code, 404)
+
+    @skipIf(pillow() is None, "Pillow is not installed")
+    def test_thumbnails_fit_their_box(self):
+        listing = self.listing("/lamp.png")
+        processListing(listing.id)
+        listing.refresh_from_db()
+        response = self.client.get(listing.cardImage)
+        thumbnail = pillow().open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(thumbnail.size, (333, 250))
+
+    def test_failed_fetch_keeps_the_remote_image(self):
+        listing = self.listing("/page.html")
+        self.assertIsNone(processListing(listing.id))
+        listing.refresh_from_db()
+        self.assertEqual(listing.cardImage, listing.image)
+
+    def test_private_hosts_are_refused(self):
+        with override_settings(IMAGE_ALLOW_PRIVATE=False):
+            FixtureImages.requests.clear()
+            with self.assertRaises(ImageError):
+                fetchImage(self.host + "/lamp.png")
+            self.assertEqual(FixtureImages.requests, [])
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder", password="secret")
+        self.listing = AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=Category.objects.create(categoryName="Home"))
+        self.url = reverse("api_listing", args=[self.listing.id])
+
+    def auth(self, user=None):
+        return {"HTTP_AUTHORIZATION": f"Bearer {issueToken(user or self.bidder)}"}
+
+    def test_unchanged_listing_answers_304_from_one_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["currentBid"], 10)
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+
+        bid = self.client.post(reverse("api_bids", args=[self.listing.id]), {"amount": 12},
+            content_type="application/json", **self.auth())
+        self.assertEqual(bid.status_code, 201)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["highestBidder"], "bidder")
+
+        comment = self.client.post(reverse("api_comments", args=[self.listing.id]), {"comment": "Nice"},
+            content_type="application/json", **self.auth())
+        self.assertEqual(comment.status_code, 201)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 200)
+
+    def test_writes_need_a_valid_token(self):
+        url = reverse("api_bids", args=[self.listing.id])
+        self.assertEqual(self.client.post(url, {"amount": 12}, content_type="application/json").status_code, 401)
+        self.assertEqual(self.client.post(url, {"amount": 12}, HTTP_AUTHORIZATION="Bearer nope").status_code, 401)
+        token = self.client.post(reverse("api_tokens"), {"username": "bidder", "password": "secret"},
+            content_type="application/json").json()["token"]
+        rejected = self.client.post(url, {"amount": 5}, content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(rejected.status_code, 409)
+
+    def test_rate_limit_per_token(self):
+        headers = self.auth()
+        with override_settings(API_RATE_LIMIT=2):
+            statuses = [self.client.get(reverse("api_listings"), **headers).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            self.assertEqual(self.client.get(reverse("api_listings"), **self.auth()).status_code, 200)
+
+    def test_listings_and_watchlist_pages(self):
+        listings = self.client.get(reverse("api_listings")).json()
+        self.assertEqual([listing["id"] for listing in listings["listings"]], [self.listing.id])
+        self.assertIsNone(listings["next"])
+        found = self.client.get(reverse("api_listings"), {"q": "lamp"}).json()
+        self.assertEqual([listing["id"] for listing in found["listings"]], [self.listing.id])
+        headers = self.auth()
+        watched = self.client.post(reverse("api_watchlist"), {"add": [self.listing.id, 999]},
+            content_type="application/json", **headers).json()
+        self.assertEqual([listing["id"] for listing in watched["listings"]], [self.listing.id])
+        self.assertEqual(self.client.get(reverse("api_watchlist")).status_code, 401)
+
+    def test_token_fields_and_watchlist_ids_must_be_well_typed(self):
+        for body in ({"username": "bidder", "password": "secret", "name": 5},
+                {"username": ["bidder"], "password": "secret"}):
+            response = self.client.post(reverse("api_tokens"), body, content_type="application/json")
+            self.assertEqual((response.status_code, response.json()), (400, {"error": "Malformed request body"}))
+        headers = self.auth()
+        for body in ({"add": 5}, {"add": "12"}, {"remove": {"id": 1}}, {"add": [[1]]}, {"remove": ["one"]}):
+            response = self.client.post(reverse("api_watchlist"), body, content_type="application/json", **headers)
+            self.assertEqual((response.status_code, response.json()), (400, {"error": "Malformed request body"}))
+        self.assertFalse(Watchlist.objects.exists())
+        watched = self.client.post(reverse("api_watchlist"), {"add": [self.listing.id]}, **headers).json()
+        self.assertEqual([listing["id"] for listing in watched["listings"]], [self.listing.id])
+
+    def test_comment_must_be_text(self):
+        url = reverse("api_comments", args=[self.listing.id])
+        headers = self.auth()
+        for body in ('{"comment": 5}', '{"comment": ["Nice"]}', '[]', 'nope'):
+            response = self.client.post(url, body, content_type="application/json", **headers)
+            self.assertEqual((response.status_code, response.json()), (400, {"error": "Malformed request body"}))
+        self.assertEqual(self.client.post(url, {"comment": " "}, content_type="application/json", **headers)
+            .status_code, 400)
+        self.assertFalse(Comments.objects.exists())
+
+    def test_search_within_a_category(self):
+        Category.objects.create(categoryName="Garden")
+        for category, expected in [("Home", [self.listing.id]), ("Garden", []), ("Nowhere", [])]:
+            for query in ({"q": "lamp"}, {}):
+                found = self.client.get(reverse("api_listings"), {**query, "category": category})
+                self.assertEqual(found.status_code, 200)
+                self.assertEqual([listing["id"] for listing in found.json()["listings"]], expected)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.category = Category.objects.create(categoryName="Home")
+        self.sold, self.unsold = [AuctionListing.objects.create(user=self.seller, auctionTitle=title,
+            image="http://localhost/", auctionDetails="", currentBid=10, category=self.category)
+            for title in ["Lamp", "Chair"]]
+        recordListed([self.sold, self.unsold])
+
+    def close(self, listing):
+        self.client.force_login(self.seller)
+        self.client.get(reverse("close", args=[listing.id]))
+
+    def rollups(self):
+        return [list(model.objects.order_by('id').values(*fields)) for model, fields in [
+            (ListingMinuteStats, ['listing', 'minute', 'bids', 'highest']),
+            (CategoryDayStats, ['category', 'day', 'listed', 'bids', 'closed', 'sold', 'revenue']),
+            (SellerStats, ['seller', 'listed', 'closed', 'sold', 'revenue'])]]
+
+    def test_rollups_fold_incrementally_and_match_a_rebuild(self):
+        placeBid(self.bidder, self.sold.id, 11)
+        self.assertEqual(aggregateBatch(), 3)
+        placeBid(self.bidder, self.sold.id, 15)
+        self.close(self.sold)
+        self.close(self.unsold)
+        self.assertEqual(aggregateBatch(), 3)
+        self.assertEqual(aggregateBatch(), 0)
+
+        minutes = ListingMinuteStats.objects.filter(listing=self.sold)
+        self.assertEqual((sum(minute.bids for minute in minutes), max(minute.highest for minute in minutes)), (2, 15))
+        stats = SellerStats.objects.get(seller=self.seller)
+        self.assertEqual((stats.listed, stats.closed, stats.sold, stats.revenue), (2, 2, 1, 15))
+        incremental = self.rollups()
+        rebuildRollups(batchSize=2)
+        self.assertEqual(self.rollups(), incremental)
+
+        categories = self.client.get(reverse("category_analytics")).json()["categories"]
+        self.assertEqual(categories["Home"]["averageFinalPrice"], 15)
+        seller = self.client.get(reverse("seller_analytics", args=["seller"])).json()
+        self.assertEqual(seller["sellThrough"], 0.5)
+        self.client.force_login(self.bidder)
+        self.assertEqual(self.client.get(reverse("seller_analytics", args=["seller"])).status_code, 404)
+        self.bidder.is_staff = True
+        self.bidder.save()
+        self.assertEqual(self.client.get(reverse("seller_analytics", args=["seller"])).json()["sellThrough"], 0.5)
+        series = self.client.get(reverse("listing_analytics", args=[self.sold.id])).json()["minutes"]
+        self.assertEqual((sum(row["bids"] for row in series), series[-1]["highest"]), (2, 15))
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.home, self.garden = [Category.objects.create(categoryName=name) for name in ["Home", "Garden"]]
+        soon = timezone.now() + timedelta(hours=1)
+        self.lamp, self.chair, self.rake = [AuctionListing.objects.create(user=self.seller, auctionTitle=title,
+            image="http://localhost/", auctionDetails="", currentBid=10, category=category, endsAt=endsAt)
+            for title, category, endsAt in [("Lamp", self.home, soon + timedelta(minutes=5)), ("Chair", self.home, soon),
+                ("Rake", self.garden, None)]]
+        recordListed([self.lamp, self.chair, self.rake])
+        self.boards = Leaderboards()
+        self.boards.build()
+
+    def test_feeds_follow_the_event_log(self):
+        late = AuctionListing.objects.create(user=self.seller, auctionTitle="Vase", image="http://localhost/",
+            auctionDetails="", currentBid=10, category=self.home)
+        recordListed([late])
+        placeBid(self.bidder, self.chair.id, 11)
+        placeBid(self.bidder, self.chair.id, 12)
+        placeBid(self.bidder, self.rake.id, 11)
+        postComment(self.bidder, self.lamp.id, "Does it work?")
+        addToWatchlist(self.bidder, [late.id])
+        self.boards.refresh()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.boards.top("trending"), [self.chair.id, self.rake.id, self.lamp.id, late.id])
+            self.assertEqual(self.boards.top("mostbids", self.home.id), [self.chair.id, late.id, self.lamp.id])
+            self.assertEqual(self.boards.top("endingsoon"), [self.chair.id, self.lamp.id])
+            self.assertEqual(self.boards.top("trending", self.garden.id, 5), [self.rake.id])
+        recordSales([self.chair.id])
+        self.boards.refresh()
+        self.assertEqual(self.boards.top("mostbids"), [self.rake.id, late.id, self.lamp.id])
+        self.assertEqual(self.boards.top("endingsoon"), [self.lamp.id])
+
+    def test_older_activity_weighs_less(self):
+        now = timezone.now()
+        self.boards.apply([(1000, self.lamp.id, AuctionEvent.BID, now - HALF_LIFE * 2),
+            (1001, self.rake.id, AuctionEvent.WATCHED, now)], {})
+        self.assertEqual(self.boards.top("trending"), [self.rake.id, self.lamp.id])
+        self.boards.rebase(now + HALF_LIFE * 10)
+        self.assertEqual(self.boards.top("trending"), [self.rake.id, self.lamp.id])
+        self.assertEqual(self.boards.top("mostbids"), [self.lamp.id, self.rake.id, self.chair.id])
+
+    def test_snapshot_restores_without_queries(self):
+        placeBid(self.bidder, self.rake.id, 11)
+        self.boards.refresh()
+        with tempfile.TemporaryDirectory() as directory:
+            path = directory + "/rankings.snapshot"
+            self.boards.snapshot(path)
+            restored = Leaderboards()
+            with self.assertNumQueries(0):
+                self.assertTrue(restored.restore(path))
+        for feed in ["trending", "mostbids", "endingsoon"]:
+            self.assertEqual(restored.top(feed), self.boards.top(feed))
+        self.assertEqual(restored.cursor, self.boards.cursor)
+        self.assertFalse(Leaderboards().restore(path))
+
+    def test_feed_page(self):
+        placeBid(self.bidder, self.rake.id, 11)
+        leaderboards.loaded = False
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(RANKING_REFRESH=0, RANKING_SNAPSHOT=directory + "/rankings.snapshot"):
+            response = self.client.get(reverse("feed", args=["trending"]))
+            self.assertContains(response, "Rake")
+            self.assertNotContains(response, "Lamp")
+            response = self.client.get(reverse("feed", args=["endingsoon"]), {"category": "Home"})
+            self.assertIn("Chair", response.context["cards"][0]["html"])
+            self.assertEqual(self.client.get(reverse("feed", args=["newest"])).status_code, 404)
+        leaderboards.loaded = False
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.other = User.objects.create_user("other")
+        self.bidder = User.objects.create_user("bidder")
+        category = Category.objects.create(categoryName="Home")
+        self.listings = [AuctionListing.objects.create(user=self.seller, auctionTitle=f"Lamp {i}",
+            image="http://localhost/", auctionDetails="", currentBid=10, category=category) for i in range(30)]
+        self.foreign = AuctionListing.objects.create(user=self.other, auctionTitle="Chair", image="http://localhost/",
+            auctionDetails="", currentBid=10, category=category)
+        self.lamp = self.listings[-1]
+        placeBid(self.bidder, self.lamp.id, 11)
+        postComment(self.bidder, self.lamp.id, "Nice")
+        postComment(self.other, self.lamp.id, "Still available?")
+        addToWatchlist(self.bidder, [self.lamp.id])
+        self.token = issueToken(self.seller)
+
+    def get(self, **params):
+        return self.client.get(reverse("api_dashboard"), params, HTTP_AUTHORIZATION=f"Bearer {self.token}").json()
+
+    def test_stats_of_a_page_in_one_query(self):
+        with self.assertNumQueries(1):
+            page, cursor = dashboardPage(self.seller, "open", pageSize=10)
+            rows = [dashboardRow(listing) for listing in page]
+        self.assertEqual({key: rows[0][key] for key in ["id", "bidCount", "topBidder", "comments", "watchers"]},
+            {"id": self.lamp.id, "bidCount": 1, "topBidder": "bidder", "comments": 2, "watchers": 1})
+        self.assertEqual((rows[1]["topBidder"], rows[1]["comments"], rows[1]["watchers"]), (None, 0, 0))
+        pages = [listing.id for listing in page]
+        while cursor:
+            page, cursor = dashboardPage(self.seller, "open", cursor, pageSize=10)
+            pages.extend(listing.id for listing in page)
+        self.assertEqual(pages, [listing.id for listing in reversed(self.listings)])
+
+    def test_bulk_close_and_filters(self):
+        data = self.client.post(reverse("api_dashboard") + "?status=closed",
+            json.dumps({"close": [self.lamp.id, self.listings[0].id, self.foreign.id]}), content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {self.token}").json()
+        self.assertEqual(sorted(data["closed"]), sorted([self.lamp.id, self.listings[0].id]))
+        self.assertEqual([row["id"] for row in data["listings"]], [self.lamp.id, self.listings[0].id])
+        self.assertEqual(len(self.get(status="open")["listings"]), 28)
+        self.assertFalse(AuctionListing.objects.get(id=self.foreign.id).isClosed)
+        self.assertEqual(AuctionEvent.objects.filter(kind=AuctionEvent.CLOSED).count(), 2)
+
+        self.client.force_login(self.seller)
+        response = self.client.post(reverse("dashboard_close"), {"close": [self.listings[1].id]})
+        self.assertRedirects(response, reverse("dashboard") + "?", fetch_redirect_response=False)
+        response = self.client.get(reverse("dashboard"), {"status": "closed"})
+        self.assertEqual(len(response.context["listings"]), 3)
+        self.assertContains(response, "Lamp 1")
+
+
+class CardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.category = Category.objects.create(categoryName="Home")
+        self.listing = AuctionListing.objects.create(user=self.seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=self.category)
+
+    def test_cards_are_shared_across_pages_and_users_until_the_listing_changes(self):
+        self.client.force_login(self.bidder)
+        with self.assertTemplateUsed("auctions/listingcard.html"):
+            self.client.get(reverse("index"))
+        Watchlist.objects.create(user=self.seller, listing=self.listing)
+        self.client.force_login(self.seller)
+        for page in [reverse("index"), reverse("watchlist"), reverse("category_name", args=["Home"])]:
+            with self.assertTemplateNotUsed("auctions/listingcard.html"):
+                response = self.client.get(page)
+            self.assertContains(response, "Current bid: 10$")
+
+        placeBid(self.bidder, self.listing.id, 12)
+        self.assertContains(self.client.get(reverse("index")), "Current bid: 12$")
+        self.client.get(reverse("close", args=[self.listing.id]))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.version, 2)
+
+    def test_closing_a_malformed_id_renders_the_error_page(self):
+        self.client.force_login(self.seller)
+        response = self.client.get(reverse("close", args=["abc"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "There is no listing associated")
+
+    def test_anonymous_index_is_cached_whole(self):
+        first = self.client.get(reverse("index"))
+        self.assertIn("Cookie", first["Vary"])
+        AuctionListing.objects.create(user=self.seller, auctionTitle="Chair", image="http://localhost/",
+            auctionDetails="A chair", currentBid=10, category=self.category)
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse("index"))
+        self.assertEqual(cached.content, first.content)
+        self.client.force_login(self.bidder)
+        self.assertContains(self.client.get(reverse("index")), "Chair")
+
+
+class BulkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        Category.objects.create(categoryName="Home")
+
+    def test_csv_import_reports_bad_rows_and_inserts_the_rest(self):
+        rows = "auctionTitle,image,currentBid,auctionDetails,category\n" \
+            "Lamp,http://localhost/lamp.png,10,A lamp,Home\n" \
+            "Chair,not a url,ten,A chair,Home\n" \
+            "Table,http://localhost/table.png,20,\"A table,\nsolid\",Garden\n" \
+            "Sofa,http://localhost/sofa.png,30,A sofa,Home\n"
+        report = importListings(BytesIO(rows.encode()), "csv", self.seller, batchSize=1)
+        self.assertEqual((report["created"], report["failed"]), (2, 2))
+        self.assertEqual([error["line"] for error in report["errors"]], [3, 5])
+        self.assertEqual(set(report["errors"][0]["errors"]), {"image", "currentBid"})
+        self.assertIn("category", report["errors"][1]["errors"])
+        self.assertEqual(sorted(AuctionListing.objects.values_list('auctionTitle', flat=True)), ["Lamp", "Sofa"])
+        self.assertEqual(registry.byName("Home").openCount, 2)
+
+    def test_jsonl_export_round_trips_through_import(self):
+        lines = [{"auctionTitle": f"Lamp {i}", "image": "http://localhost/", "currentBid": i, "auctionDetails": "A lamp",
+            "category": "Home"} for i in range(1, 6)]
+        stream = BytesIO(("\n".join(json.dumps(line) for line in lines) + "\n[1]\n").encode())
+        report = importListings(stream, "jsonl", self.seller, batchSize=2)
+        self.assertEqual((report["created"], report["failed"]), (5, 1))
+        ids = list(AuctionListing.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(AuctionEvent.objects.filter(kind=AuctionEvent.LISTED).count(), 5)
+        self.assertEqual(set(AuctionEvent.objects.values_list('listing_id', flat=True)), set(ids))
+
+        exported = [json.loads(line) for line in "".join(exportListings("jsonl", self.seller)).splitlines()]
+        self.assertEqual([row["id"] for row in exported], ids)
+        self.assertEqual(exported[0]["category"], "Home")
+
+    def test_create_listing_rejects_invalid_forms(self):
+        self.client.force_login(self.seller)
+        response = self.client.post(reverse("createlisting"), {"auctionTitle": "Lamp", "image": "nope"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(AuctionListing.objects.exists())
+
+        upload = SimpleUploadedFile("items.csv", b"auctionTitle,image,currentBid,auctionDetails,category\n"
+            b"Lamp,http://localhost/,10,A lamp,Home\n")
+        report = self.client.post(reverse("import_listings"), {"file": upload}).json()
+        self.assertEqual((report["created"], report["failed"]), (1, 0))
+
+    def test_export_streams_csv(self):
+        self.client.force_login(self.seller)
+        response = self.client.get(reverse("export_bids"), {"format": "csv"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content).decode().splitlines(),
+            ["id,listing,bidder,bidAmount,bidDate"])
+
+
+@mock.patch("auctions.routers.replicas", return_value=["replica1"])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    # Run request through the middleware, returns the response and where its view read from
+    def route(self, request):
+        request.resolver_match = resolve(request.path)
+        routed = []
+
+        def view(request):
+            routed.append(PrimaryReplicaRouter().db_for_read(AuctionListing))
+            return HttpResponse()
+
+        def handler(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = ReplicaRoutingMiddleware(handler)
+        return middleware(request), routed[0]
+
+    def test_reads_go_to_a_replica_until_the_user_writes(self, replicas):
+        response, alias = self.route(self.factory.get(reverse("index")))
+        self.assertEqual(alias, "replica1")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.route(self.factory.get(reverse("watchlist")))[1], "default")
+
+        response, alias = self.route(self.factory.post(reverse("comment", args=[1])))
+        self.assertEqual(alias, "default")
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.factory.cookies[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.route(self.factory.get(reverse("index")))[1], "default")
+
+    def test_api_clients_are_pinned_by_their_token(self, replicas):
+        self.route(self.factory.post(reverse("api_bids", args=[1]), HTTP_AUTHORIZATION="Bearer writer"))
+        self.assertEqual(self.route(self.factory.get(reverse("api_listings"), HTTP_AUTHORIZATION="Bearer writer"))[1],
+            "default")
+        self.assertEqual(self.route(self.factory.get(reverse("api_listings"), HTTP_AUTHORIZATION="Bearer reader"))[1],
+            "replica1")
+        self.assertEqual(self.route(self.factory.get(reverse("api_listings")))[1], "replica1")
+
+    def test_only_idle_connections_are_health_checked(self, replicas):
+        connection.ensure_connection()
+        with mock.patch.object(connection, "is_usable", return_value=True) as usable:
+            connectionsUsed()
+            checkConnections()
+            usable.assert_not_called()
+            connection.lastUsed -= settings.CONN_HEALTH_CHECK_IDLE
+            checkConnections()
+            usable.assert_called_once()
+
+class SqliteTests(TransactionTestCase):
+    def test_pragmas_are_applied_on_connect(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = SqliteDatabase({**connection.settings_dict, "NAME": directory.name + "/tuned.sqlite3"}, "tuned")
+        connection_created.connect(tuneConnection, dispatch_uid="test-tune-sqlite")
+        self.addCleanup(connection_created.disconnect, dispatch_uid="test-tune-sqlite")
+        with override_settings(SQLITE_BUSY_TIMEOUT=3):
+            database.ensure_connection()
+        try:
+            with database.cursor() as cursor:
+                values = {pragma: cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+                    for pragma in ["journal_mode", "synchronous", "cache_size", "temp_store", "busy_timeout"]}
+        finally:
+            database.close()
+        # synchronous 1 is NORMAL and temp_store 2 is MEMORY
+        self.assertEqual(values, {"journal_mode": "wal", "synchronous": 1, "cache_size": -64 * 1024, "temp_store": 2,
+            "busy_timeout": 3000})
+
+    def test_jobs_run_one_at_a_time_on_the_writer_thread(self):
+        writes = WriteQueue(maxWait=0.01)
+        running, threads, lock = [0], set(), threading.Lock()
+
+        def job(number):
+            with lock:
+                running[0] += 1
+                overlapping = running[0] > 1
+            time.sleep(0.001)
+            with lock:
+                running[0] -= 1
+            threads.add(threading.current_thread())
+            return number, overlapping
+
+        results = []
+        submitters = [threading.Thread(target=lambda number=number: results.append(writes.submit(job, number)))
+            for number in range(20)]
+        for submitter in submitters:
+            submitter.start()
+        for submitter in submitters:
+            submitter.join()
+        self.assertEqual(sorted(results), [(number, False) for number in range(20)])
+        self.assertEqual(threads, {writes.thread})
+
+    def test_a_failing_job_only_rolls_back_its_own_savepoint(self):
+        def create(name, fail=False):
+            category = Category.objects.create(categoryName=name)
+            if fail:
+                raise ValueError(name)
+            return category.categoryName
+
+        batch = [Job(create, ("Home",), {}), Job(create, ("Garden",), {"fail": True}), Job(create, ("Toys",), {})]
+        WriteQueue().commit(batch)
+        self.assertEqual([job.result for job in batch], ["Home", None, "Toys"])
+        self.assertIsInstance(batch[1].error, ValueError)
+        self.assertTrue(all(job.done.is_set() for job in batch))
+        self.assertEqual(sorted(Category.objects.values_list('categoryName', flat=True)), ["Home", "Toys"])
+
+    def test_writes_run_directly_outside_concurrent_mode(self):
+        with override_settings(SQLITE_CONCURRENT=False), mock.patch.object(writeQueue, "submit") as submit:
+            self.assertEqual(submitWrite(lambda value: threading.current_thread(), 1), threading.current_thread())
+        submit.assert_not_called()
+        with override_settings(SQLITE_CONCURRENT=True), mock.patch.object(writeQueue, "submit") as submit:
+            submitWrite(len, "queued")
+        submit.assert_called_once_with(len, "queued")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user("seller")
+        category = Category.objects.create(categoryName="Home")
+        AuctionListing.objects.bulk_create([AuctionListing(user=seller, auctionTitle=f"Lamp {number}",
+            image="http://localhost/", auctionDetails="A lamp", currentBid=10, category=category) for number in range(7)])
+        # Two groups of listings posted in the same instant
+        now = timezone.now()
+        ids = list(AuctionListing.objects.order_by('id').values_list('id', flat=True))
+        AuctionListing.objects.filter(id__in=ids[:4]).update(listingDate=now - timedelta(hours=1))
+        AuctionListing.objects.filter(id__in=ids[4:]).update(listingDate=now)
+        self.ids = ids
+
+    def pages(self, cursor=None):
+        pages = []
+        while True:
+            rows, cursor = keysetPage(AuctionListing.objects.all(), cursor, 'listingDate', pageSize=3)
+            pages.append([listing.id for listing in rows])
+            if cursor is None:
+                return pages
+
+    def test_ties_on_the_date_are_ordered_by_id(self):
+        self.assertEqual(self.pages(), [self.ids[6:3:-1], self.ids[3:0:-1], self.ids[:1]])
+
+    def test_last_page_has_no_cursor(self):
+        rows, cursor = keysetPage(AuctionListing.objects.all(), None, 'listingDate', pageSize=7)
+        self.assertEqual((len(rows), cursor), (7, None))
+        rows, cursor = keysetPage(AuctionListing.objects.all(), None, 'listingDate', pageSize=6)
+        self.assertEqual(keysetPage(AuctionListing.objects.all(), cursor, 'listingDate', pageSize=6),
+            (list(AuctionListing.objects.filter(id=self.ids[0])), None))
+
+    def test_malformed_cursors_start_from_the_first_page(self):
+        first = self.pages()[0]
+        # Not base64, no separator, and a position whose id is not a number
+        for cursor in ("!!", "bm9wZQ", base64.urlsafe_b64encode(b"2021-01-01T00:00:00|x").decode()):
+            self.assertEqual(self.pages(cursor)[0], first)
+
+
+class CommentPaginationTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user("reader")
+        self.listing = AuctionListing.objects.create(user=self.reader, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=Category.objects.create(categoryName="Home"))
+        Comments.objects.bulk_create([Comments(user=self.reader, auction=self.listing, comments=f"Comment {number}")
+            for number in range(45)])
+        # Comments posted in the same instant are told apart by their id
+        Comments.objects.update(commentDate=timezone.now() - timedelta(minutes=1))
+        self.client.force_login(self.reader)
+
+    def page(self, cursor=None):
+        response = self.client.get(reverse("comments", args=[self.listing.id]), {"cursor": cursor} if cursor else {})
+        return [comment["comment"] for comment in response.json()["comments"]], response.json()["next"]
+
+    def test_cursors_walk_every_comment_once(self):
+        first, cursor = self.page()
+        for number in range(3):
+            postComment(self.reader, self.listing.id, f"New comment {number}")
+        second, cursor = self.page(cursor)
+        third, cursor = self.page(cursor)
+        self.assertEqual((len(first), len(second), len(third)), (20, 20, 5))
+        self.assertIsNone(cursor)
+        self.assertEqual(first + second + third, [f"Comment {number}" for number in range(44, -1, -1)])
+        self.assertEqual(self.page()[0][:3], ["New comment 2", "New comment 1", "New comment 0"])
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ("nope", "bm9wZQ", "!!"):
+            self.assertEqual(self.client.get(reverse("comments", args=[self.listing.id]), {"cursor": cursor})
+                .status_code, 400)
+            self.assertEqual(self.client.get(reverse("api_comments", args=[self.listing.id]), {"cursor": cursor})
+                .json(), {"error": "Malformed cursor"})
+
+
+@override_settings(CLOSED_FOLLOW_INTERVAL=0)
+class StreamingTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user("seller")
+        self.listing = AuctionListing.objects.create(user=seller, auctionTitle="Lamp", image="http://localhost/",
+            auctionDetails="A lamp", currentBid=10, category=Category.objects.create(categoryName="Home"))
+
+    def open(self, listingId):
+        async def django(scope, receive, send):
+            raise AssertionError("Streams must not reach Django")
+        return ApplicationCommunicator(streamRouter(django), {"type": "http", "path": f"/stream/{listingId}"})
+
+    async def subscribed(self, count=1):
+        for _ in range(100):
+            if broker.connections(self.listing.id) == count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"Expected {count} streams of the listing")
+
+    async def test_missing_listings_are_not_found(self):
+        stream = self.open(self.listing.id + 1)
+        await stream.send_input({"type": "http.request"})
+        self.assertEqual((await stream.receive_output())["status"], 404)
+        self.assertEqual((await stream.receive_output())["body"], b"No such listing")
+        await stream.wait()
+
+    async def test_events_are_framed_until_the_client_disconnects(self):
+        stream = self.open(self.listing.id)
+        await stream.send_input({"type": "http.request"})
+        start = await stream.receive_output()
+        self.assertEqual((start["status"], dict(start["headers"])[b"content-type"]), (200, b"text/event-stream"))
+        self.assertEqual((await stream.receive_output())["body"], b"retry: 5000\n\n")
+        await self.subscribed()
+
+        publish(self.listing.id, "bid", amount=12, bidder="bidder")
+        publish(self.listing.id, "close", winner="bidder")
+        self.assertEqual((await stream.receive_output())["body"],
+            b'event: bid\ndata: {"amount": 12, "bidder": "bidder"}\n\n')
+        self.assertEqual((await stream.receive_output())["body"], b'event: close\ndata: {"winner": "bidder"}\n\n')
+
+        with mock.patch("auctions.streaming.KEEPALIVE", 0.01):
+            publish(self.listing.id, "comment", comment="Nice")
+            await stream.receive_output()
+            self.assertEqual((await stream.receive_output())["body"], b": keep-alive\n\n")
+        await stream.send_input({"type": "http.disconnect"})
+        await stream.wait()
+        self.assertEqual(broker.connections(self.listing.id), 0)
+
+
+class WarmupTests(TransactionTestCase):
+    def test_warm_up_loads_categories(self):
+        cache.clear()
+        Category.objects.create(categoryName="Home")
+        warmUp()
+        with self.assertNumQueries(0):
+            self.assertEqual([entry.categoryName for entry in registry.all()], ["Home"])
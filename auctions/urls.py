@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -12,10 +12,36 @@ urlpatterns = [
     path("watchlist", views.watchList, name="watchlist"),
     path("add_watchlist/<str:id>", views.addWatchlist, name="add_watchlist"),
     path("remove_watchlist/<str:id>", views.removeWatchlist, name="remove_watchlist"),
+    path("watchlist/batch", views.batchWatchlist, name="batch_watchlist"),
     path("bidding/<str:id>", views.makeBidding, name="bidding"),
+    path("proxybidding/<str:id>", views.makeProxyBidding, name="proxy_bidding"),
     path("close/<str:id>", views.closeListing, name="close"),
     path("comment/<str:id>", views.comment, name="comment"),
+    path("comments/<str:id>", views.commentList, name="comments"),
     path("category", views.category, name="category"),
     path("category/<str:name>", views.categoryName, name="category_name"),
-    path("oldlisting", views.oldListing, name="oldlisting")
+    path("oldlisting", views.oldListing, name="oldlisting"),
+    path("search", views.search, name="search"),
+    path("dashboard", views.dashboard, name="dashboard"),
+    path("dashboard/close", views.dashboardClose, name="dashboard_close"),
+    path("feeds/<str:name>", views.feed, name="feed"),
+    path("cachestats", views.cacheStatistics, name="cachestats"),
+    path("notifications", views.notifications, name="notifications"),
+    path("notifications/read", views.readNotifications, name="read_notifications"),
+    path("metrics", views.metricsView, name="metrics"),
+    path("images/<str:size>/<str:key>", views.listingImage, name="listing_image"),
+    path("api/v1/listings", api.listings, name="api_listings"),
+    path("api/v1/listings/<int:id>", api.listing, name="api_listing"),
+    path("api/v1/listings/<int:id>/bids", api.bids, name="api_bids"),
+    path("api/v1/listings/<int:id>/proxy", api.proxy, name="api_proxy"),
+    path("api/v1/listings/<int:id>/comments", api.comments, name="api_comments"),
+    path("api/v1/watchlist", api.watchlist, name="api_watchlist"),
+    path("api/v1/dashboard", api.dashboard, name="api_dashboard"),
+    path("api/v1/tokens", api.tokens, name="api_tokens"),
+    path("analytics/listing/<int:id>", views.listingAnalytics, name="listing_analytics"),
+    path("analytics/categories", views.categoryAnalytics, name="category_analytics"),
+    path("analytics/seller/<str:name>", views.sellerAnalytics, name="seller_analytics"),
+    path("import", views.importListings, name="import_listings"),
+    path("export/listings", views.exportListings, name="export_listings"),
+    path("export/bids", views.exportBids, name="export_bids")
 ]
@@ -1,39 +1,100 @@
+import re
+
 from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.urls import reverse
 from django.forms import ModelForm
 from django.contrib.auth.decorators import login_required
-from django import forms
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+
+from . import bulk, rankings
+from .analytics import categorySeries, listingSeries, recordListed, sellerSummary
+from .bidding import BidError, placeBid, placeProxyBid
+from .cache import cacheAnonymousPage, cacheStats, invalidateListing, listingKey, readThrough
+from .cards import listingCards
+from .categories import registry as categoryRegistry
+from .comments import CursorError, commentPage, postComment
+from .dashboard import STATUSES, bulkClose, dashboardPage
+from .events import publish
+from .forms import ListingForm
+from .images import THUMBNAIL_SIZES, contentType, queueThumbnails, thumbnailPath
+from .models import AuctionListing, User, Notification
+from .pagination import keysetPage
+from .profiling import metrics
+from .routers import readFromPrimary
+from .search import searchListings
+from .sqlite import submitWrite
+from .watchlist import addToWatchlist, removeFromWatchlist, watchedIds
+
+# Fields needed to render one listing card in index.html
+CARD_FIELDS = ['id', 'version', 'auctionTitle', 'image', 'imageKey', 'auctionDetails', 'currentBid', 'listingDate', 'isClosed',
+    'user__username', 'category__categoryName']
+# Listings shown on a feed page
+FEED_SIZE = 30
+
+# One page of listings with the given status, newest first
+def listingPage(request, isClosed, **filters):
+    listings = AuctionListing.objects.filter(isClosed=isClosed, **filters) \
+        .select_related('user', 'category').only(*CARD_FIELDS)
+    return keysetPage(listings, request.GET.get('cursor'), 'listingDate')
 
-from .models import AuctionListing, User, Bidding, Comments, Watchlist, Category
+# Link to the page after the current one, keeping the other query parameters
+def nextPageUrl(request, **position):
+    params = request.GET.copy()
+    for key, value in position.items():
+        params[key] = value
+    return "?" + params.urlencode()
 
 # Main page to view all active auction listing
+@cacheAnonymousPage
 def index(request):
-    active_listings = []
-    all_listings = AuctionListing.objects.all()
-    for listing in all_listings:
-        if listing.isClosed is False:
-            active_listings.append(listing)
+    active_listings, next_cursor = listingPage(request, False)
     return render(request, "auctions/index.html", {
         "title": "All active listings available:",
-        "listings": active_listings,
-        "is_watchlist_remove": True,
+        "cards": listingCards(active_listings, watchedIds(request.user)),
+        "next_url": nextPageUrl(request, cursor=next_cursor) if next_cursor else None,
         "is_index": True
     })
 
 # View all inactive and closed auction listings
 def oldListing(request):
-    closed_listing = []
-    all_listings = AuctionListing.objects.all()
-    for listing in all_listings:
-        if listing.isClosed is True:
-            closed_listing.append(listing)
+    closed_listing, next_cursor = listingPage(request, True)
     return render(request, "auctions/index.html", {
         "title": "Closed listings:",
-        "listings": closed_listing,
-        "is_watchlist_remove": True
+        "cards": listingCards(closed_listing, watchedIds(request.user)),
+        "next_url": nextPageUrl(request, cursor=next_cursor) if next_cursor else None
+    })
+
+# Search listings by title and details, best match first
+def search(request):
+    query = request.GET.get('q', '')
+    page = int(request.GET['page']) if request.GET.get('page', '').isdigit() else 1
+    category = categoryRegistry.byName(request.GET.get('category', ''))
+    ids, has_next = searchListings(query, category=category.id if category else None, openOnly=request.GET.get('closed') != 'on',
+        page=max(page, 1))
+    cards = AuctionListing.objects.select_related('user', 'category').only(*CARD_FIELDS).in_bulk(ids)
+    return render(request, "auctions/index.html", {
+        "title": f"Search results for \"{query}\":",
+        "cards": listingCards([cards[id] for id in ids if id in cards], watchedIds(request.user)),
+        "next_url": nextPageUrl(request, page=page + 1) if has_next else None
+    })
+
+# Trending, most bid on or ending soon listings, overall or in the ?category= given
+def feed(request, name):
+    if name not in rankings.FEEDS:
+        raise Http404("No such feed")
+    category = categoryRegistry.byName(request.GET.get('category', ''))
+    ids = rankings.feed(name, category.id if category else None, FEED_SIZE)
+    cards = AuctionListing.objects.select_related('user', 'category').only(*CARD_FIELDS).in_bulk(ids)
+    return render(request, "auctions/index.html", {
+        "title": rankings.FEEDS[name] + (" in " + category.categoryName if category else "") + ":",
+        "cards": listingCards([cards[id] for id in ids if id in cards], watchedIds(request.user))
     })
 
 # Login to BID IT!
@@ -87,128 +148,161 @@ def register(request):
     else:
         return render(request, "auctions/register.html")
 
-# Model form class for an Auction Listing
-class ListingForm(forms.ModelForm):
-    class Meta:
-        model = AuctionListing
-        fields = ['auctionTitle', 'image', 'currentBid', 'auctionDetails', 'category']
-        widgets = {
-            'auctionTitle': forms.TextInput(attrs={'class': 'form-control', 'aria-label': 'Title'}),
-            'image': forms.TextInput(attrs={'class': 'form-control'}),
-            'currentBid': forms.NumberInput(attrs={'class': 'form-control'}),
-            'auctionDetails': forms.Textarea(attrs={'class': 'form-control'}),
-            'category': forms.Select(choices=Category.objects.all(), attrs={'class' : 'form-control'})
-        }
-        labels = {
-            'auctionTitle': 'Title of the new Auction',
-            'image': 'Image URL',
-            'currentBid': "Starting bid",
-            'auctionDetails': 'Details about the Auction',
-            'category': 'Select a Category'
-        }
-
 # Create a new listing page
 @login_required(login_url='login')
 def createListing(request):
     if request.method == 'POST':
         form = ListingForm(request.POST)
-        if form.is_valid:
+        if form.is_valid():
             listing = form.save(commit=False)
             listing.user = request.user
             listing.save()
+            recordListed([listing])
+            categoryRegistry.listingsOpened([listing.category_id])
+            queueThumbnails(listing.id)
             return HttpResponseRedirect(reverse("index"))
     else:
-        return render(request, "auctions/createlisting.html", {
-            'form': ListingForm()
-        })
+        form = ListingForm()
+    return render(request, "auctions/createlisting.html", {
+        'form': form
+    })
 
 # View user watch list
 @login_required(login_url='login')
 def watchList(request):
-    all_match = []
-    watchList = Watchlist.objects.filter(user=request.user)
-    for i in watchList:
-        if not i.listing.isClosed:
-            all_match.append(i.listing)
+    all_match, next_cursor = listingPage(request, False, watchlist__user=request.user)
     return render(request, "auctions/index.html", {
         "title": "Your watch list:",
-        "listings": all_match,
-        "is_watchlist_remove": False
+        "cards": listingCards(all_match, watchedIds(request.user)),
+        "next_url": nextPageUrl(request, cursor=next_cursor) if next_cursor else None
     })
 
 # Add an auction to user personal watch list
 @login_required(login_url='login')
 def addWatchlist(request, id):
-    user = request.user
-    listing = AuctionListing.objects.get(id=id)
-    test = Watchlist.objects.filter(user=user, listing=listing).first()
-    if test is None:
-        new_listing = Watchlist(user=user, listing=listing)
-        new_listing.save()
+    if id.isdigit():
+        addToWatchlist(request.user, [int(id)])
     return HttpResponseRedirect(reverse('watchlist'))
 
 # Remove an auction from the user watch list
 @login_required(login_url='login')
 def removeWatchlist(request, id):
-    user = request.user
-    listing = AuctionListing.objects.get(id=id)
-    curr = Watchlist.objects.filter(user=user, listing=listing)
-    curr.delete()
-    watchList = Watchlist.objects.filter(user=user)
+    if id.isdigit():
+        removeFromWatchlist(request.user, [int(id)])
     return HttpResponseRedirect(reverse('watchlist'))
 
+# Add and remove many listings at once, e.g. add=1&add=2&remove=3, and return the watched ids
+@login_required(login_url='login')
+@require_POST
+def batchWatchlist(request):
+    add = [int(id) for id in request.POST.getlist('add') if id.isdigit()]
+    remove = [int(id) for id in request.POST.getlist('remove') if id.isdigit()]
+    if add:
+        addToWatchlist(request.user, add)
+    if remove:
+        removeFromWatchlist(request.user, remove)
+    return JsonResponse({"watched": sorted(watchedIds(request.user))})
+
 # Make a bidding of an auction listing
 @login_required(login_url='login')
 def makeBidding(request, id):
-    try:
-        listing = AuctionListing.objects.get(id=id)
-    except:
-        return HttpResponseRedirect("index")
     if request.method == 'POST':
-        new_price = request.POST.get('currentBid', None)
-        user = request.user
-        new_bid = Bidding(user=user, bidAmount=new_price, auction=listing)
-        new_bid.save()
-        listing.currentBid = new_price
-        listing.save()
-        old_bid = Bidding.objects.filter(auction=listing).exclude(bidAmount=new_price)
-        old_bid.delete()
-    return HttpResponseRedirect(reverse('auctiondetails', args=id))
+        try:
+            bid = submitWrite(placeBid, request.user, id, request.POST.get('currentBid', None))
+            invalidateListing(id)
+            publish(id, "bid", amount=bid.bidAmount, bidder=bid.user.username)
+        except BidError as error:
+            return render(request, "auctions/error.html", {
+                "message": str(error)
+            })
+    return HttpResponseRedirect(reverse('auctiondetails', args=[id]))
+
+# Set the maximum the engine may bid on the user's behalf
+@login_required(login_url='login')
+def makeProxyBidding(request, id):
+    if request.method == 'POST':
+        try:
+            bid = submitWrite(placeProxyBid, request.user, id, request.POST.get('maxAmount', None))
+            invalidateListing(id)
+            if bid is not None:
+                publish(id, "bid", amount=bid.bidAmount, bidder=bid.user.username)
+        except BidError as error:
+            return render(request, "auctions/error.html", {
+                "message": str(error)
+            })
+    return HttpResponseRedirect(reverse('auctiondetails', args=[id]))
+
+# Older comments of a listing, loaded by the details page on demand
+@login_required(login_url='login')
+def commentList(request, id):
+    if not id.isdigit():
+        return JsonResponse({"comments": [], "next": None}, status=404)
+    try:
+        comments, next_cursor = commentPage(id, request.GET.get('cursor'))
+    except CursorError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse({
+        "comments": [{"user": comment.user.username, "comment": comment.comments, "date": comment.commentDate}
+            for comment in comments],
+        "next": next_cursor
+    })
+
+# Listing, first page of comments and rendered description of a listing, shared by every reader until the next write
+def listingDetails(id):
+    # Refilled from the primary: a lagging replica could otherwise cache data older than the invalidating write
+    def compute():
+        with readFromPrimary():
+            listing = AuctionListing.objects.select_related('user', 'category', 'highestBid__user') \
+                .filter(id=id).first()
+            if listing is None:
+                return None
+            return {
+                "listing": listing,
+                "comments": commentPage(id, None),
+                "body": render_to_string("auctions/listingbody.html", {"listing": listing})
+            }
+    return readThrough(listingKey(id, "details"), compute)
 
 # View all details about the auction listing - include the lastest bid price and the comments
 @login_required(login_url='login')
 def auctionDetails(request, id):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('login'))
-    try:
-        listing = AuctionListing.objects.get(id=id)
-    except:
+    details = listingDetails(id) if id.isdigit() else None
+    if details is None:
         return render(request, "auctions/error.html", {
             "message": "There is no listing associated"
         })
-    commentList = Comments.objects.filter(auction=listing)
-    latestBid = Bidding.objects.filter(auction=listing).first()
+    listing = details["listing"]
     return render(request, "auctions/auctiondetails.html", {
         "listing": listing,
         "user": request.user, 
-        "commentList": commentList,
-        "bidder": latestBid,
+        "commentList": details["comments"][0],
+        "older_comments": details["comments"][1],
+        "body": mark_safe(details["body"]),
+        "bidder": listing.highestBid,
         "min_bid": listing.currentBid + 1
     })
 
 # Close the auction listing
 @login_required(login_url='login')
 def closeListing(request, id):
-    listing = AuctionListing.objects.get(id=id)
-    listing.isClosed = True
-    listing.save()
-    commentList = Comments.objects.filter(auction=listing)
-    latestBid = Bidding.objects.filter(auction=listing).first()
+    # Only the poster may close, and a plain save() could overwrite a concurrent bid
+    if id.isdigit():
+        bulkClose(request.user, [int(id)])
+    details = listingDetails(id) if id.isdigit() else None
+    if details is None:
+        return render(request, "auctions/error.html", {
+            "message": "There is no listing associated"
+        })
+    listing = details["listing"]
     return render(request, "auctions/auctiondetails.html", {
         "listing": listing,
         "user": request.user, 
-        "commentList": commentList,
-        "bidder": latestBid
+        "commentList": details["comments"][0],
+        "older_comments": details["comments"][1],
+        "body": mark_safe(details["body"]),
+        "bidder": listing.highestBid
     })
 
 # Make a comment about the auction listing
@@ -216,31 +310,150 @@ def closeListing(request, id):
 def comment(request, id):
     if request.method == "POST":
         comments = request.POST['content']
-        listing = AuctionListing.objects.get(id = id)
-        newComment = Comments(user=request.user, auction=listing, comments=comments)
-        newComment.save()
-    return HttpResponseRedirect(reverse('auctiondetails', args=id))
+        newComment = submitWrite(postComment, request.user, id, comments)
+        invalidateListing(id)
+        publish(id, "comment", user=request.user.username, comment=comments,
+            date=newComment.commentDate.isoformat())
+    return HttpResponseRedirect(reverse('auctiondetails', args=[id]))
 
 # View all category available of BID IT
 @login_required(login_url='login')
 def category(request):
     return render(request, "auctions/category.html", {
         "title": "View listings by categories",
-        "categories": Category.objects.all()
+        "categories": categoryRegistry.all()
     })
 
 # View all auction listings related to a category
 @login_required(login_url='login')
 def categoryName(request, name):
-    category = Category.objects.filter(categoryName=name).first()
+    category = categoryRegistry.byName(name)
     if category is None:
         return render(request, "auctions/error.html", {
             "message": "I'm sorry, but there is no listing with category" + name
         })
     else:
-        listings = AuctionListing.objects.filter(category=category, isClosed=False)
+        listings, next_cursor = listingPage(request, False, category_id=category.id)
         return render(request, "auctions/index.html", {
             "title": "Listings with category " + name + " are:",
-            "listings": listings,
-            "is_watchlist_remove": True
-        })
\ No newline at end of file
+            "cards": listingCards(listings, watchedIds(request.user)),
+            "next_url": nextPageUrl(request, cursor=next_cursor) if next_cursor else None
+        })
+
+# Hit/miss counters of the listing cache in this process
+@staff_member_required
+def cacheStatistics(request):
+    return JsonResponse(cacheStats())
+
+# In-app notifications of the user, newest first
+@login_required(login_url='login')
+def notifications(request):
+    latest = Notification.objects.filter(user=request.user).order_by('isRead', '-updatedAt') \
+        .values('id', 'listing_id', 'kind', 'message', 'count', 'updatedAt', 'isRead')[:50]
+    return JsonResponse({"notifications": list(latest)})
+
+# Mark the given notifications, or all of them, as read
+@login_required(login_url='login')
+@require_POST
+def readNotifications(request):
+    unread = Notification.objects.filter(user=request.user, isRead=False)
+    ids = [int(id) for id in request.POST.getlist('id') if id.isdigit()]
+    if ids:
+        unread = unread.filter(id__in=ids)
+    return JsonResponse({"read": unread.update(isRead=True)})
+
+# Per-view profiling aggregates in the Prometheus text format, only served while profiling is
+# on, and to holders of METRICS_TOKEN unless in DEBUG without a token
+def metricsView(request):
+    if not settings.PROFILING or not (settings.METRICS_TOKEN or settings.DEBUG):
+        raise Http404("Profiling is disabled")
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {settings.METRICS_TOKEN}":
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.prometheus(), content_type="text/plain; version=0.0.4")
+
+# Serve a listing thumbnail. Files are named after the hash of their content and never
+# change, so browsers and proxies may keep them for a year.
+def listingImage(request, size, key):
+    if size not in THUMBNAIL_SIZES or not re.fullmatch(r"[0-9a-f]{64}\.[a-z]+", key):
+        raise Http404("No such image")
+    try:
+        response = FileResponse(open(thumbnailPath(size, key), "rb"), content_type=contentType(key))
+    except FileNotFoundError:
+        raise Http404("No such image")
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+# The user's own listings with their bids, top bidder, comments and watchers, ?status=open/closed/all
+@login_required(login_url='login')
+def dashboard(request):
+    status = request.GET.get('status') if request.GET.get('status') in STATUSES else "all"
+    listings, next_cursor = dashboardPage(request.user, status, request.GET.get('cursor'))
+    return render(request, "auctions/dashboard.html", {
+        "listings": listings,
+        "status": status,
+        "statuses": list(STATUSES),
+        "next_url": nextPageUrl(request, cursor=next_cursor) if next_cursor else None
+    })
+
+# Close the listings ticked on the dashboard
+@login_required(login_url='login')
+@require_POST
+def dashboardClose(request):
+    bulkClose(request.user, [int(id) for id in request.POST.getlist('close') if id.isdigit()])
+    return HttpResponseRedirect(reverse('dashboard') + "?" + request.GET.urlencode())
+
+# Price history and bid velocity of a listing, per minute over the last ?hours=
+@login_required(login_url='login')
+def listingAnalytics(request, id):
+    hours = request.GET.get('hours', '24')
+    return JsonResponse({"listing": id, "minutes": listingSeries(id, int(hours) if hours.isdigit() else 24)})
+
+# Daily listings, bids, sales and final prices of every category over the last ?days=
+@login_required(login_url='login')
+def categoryAnalytics(request):
+    days = request.GET.get('days', '30')
+    return JsonResponse({"categories": categorySeries(int(days) if days.isdigit() and int(days) > 0 else 30)})
+
+# Lifetime sell-through of a seller, for the seller themselves and staff only
+@login_required(login_url='login')
+def sellerAnalytics(request, name):
+    if request.user.username != name and not request.user.is_staff:
+        raise Http404("No such seller")
+    try:
+        seller = User.objects.get(username=name)
+    except User.DoesNotExist:
+        raise Http404("No such seller")
+    return JsonResponse(sellerSummary(seller))
+
+# Create many listings from an uploaded CSV or JSONL file and report the rows that failed
+@login_required(login_url='login')
+@require_POST
+def importListings(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({"error": "Choose a CSV or JSONL file to import"}, status=400)
+    try:
+        format = bulk.formatOf(upload.name, request.POST.get('format'))
+    except bulk.BulkFormatError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse(bulk.importListings(upload, format, request.user))
+
+# Download the user's listings, or every listing for staff with ?all=1, as CSV or JSONL
+@login_required(login_url='login')
+def exportListings(request):
+    return exportResponse(request, "listings", bulk.exportListings)
+
+# Download the bid history of the user's listings, or of every listing for staff with ?all=1
+@login_required(login_url='login')
+def exportBids(request):
+    return exportResponse(request, "bids", bulk.exportBids)
+
+def exportResponse(request, name, export):
+    try:
+        format = bulk.formatOf("", request.GET.get('format', 'csv'))
+    except bulk.BulkFormatError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    seller = None if request.user.is_staff and request.GET.get('all') == '1' else request.user
+    response = StreamingHttpResponse(export(format, seller), content_type=bulk.CONTENT_TYPES[format])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{format}"'
+    return response
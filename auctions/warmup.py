@@ -0,0 +1,64 @@
+import os
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.contrib.auth.hashers import get_hashers
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import resolve, reverse
+
+from .cards import urlPrefix
+from .categories import registry
+
+# Templates compiled into the cached loader before the workers fork
+TEMPLATES = ["auctiondetails.html", "category.html", "createlisting.html", "dashboard.html", "error.html",
+    "index.html", "layout.html", "listingbody.html", "listingcard.html", "login.html", "register.html"]
+
+
+# Do the per process work of a first request once, in the master before it forks, so every
+# worker starts with it done and shares its memory copy on write: the URL resolver, the
+# compiled templates, the card URL prefixes, the password hashers and the categories.
+# The leaderboards are left to the workers, their refresher thread would not survive a fork.
+# Closes the connections it opened, a forked child must never reuse its parent's.
+def warmUp():
+    reverse("index")
+    resolve("/")
+    for name in ("auctiondetails", "add_watchlist", "remove_watchlist"):
+        urlPrefix(name)
+    for name in TEMPLATES:
+        get_template(f"auctions/{name}")
+    get_hashers()
+    try:
+        registry.load()
+    finally:
+        connections.close_all()
+
+
+# Serve path through the WSGI application of this process, returns the status and seconds taken
+def firstResponse(application, path="/"):
+    environ = {"PATH_INFO": path, "SERVER_NAME": "localhost", "HTTP_HOST": "localhost"}
+    setup_testing_defaults(environ)
+    status = []
+    start = time.perf_counter()
+    response = application(environ, lambda code, headers, *args: status.append(int(code.split()[0])))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return status[0], time.perf_counter() - start
+
+
+# Resident and private memory of this process in megabytes, from /proc on Linux
+def memoryUsage():
+    usage = {"rss": 0.0, "private": 0.0}
+    for path, fields in (("/proc/self/status", {"VmRSS:": "rss"}),
+            ("/proc/self/smaps_rollup", {"Private_Clean:": "private", "Private_Dirty:": "private"})):
+        if not os.path.exists(path):
+            continue
+        with open(path) as lines:
+            for line in lines:
+                name, *value = line.split()
+                if name in fields:
+                    usage[fields[name]] += int(value[0]) / 1024
+    return usage
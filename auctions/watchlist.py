@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .analytics import recordActivity
+from .models import AuctionEvent, AuctionListing, Watchlist
+
+# Seconds a user's watched listing ids stay cached when they do not change
+WATCHED_TIMEOUT = 3600
+
+
+def watchedKey(userId):
+    return f"watchlist:{userId}"
+
+
+# Ids of the listings a user watches, cached so list pages can mark watched cards without a query
+def watchedIds(user):
+    if not user.is_authenticated:
+        return frozenset()
+    ids = cache.get(watchedKey(user.id))
+    if ids is None:
+        ids = frozenset(Watchlist.objects.filter(user=user).values_list('listing_id', flat=True))
+        cache.set(watchedKey(user.id), ids, WATCHED_TIMEOUT)
+    return ids
+
+
+# Watch the given listings, ids that are already watched or do not exist are ignored.
+# The unique (user, listing) constraint turns the insert into an idempotent upsert,
+# so concurrent clicks can never create duplicates.
+def addToWatchlist(user, listingIds):
+    watched = watchedIds(user)
+    existing = list(AuctionListing.objects.filter(id__in=listingIds).values_list('id', flat=True))
+    with transaction.atomic():
+        Watchlist.objects.bulk_create([Watchlist(user=user, listing_id=id) for id in existing], ignore_conflicts=True)
+        recordActivity([id for id in existing if id not in watched], AuctionEvent.WATCHED)
+    cache.delete(watchedKey(user.id))
+
+
+# Stop watching the given listings
+def removeFromWatchlist(user, listingIds):
+    Watchlist.objects.filter(user=user, listing_id__in=listingIds).delete()
+    cache.delete(watchedKey(user.id))
@@ -2,6 +2,8 @@
 ASGI config for commerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live listing updates are streamed from /stream/<id>, everything else is
+handled by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.core.signals import request_started
+
+from auctions.expiry import startFollower
+from auctions.streaming import streamRouter
+
+# Drop the cached copies of listings closed by other processes and tell the viewers of this one
+request_started.connect(startFollower, dispatch_uid='follow-closed')
+
+application = streamRouter(django_application)
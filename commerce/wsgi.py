@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
 application = get_wsgi_application()
+
+from django.core.signals import request_started
+
+from auctions.expiry import startFollower
+
+# Drop the cached copies of listings closed by other processes and tell the viewers of this one
+request_started.connect(startFollower, dispatch_uid='follow-closed')
@@ -0,0 +1,24 @@
+import os
+
+# Run with: gunicorn commerce.asgi
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# ASGI workers, the live listing updates at /stream/<id> are only served by commerce.asgi
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app once in the master and fork the workers from it, so they share its
+# modules and warmed caches copy on write and start serving without importing anything
+preload_app = True
+
+
+# The app is loaded, warm its caches before the workers are forked
+def when_ready(server):
+    from auctions.warmup import warmUp
+
+    warmUp()
+
+
+# Database connections must not be shared between processes
+def post_fork(server, worker):
+    from django.db import connections
+
+    connections.close_all()